@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of turning parsed charge lists into resource objects.
+
+    python benchmarks/bench_convert.py [charges per page]
+
+Reports objects built per second by convert_to_openpay_object (every
+JSON object in the page becomes one: a charge plus its card, fee and
+metadata), eagerly and with openpay.lazy_objects. In lazy mode only the
+charges are built up front; the rate still counts every object of the
+page, so the two lines compare time per page.
+"""
+from __future__ import print_function
+import json
+import sys
+import timeit
+from os import path, pardir
+PROJECT_ROOT = path.dirname(path.abspath(__file__))
+sys.path.append(path.join(PROJECT_ROOT, pardir))
+
+import openpay
+from openpay.resource import convert_to_openpay_object
+
+from bench_json import charge
+
+ROUNDS = 20
+
+
+def count_objects(value):
+    if isinstance(value, dict):
+        return 1 + sum(count_objects(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(count_objects(v) for v in value)
+    return 0
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    body = json.dumps([dict(charge(n), object='charge')
+                       for n in range(count)])
+    objects = count_objects(json.loads(body))
+    print("%d charges, %d objects per page\n" % (count, objects))
+
+    for lazy in (False, True):
+        openpay.lazy_objects = lazy
+        pages = [json.loads(body) for _ in range(ROUNDS)]
+        seconds = timeit.timeit(
+            lambda: convert_to_openpay_object(pages.pop(), 'sk_key'),
+            number=ROUNDS)
+        print("%-28s %10.0f objects/s %8.2f ms/page" % (
+            'lazy_objects' if lazy else 'eager', objects * ROUNDS / seconds,
+            seconds / ROUNDS * 1e3))
+    openpay.lazy_objects = False
+
+
+if __name__ == '__main__':
+    main()
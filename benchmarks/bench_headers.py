@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Per-request cost of building the static request headers.
+
+    python benchmarks/bench_headers.py
+
+Compares rebuilding the user agent on every call (what request_raw used
+to do) with the cached lookup it does now.
+"""
+from __future__ import print_function
+import sys
+import timeit
+from os import path, pardir
+PROJECT_ROOT = path.dirname(path.abspath(__file__))
+sys.path.append(path.join(PROJECT_ROOT, pardir))
+
+from openpay import api, http_client
+
+ROUNDS = 2000
+
+
+def report(label, seconds):
+    print("%-28s %10.2f us/request" % (label, seconds / ROUNDS * 1e6))
+
+
+def main():
+    uncached = timeit.timeit(
+        lambda: api._build_static_headers('requests', None), number=ROUNDS)
+    cached = timeit.timeit(
+        lambda: dict(api._static_headers('requests', None)), number=ROUNDS)
+    auth = timeit.timeit(
+        lambda: http_client.basic_auth_header('sk_benchmark'),
+        number=ROUNDS)
+
+    report('headers, rebuilt each call', uncached)
+    report('headers, cached', cached)
+    report('basic auth, cached', auth)
+    print("speedup: %.0fx" % (uncached / cached))
+
+
+if __name__ == '__main__':
+    main()
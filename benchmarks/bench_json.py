@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of parsing charge-list responses with each installed JSON codec.
+
+    python benchmarks/bench_json.py [charges per page]
+
+The payload mimics a page of ``Charge.all()``: card charges with nested
+card and customer objects. ``decode + json.loads`` is what
+interpret_response used to do before handing bytes to the codec.
+"""
+from __future__ import print_function
+import json
+import sys
+import timeit
+from os import path, pardir
+PROJECT_ROOT = path.dirname(path.abspath(__file__))
+sys.path.append(path.join(PROJECT_ROOT, pardir))
+
+from openpay import codec
+
+ROUNDS = 200
+
+
+def charge(n):
+    return {
+        'id': 'tr%018d' % n,
+        'authorization': '%06d' % (801585 + n),
+        'operation_type': 'in',
+        'method': 'card',
+        'transaction_type': 'charge',
+        'status': 'completed',
+        'conciliated': True,
+        'creation_date': '2024-03-%02dT11:%02d:01-06:00' % (
+            n % 28 + 1, n % 60),
+        'operation_date': '2024-03-%02dT11:%02d:02-06:00' % (
+            n % 28 + 1, n % 60),
+        'description': u'Cargo inicial a mi cuenta número %d' % n,
+        'error_message': None,
+        'order_id': 'oid-%05d' % n,
+        'amount': 100.0 + n,
+        'currency': 'MXN',
+        'customer_id': 'ag4nktpdzebjiye1tlze',
+        'fee': {'amount': 2.9 + n / 100.0, 'tax': 0.464, 'currency': 'MXN'},
+        'card': {
+            'id': 'kqgykn96i7bcs1wwhvgw',
+            'type': 'debit',
+            'brand': 'visa',
+            'address': None,
+            'card_number': '411111XXXXXX1111',
+            'holder_name': u'Juan Pérez Ramírez',
+            'expiration_year': '28',
+            'expiration_month': '12',
+            'allows_charges': True,
+            'allows_payouts': True,
+            'bank_name': 'Banamex',
+            'bank_code': '002',
+            'points_card': False,
+        },
+        'metadata': {'sku': 'sku-%d' % n, 'channel': 'web'},
+    }
+
+
+def report(label, seconds, size):
+    per_call = seconds / ROUNDS
+    print("%-28s %10.1f us/page %8.1f MB/s" % (
+        label, per_call * 1e6, size / per_call / 1e6))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    body = json.dumps([charge(n) for n in range(count)]).encode('utf-8')
+    print("%d charges, %d bytes per page\n" % (count, len(body)))
+
+    report('decode + json.loads', timeit.timeit(
+        lambda: json.loads(body.decode('utf-8')), number=ROUNDS), len(body))
+    for json_codec in codec.available():
+        report('%s.loads(bytes)' % json_codec.name, timeit.timeit(
+            lambda: json_codec.loads(body), number=ROUNDS), len(body))
+
+    print()
+    params = charge(0)
+    for json_codec in codec.available():
+        seconds = timeit.timeit(lambda: json_codec.dumps(params),
+                                number=ROUNDS * 10)
+        print("%-28s %10.2f us/request body" % (
+            '%s.dumps' % json_codec.name, seconds / ROUNDS / 10 * 1e6))
+
+    print("\nauto-selected codec: %s" % codec.current().name)
+
+
+if __name__ == '__main__':
+    main()
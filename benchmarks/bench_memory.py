@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Memory held by a large page of charges in each representation.
+
+    python benchmarks/bench_memory.py [charges per page]
+
+Measures, with tracemalloc, what stays allocated after building the page
+from the parsed JSON: resource objects (the default), resource objects
+with openpay.lazy_objects (charges built, nested fields not yet read),
+and CompactObjects (``compact=True``). The parsed JSON itself is shown
+for scale. Requires Python 3.
+"""
+from __future__ import print_function
+import gc
+import json
+import sys
+import tracemalloc
+from os import path, pardir
+PROJECT_ROOT = path.dirname(path.abspath(__file__))
+sys.path.append(path.join(PROJECT_ROOT, pardir))
+
+import openpay
+from openpay import compact, resource
+
+from bench_json import charge
+
+
+def retained(build, body):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    page = build(json.loads(body))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del page
+    return size
+
+
+def as_resources(parsed):
+    page = openpay.Charge._list_from_response(
+        parsed, 'sk_key', '/v1/mid/charges')
+    # Materialize the charges (a lazy page converts them on access).
+    page.data
+    return page
+
+
+def as_compact(parsed):
+    return resource.list_items(parsed, 'charge', compact=True)
+
+
+def as_lazy_resources(parsed):
+    openpay.lazy_objects = True
+    try:
+        return as_resources(parsed)
+    finally:
+        openpay.lazy_objects = False
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    body = json.dumps([charge(n) for n in range(count)])
+    print("%d charges, %.1f MB of JSON\n" % (count, len(body) / 1e6))
+
+    for label, build in (
+            ('parsed JSON', lambda parsed: parsed),
+            ('BaseObject', as_resources),
+            ('BaseObject, lazy_objects', as_lazy_resources),
+            ('CompactObject', as_compact)):
+        size = retained(build, body)
+        print("%-28s %8.1f MB %8d bytes/charge" % (
+            label, size / 1e6, size // count))
+
+    print("\n%d key layouts interned" % len(compact._shapes))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,41 @@ production = False
 api_version = None
 verify_ssl_certs = True
 country = "mx"
+# Shared transport used by every APIClient that isn't given one explicitly.
+# Built lazily on first request; set it to your own
+# http_client.HTTPClient instance to tune pooling.
+default_http_client = None
+# Same, for openpay.aio.AsyncAPIClient and the ``*_async`` resource methods.
+default_async_http_client = None
+# openpay.retry.RetryPolicy applied by every APIClient; None means a
+# single attempt.
+retry_policy = None
+# Callables invoked with an openpay.api.RequestEvent after each HTTP
+# attempt, e.g. to feed metrics.
+request_hooks = []
+# openpay.breaker.CircuitBreakerRegistry guarding each API host; None
+# disables circuit breaking.
+circuit_breakers = None
+# openpay.hedge.HedgePolicy for hedging slow GETs; None disables hedging.
+hedge_policy = None
+# openpay.ratelimit.RateLimiter throttling requests per merchant_id; None
+# disables client-side rate limiting.
+rate_limiter = None
+# openpay.concurrency.AdaptiveLimiter bounding requests in flight; None
+# leaves concurrency to the caller.
+concurrency_limiter = None
+# Share one response among identical GETs in flight at the same time; see
+# openpay.singleflight.
+coalesce_gets = True
+# openpay.cache.ResponseCache answering retrieve()/refresh() of plans,
+# customers and bank accounts while fresh; None disables caching.
+response_cache = None
+# JSON codec for request and response bodies (see openpay.codec); None
+# picks the fastest one installed.
+json_codec = None
+# Convert nested objects (card, fee, metadata, ...) of API responses only
+# when they are first read instead of up front.
+lazy_objects = False
 # Resource
 
 from openpay.resource import (  # noqa
@@ -19,7 +54,8 @@ from openpay.resource import (  # noqa
 
 from openpay.error import (  # noqa
     OpenpayError, APIError, APIConnectionError, AuthenticationError, CardError,
-    InvalidRequestError)
+    InvalidRequestError, CircuitOpenError, DeadlineExceededError,
+    RateLimitError)
 
 
 #from openpay.resource import (
@@ -0,0 +1,547 @@
+"""
+Asyncio support for the Openpay bindings (Python 3.5+).
+
+AsyncAPIClient mirrors api.APIClient but awaits a pluggable async
+transport. The default transport, AsyncioHTTPClient, speaks HTTP/1.1 over
+plain asyncio streams and keeps connections alive per host, so many
+in-flight requests can share one event loop without extra threads.
+
+The ``*_async`` methods on the resource classes (``Charge.create_async``,
+``Customer.retrieve_async``, ``charge.refund_async`` ...) are thin
+wrappers around the coroutines at the bottom of this module.
+"""
+import asyncio
+import os
+import ssl
+import textwrap
+import weakref
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+import openpay
+from openpay import (
+    api, concurrency, error, http_client, retry, singleflight, timeouts,
+    util)
+
+
+class AsyncHTTPClient(object):
+    name = None
+
+    def __init__(self, verify_ssl_certs=True, timeout=None):
+        self._verify_ssl_certs = verify_ssl_certs
+        self.timeout = http_client.timeout_pair(timeout)
+
+    async def request(self, method, url, headers, post_data=None, user=None,
+                      timeout=None):
+        raise NotImplementedError(
+            'AsyncHTTPClient subclasses must implement `request`')
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class _StaleConnection(Exception):
+    pass
+
+
+class AsyncioHTTPClient(AsyncHTTPClient):
+    name = 'asyncio'
+
+    def __init__(self, verify_ssl_certs=True, pool_maxsize=100,
+                 timeout=None):
+        super(AsyncioHTTPClient, self).__init__(verify_ssl_certs, timeout)
+        self._pool_maxsize = pool_maxsize
+
+        self._loop = None
+        self._idle = {}
+        self._slots = {}
+        self._ssl_context = None
+
+    def _bind_loop(self):
+        # Streams and semaphores belong to the loop that created them, so
+        # start over if we are now running on a different loop.
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = {}
+            self._slots = {}
+
+    def _get_ssl_context(self):
+        if self._ssl_context is None:
+            cafile = os.path.join(
+                os.path.dirname(__file__), 'data/ca-certificates.crt')
+            if not self._verify_ssl_certs:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            elif os.path.exists(cafile):
+                context = ssl.create_default_context(cafile=cafile)
+            else:
+                context = ssl.create_default_context()
+            self._ssl_context = context
+        return self._ssl_context
+
+    async def request(self, method, url, headers, post_data=None, user=None,
+                      timeout=None):
+        self._bind_loop()
+        connect_timeout, read_timeout = timeout or self.timeout
+
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        key = (parts.hostname, port, secure)
+
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+
+        if isinstance(post_data, str):
+            post_data = post_data.encode('utf-8')
+
+        lines = ['%s %s HTTP/1.1' % (method.upper(), path),
+                 'Host: %s' % (parts.netloc,),
+                 'Connection: keep-alive',
+                 'Accept-Encoding: identity',
+                 'Authorization: %s' % (
+                     http_client.basic_auth_header(user),)]
+        for name, value in headers.items():
+            lines.append('%s: %s' % (name, value))
+        if post_data is not None or method in ('post', 'put'):
+            lines.append('Content-Length: %d' % (len(post_data or b''),))
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+        # Whether the request may be sent again should a pooled
+        # connection turn out to be dead after it was written.
+        replayable = (method in ('get', 'head', 'put', 'delete') or
+                      retry.IDEMPOTENCY_HEADER in headers)
+
+        slots = self._slots.get(key)
+        if slots is None:
+            slots = self._slots[key] = asyncio.Semaphore(self._pool_maxsize)
+
+        try:
+            async with slots:
+                return await self._send(key, method, head, post_data,
+                                        connect_timeout, read_timeout,
+                                        replayable)
+        except error.OpenpayError:
+            raise
+        except Exception as e:
+            self._handle_request_error(e)
+
+    async def _send(self, key, method, head, body, connect_timeout,
+                    read_timeout, replayable):
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            reader, writer = idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                # Closed by the server while it sat idle; nothing sent.
+                writer.close()
+                continue
+            try:
+                return await asyncio.wait_for(
+                    self._exchange(key, method, reader, writer, head, body),
+                    read_timeout)
+            except _StaleConnection:
+                # The server closed the connection, maybe after reading
+                # the request: only send it again if that is safe.
+                if not replayable:
+                    raise error.APIConnectionError(
+                        'Connection closed by Openpay before a response '
+                        'was received.')
+                continue
+
+        host, port, secure = key
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(
+            host, port, ssl=self._get_ssl_context() if secure else None),
+            connect_timeout)
+        try:
+            return await asyncio.wait_for(
+                self._exchange(key, method, reader, writer, head, body),
+                read_timeout)
+        except _StaleConnection:
+            raise error.APIConnectionError(
+                'Connection closed by Openpay before a response was '
+                'received.')
+
+    async def _exchange(self, key, method, reader, writer, head, body):
+        try:
+            writer.write(head)
+            if body:
+                writer.write(body)
+            await writer.drain()
+            status_line = await reader.readline()
+        except (ConnectionError, OSError):
+            writer.close()
+            raise _StaleConnection()
+        except BaseException:
+            writer.close()
+            raise
+        if not status_line:
+            writer.close()
+            raise _StaleConnection()
+
+        try:
+            while True:
+                version, status = status_line.split(None, 2)[:2]
+                rcode = int(status)
+                headers = await self._read_headers(reader)
+                if not 100 <= rcode < 200:
+                    break
+                # An interim response (100 Continue, ...): the final one
+                # follows.
+                status_line = await reader.readline()
+
+            keep_alive = (version == b'HTTP/1.1' and
+                          headers.get('connection', '').lower() != 'close')
+            if method == 'head' or rcode in (204, 304):
+                # These never have a body, whatever the headers say
+                # (RFC 9112, section 6.3).
+                rbody = b''
+            elif headers.get('transfer-encoding', '').lower() == 'chunked':
+                rbody = await self._read_chunked(reader)
+            elif 'content-length' in headers:
+                rbody = await reader.readexactly(
+                    int(headers['content-length']))
+            else:
+                rbody = await reader.read()
+                keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+        return rbody, rcode, headers
+
+    async def _read_headers(self, reader):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # Skip any trailers up to the terminating blank line.
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+
+    async def close(self):
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+
+    def _handle_request_error(self, e):
+        msg = ("Unexpected error communicating with Openpay. "
+               "If this problem persists, let us know at support@openpay.mx.")
+        err = "%s: %s" % (type(e).__name__, str(e))
+        msg = textwrap.fill(msg) + "\n\n(Network error: %s)" % (err,)
+        raise error.APIConnectionError(msg)
+
+
+def get_default_http_client():
+    if openpay.default_async_http_client is None:
+        openpay.default_async_http_client = AsyncioHTTPClient(
+            verify_ssl_certs=openpay.verify_ssl_certs)
+    return openpay.default_async_http_client
+
+
+# In-flight coalesced GETs of each event loop, by APIClient.read_key.
+_inflight = weakref.WeakKeyDictionary()
+
+
+async def _coalesce(key, make_request):
+    calls = _inflight.setdefault(asyncio.get_event_loop(), {})
+    task = calls.get(key)
+    if task is None:
+        task = calls[key] = asyncio.ensure_future(make_request())
+
+        def forget(done):
+            if calls.get(key) is done:
+                del calls[key]
+
+        task.add_done_callback(forget)
+    # Shielded so one cancelled waiter doesn't cancel the others' request.
+    return await asyncio.shield(task)
+
+
+def _wake_threadsafe(loop, future):
+    def wake():
+        if not future.done():
+            future.set_result(None)
+    try:
+        loop.call_soon_threadsafe(wake)
+    except RuntimeError:
+        # The loop has been closed; nobody is waiting any more.
+        pass
+
+
+class AsyncAPIClient(api.APIClient):
+
+    def __init__(self, key=None, client=None, test_mode=False,
+                 retry_policy=None, timeout=None, rate_limiter=None,
+                 concurrency_limiter=None, merchant_id=None):
+        self.api_key = key
+        self.merchant_id = merchant_id
+        self.retry_policy = retry_policy
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+
+        openpay.test_mode = test_mode
+
+        # As with APIClient, the shared default transport is left open.
+        self._owns_client = client is not None
+        self._client = client or get_default_http_client()
+
+    async def close(self):
+        if self._owns_client:
+            await self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def forget_inflight(self, abs_url, object_id, subtree):
+        super(AsyncAPIClient, self).forget_inflight(
+            abs_url, object_id, subtree)
+        calls = _inflight.get(asyncio.get_event_loop(), {})
+        for key in list(calls):
+            if singleflight.stale_after_write(key[0], abs_url, object_id,
+                                              subtree):
+                # _coalesce's done callback leaves a replaced entry alone.
+                del calls[key]
+
+    async def acquire_slot(self, limiter, deadline_at):
+        """
+        Wait for a slot from ``limiter`` without blocking the event loop.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            slot = limiter.try_acquire()
+            if slot is not None:
+                return slot
+
+            freed = loop.create_future()
+            limiter.add_listener(lambda: _wake_threadsafe(loop, freed))
+            # A slot may have been released before the listener was added.
+            slot = limiter.try_acquire()
+            if slot is not None:
+                return slot
+
+            try:
+                await asyncio.wait_for(freed,
+                                       timeouts.remaining(deadline_at))
+            except asyncio.TimeoutError:
+                raise error.DeadlineExceededError(
+                    'The deadline for this Openpay request expired while '
+                    'waiting for a concurrency slot.')
+
+    async def request(self, method, url, params=None, idempotency_key=None,
+                      coalesce=True, cache=False):
+        method = method.lower()
+        if method != 'get':
+            result = None
+            try:
+                result = await self._request(
+                    method, url, params, idempotency_key)
+                return result
+            finally:
+                self.after_write(method, url, result)
+
+        response_cache = openpay.response_cache
+
+        key = self.read_key(url, params)
+        use_cache = cache and response_cache is not None
+        if use_cache:
+            resp = response_cache.lookup(key)
+            if resp is not None:
+                return api.Response((resp, key[1]), 0)
+            generation = response_cache.generation
+
+        if coalesce and openpay.coalesce_gets:
+            result = await _coalesce(
+                key,
+                lambda: self._request(method, url, params, idempotency_key))
+        else:
+            result = await self._request(method, url, params,
+                                         idempotency_key)
+
+        if use_cache:
+            response_cache.store(key, result[0], generation)
+        return result
+
+    async def _request(self, method, url, params, idempotency_key):
+        raw = await self.request_raw(method, url, params, idempotency_key)
+        rbody, rcode, my_api_key = raw
+        resp = self.interpret_response(rbody, rcode)
+        return api.Response((resp, my_api_key), api.attempts(raw))
+
+    async def request_raw(self, method, url, params=None,
+                          idempotency_key=None):
+        abs_url, headers, post_data, my_api_key = self.prepare_request(
+            method, url, params, idempotency_key)
+
+        policy = self.get_retry_policy()
+        breaker = self.get_circuit_breaker(abs_url)
+        limiter = self.get_rate_limiter()
+        slots = self.get_concurrency_limiter()
+        timeout, deadline_at = timeouts.resolve(self.timeout)
+        started = retry.clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            attempt_started = retry.clock()
+            rheaders = slot = None
+            try:
+                if limiter is not None:
+                    await asyncio.sleep(
+                        self.rate_limit_delay(limiter, deadline_at))
+                if slots is not None:
+                    slot = await self.acquire_slot(slots, deadline_at)
+                attempt_started = retry.clock()
+                kwargs = self.attempt_kwargs(timeout, deadline_at)
+                if breaker is not None:
+                    breaker.before_request()
+                result = await self._client.request(
+                    method, abs_url, headers, post_data, user=my_api_key,
+                    **kwargs)
+                rbody, rcode, rheaders = api._unpack_response(result)
+                exc = None
+            except error.APIConnectionError as e:
+                rbody, rcode, exc = None, None, e
+            except BaseException as e:
+                # Including cancellation, which must give the slot back.
+                if slot is not None:
+                    slots.release(slot)
+                if breaker is not None and isinstance(e, Exception):
+                    breaker.record(exc=e)
+                raise
+            elapsed = retry.clock() - attempt_started
+
+            if slot is not None:
+                self.release_slot(slots, slot, rcode, exc, elapsed,
+                                  concurrency.endpoint(method, abs_url))
+            if breaker is not None and not isinstance(exc, api._NOT_SENT):
+                breaker.record(rcode, exc, elapsed)
+
+            delay = policy.retry_delay(
+                method, headers, attempt, started, rcode, exc,
+                self.note_rate_limit(limiter, rcode, rheaders))
+            left = timeouts.remaining(deadline_at)
+            if delay is not None and left is not None and left <= delay:
+                delay = None
+            self.record_attempt(method, abs_url, attempt, rcode, exc,
+                                elapsed, delay)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        if exc is not None:
+            raise exc
+
+        util.logger.info(
+            'API request to %s returned (response code, response body) of '
+            '(%d, %r)',
+            abs_url, rcode, rbody)
+        return api.Response((rbody, rcode, my_api_key), attempt)
+
+
+# Awaitable counterparts of the resource operations.
+
+
+async def request(obj, method, url, params=None, **kwargs):
+    from openpay.resource import note_attempts
+
+    if params is None:
+        params = obj._retrieve_params
+
+    requestor = AsyncAPIClient(obj.api_key)
+    result = await requestor.request(method, url, params, **kwargs)
+    return note_attempts(obj._convert_response(result[0], result[1], url),
+                         result)
+
+
+async def refresh(obj, coalesce=True, cache=True):
+    obj.refresh_from(await request(obj, 'get', obj.instance_url(),
+                                   coalesce=coalesce,
+                                   cache=cache and obj._cacheable))
+    return obj
+
+
+async def retrieve(cls, id, api_key, params, coalesce=True, cache=True):
+    instance = cls(id, api_key, **params)
+    return await refresh(instance, coalesce, cache)
+
+
+async def list_all(cls, api_key, params):
+    from openpay.resource import coalesce_kwargs, note_attempts
+
+    requestor = AsyncAPIClient(api_key)
+    url = cls.class_url(params)
+    compact = params.pop('compact', False)
+    extra = coalesce_kwargs(params)
+
+    result = await requestor.request('get', url, params, **extra)
+    return note_attempts(cls._list_from_response(
+        result[0], result[1], url, params, compact), result)
+
+
+async def create(cls, api_key, params):
+    from openpay.resource import convert_result, idempotency_kwargs
+
+    requestor = AsyncAPIClient(api_key)
+    url = cls.class_url(params)
+    extra = idempotency_kwargs(params, cls._auto_idempotency_key)
+
+    if "clean_params" in dir(cls):
+        params = cls.clean_params(params)
+
+    result = await requestor.request('post', url, params, **extra)
+    return convert_result(result, cls.__name__.lower())
+
+
+async def save(obj):
+    updated_params = obj._save_params()
+
+    if updated_params:
+        obj.refresh_from(await request(obj, 'put', obj.instance_url(),
+                                       updated_params))
+    else:
+        util.logger.debug("Trying to save already saved object %r", obj)
+    return obj
+
+
+async def delete(obj, params):
+    obj.refresh_from(await request(obj, 'delete', obj.instance_url(),
+                                   params))
+    return obj
+
+
+async def post_action(obj, url, params, **kwargs):
+    obj.refresh_from(await request(obj, 'post', url, params, **kwargs))
+    return obj
@@ -4,9 +4,44 @@ import time
 # import warnings
 import platform
 import json
+import threading
+from collections import namedtuple
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
 
 import openpay
-from openpay import error, http_client, version, util
+from openpay import (
+    codec, concurrency, error, http_client, ratelimit, retry, singleflight,
+    streaming, timeouts, version, util)
+
+_default_client_lock = threading.Lock()
+_owned_default_client = None
+_static_headers_cache = {}
+
+# Failures raised before a request reaches the transport.
+_NOT_SENT = (error.CircuitOpenError, error.DeadlineExceededError)
+
+# Reported to openpay.request_hooks after every HTTP attempt. ``status`` is
+# None when the transport failed with ``error``; ``will_retry`` tells
+# whether the client is going to try again.
+RequestEvent = namedtuple('RequestEvent', [
+    'method', 'url', 'attempt', 'status', 'error', 'elapsed', 'will_retry'])
+
+
+class Response(tuple):
+    """
+    The tuple returned by APIClient.request and request_raw, also telling
+    in ``attempts`` how many HTTP attempts produced it (0 when it came
+    from openpay.response_cache).
+    """
+
+    def __new__(cls, values, attempts):
+        self = tuple.__new__(cls, values)
+        self.attempts = attempts
+        return self
 
 
 def _encode_datetime(dttime):
@@ -58,22 +93,213 @@ def _build_api_url(url, query):
         return url
 
 
+def _build_static_headers(httplib, api_version):
+    ua = {
+        'bindings_version': version.VERSION,
+        'lang': 'python',
+        'publisher': 'openpay',
+        'httplib': httplib
+    }
+    for attr, func in [['lang_version', platform.python_version],
+                       ['platform', platform.platform],
+                       ['uname', lambda: ' '.join(platform.uname())]]:
+        try:
+            val = func()
+        except Exception as e:
+            val = "!! %s" % (e,)
+        ua[attr] = val
+
+    headers = {
+        'X-Openpay-Client-User-Agent': json.dumps(ua),
+        'User-Agent': 'Openpay/v1 PythonBindings/%s' % (version.VERSION,),
+        'content-type': 'application/json',
+    }
+
+    if api_version is not None:
+        headers['Openpay-Version'] = api_version
+
+    return headers
+
+
+def _static_headers(httplib, api_version):
+    """
+    Headers that only depend on the bindings and transport in use. They
+    are computed once per configuration since building the user agent
+    queries (and on some systems shells out to) the platform module.
+    """
+    key = (version.VERSION, httplib, api_version)
+    headers = _static_headers_cache.get(key)
+    if headers is None:
+        headers = _build_static_headers(httplib, api_version)
+        _static_headers_cache[key] = headers
+    return headers
+
+
+def attempts(result):
+    """
+    How many HTTP attempts an APIClient call took, or None if ``result``
+    doesn't say (e.g. it came from a replacement client).
+    """
+    return getattr(result, 'attempts', None)
+
+
+def _unpack_response(result):
+    # Transports return (body, status, headers); older custom ones may
+    # return just (body, status).
+    if len(result) > 2:
+        return result[0], result[1], result[2]
+    return result[0], result[1], None
+
+
+def _get_default_http_client():
+    """
+    Return the process-wide transport, creating it on first use so that
+    every APIClient shares the same connection pool.
+    """
+    global _owned_default_client
+    from openpay import verify_ssl_certs
+
+    client = openpay.default_http_client
+    if client is not None and (
+            client is not _owned_default_client or
+            client._verify_ssl_certs == verify_ssl_certs):
+        return client
+
+    with _default_client_lock:
+        client = openpay.default_http_client
+        if client is None or (client is _owned_default_client and
+                              client._verify_ssl_certs != verify_ssl_certs):
+            if client is not None:
+                client.close()
+            client = http_client.new_default_http_client(
+                verify_ssl_certs=verify_ssl_certs)
+            openpay.default_http_client = client
+            _owned_default_client = client
+    return client
+
+
 class APIClient(object):
 
-    def __init__(self, key=None, client=None, test_mode=False):
+    def __init__(self, key=None, client=None, test_mode=False,
+                 retry_policy=None, timeout=None, hedge_policy=None,
+                 rate_limiter=None, concurrency_limiter=None,
+                 merchant_id=None):
         self.api_key = key
+        self.merchant_id = merchant_id
+        self.retry_policy = retry_policy
+        self.timeout = timeout
+        self.hedge_policy = hedge_policy
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
 
-        from openpay import verify_ssl_certs
         openpay.test_mode = test_mode
 
-        self._client = client or http_client.new_default_http_client(
-            verify_ssl_certs=verify_ssl_certs)
+        # Only a transport passed in is closed with this client; the
+        # shared default stays open for every other one.
+        self._owns_client = client is not None
+        self._client = client or _get_default_http_client()
+
+    def close(self):
+        if self._owns_client:
+            self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def request(self, method, url, params=None, idempotency_key=None,
+                coalesce=True, cache=False):
+        """
+        Send an API call and return ``(parsed response, api key)``.
+
+        GETs identical to one already in flight share its response unless
+        ``coalesce`` is False (see openpay.singleflight). With ``cache``
+        set, GETs read through openpay.response_cache; other methods
+        always invalidate it (see openpay.cache).
+        """
+        method = method.lower()
+        if method != 'get':
+            result = None
+            try:
+                result = self._request(method, url, params, idempotency_key)
+                return result
+            finally:
+                self.after_write(method, url, result)
+
+        key = self.read_key(url, params)
+
+        def send():
+            return self._request(method, url, params, idempotency_key)
+
+        if coalesce and openpay.coalesce_gets:
+            deadline_at = timeouts.resolve(self.timeout)[1]
+            fetch = send
+
+            def send():
+                return singleflight.default_group.do(
+                    key, fetch, timeouts.remaining(deadline_at))
+
+        response_cache = openpay.response_cache
+        if cache and response_cache is not None:
+            sent = []
+
+            def load():
+                sent.append(send())
+                return sent[0][0]
+
+            resp = response_cache.fetch(key, load)
+            # The key carries the API key the request is sent with.
+            return Response((resp, key[1]),
+                            attempts(sent[0]) if sent else 0)
+        return send()
+
+    def after_write(self, method, url, result):
+        """
+        Keep reads that began before a write from answering later ones:
+        detach the in-flight GETs it may have made stale and drop them
+        from openpay.response_cache.
+        """
+        abs_url = self.read_key(url, None)[0]
+        object_id = None
+        if result is not None and isinstance(result[0], dict):
+            object_id = result[0].get('id')
+        subtree = method in ('put', 'delete')
+        self.forget_inflight(abs_url, object_id, subtree)
+        response_cache = openpay.response_cache
+        if response_cache is not None:
+            response_cache.invalidate(abs_url, object_id, subtree=subtree)
 
-    def request(self, method, url, params=None):
-        rbody, rcode, my_api_key = self.request_raw(
-            method.lower(), url, params)
+    def forget_inflight(self, abs_url, object_id, subtree):
+        singleflight.default_group.forget(abs_url, object_id, subtree)
+
+    def _request(self, method, url, params, idempotency_key):
+        raw = self.request_raw(method, url, params, idempotency_key)
+        rbody, rcode, my_api_key = raw
         resp = self.interpret_response(rbody, rcode)
-        return resp, my_api_key
+        return Response((resp, my_api_key), attempts(raw))
+
+    def read_key(self, url, params):
+        abs_url = self.api_url(url)
+        if params:
+            abs_url = _build_api_url(abs_url, params)
+        return abs_url, self.api_key or openpay.api_key
+
+    def api_url(self, url):
+        """
+        The absolute URL of ``url``. Resource URLs are built for
+        openpay.merchant_id; a client made for another ``merchant_id``
+        sends them to that merchant instead.
+        """
+        if self.merchant_id is not None:
+            prefix = '/v1/%s/' % (openpay.merchant_id,)
+            if url.startswith(prefix):
+                url = '/v1/%s/%s' % (self.merchant_id, url[len(prefix):])
+        return "{0}{1}".format(openpay.get_api_base(), url)
+
+    def get_merchant_id(self):
+        return self.merchant_id or openpay.merchant_id
 
     def handle_api_error(self, rbody, rcode, resp):
         err = resp
@@ -90,15 +316,266 @@ class APIClient(object):
             raise error.CardError(
                 err.get('description'), err.get('request_id'),
                 err.get('error_code'), rbody, rcode, resp)
+        elif rcode == 429:
+            raise error.RateLimitError(
+                err.get('description'), rbody, rcode, resp)
         else:
             raise error.APIError(
                 "{0}, error code: {1}".format(err.get(
                     'description'),
                     resp['error_code']), rbody, rcode, resp)
 
-    def request_raw(self, method, url, params=None):
+    def request_stream(self, method, url, params=None):
+        """
+        Send a call to a list endpoint and return ``(items, api key)``,
+        where ``items`` yields the elements of the response array as they
+        are parsed off the connection (see openpay.streaming). Streamed
+        calls bypass coalescing and the response cache.
+        """
+        chunks, rcode, my_api_key = self.request_raw(
+            method.lower(), url, params, stream=True)
+        if not (200 <= rcode < 300):
+            # Error bodies are small; parse and raise them as usual.
+            self.interpret_response(b''.join(chunks), rcode)
+        return streaming.iter_array(chunks), my_api_key
+
+    def request_raw(self, method, url, params=None, idempotency_key=None,
+                    stream=False):
+        """
+        Mechanism for issuing an API call. With ``stream`` set the body is
+        returned as an iterator of byte chunks still to be read.
+        """
+        abs_url, headers, post_data, my_api_key = self.prepare_request(
+            method, url, params, idempotency_key)
+
+        policy = self.get_retry_policy()
+        breaker = self.get_circuit_breaker(abs_url)
+        limiter = self.get_rate_limiter()
+        slots = self.get_concurrency_limiter()
+        timeout, deadline_at = timeouts.resolve(self.timeout)
+        started = retry.clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            attempt_started = retry.clock()
+            rheaders = slot = None
+            try:
+                if limiter is not None:
+                    time.sleep(self.rate_limit_delay(limiter, deadline_at))
+                if slots is not None:
+                    slot = self.acquire_slot(slots, deadline_at)
+                attempt_started = retry.clock()
+                kwargs = self.attempt_kwargs(timeout, deadline_at)
+                if breaker is not None:
+                    breaker.before_request()
+                result = self.send(method, abs_url, headers, post_data,
+                                   my_api_key, kwargs, stream)
+                rbody, rcode, rheaders = _unpack_response(result)
+                exc = None
+            except error.APIConnectionError as e:
+                rbody, rcode, exc = None, None, e
+            except BaseException as e:
+                if slot is not None:
+                    slots.release(slot)
+                if breaker is not None and isinstance(e, Exception):
+                    breaker.record(exc=e)
+                raise
+            elapsed = retry.clock() - attempt_started
+
+            if slot is not None:
+                self.release_slot(slots, slot, rcode, exc, elapsed,
+                                  concurrency.endpoint(method, abs_url))
+            if breaker is not None and not isinstance(exc, _NOT_SENT):
+                breaker.record(rcode, exc, elapsed)
+
+            delay = policy.retry_delay(
+                method, headers, attempt, started, rcode, exc,
+                self.note_rate_limit(limiter, rcode, rheaders))
+            left = timeouts.remaining(deadline_at)
+            if delay is not None and left is not None and left <= delay:
+                delay = None
+            self.record_attempt(method, abs_url, attempt, rcode, exc,
+                                elapsed, delay)
+            if delay is None:
+                break
+            if stream:
+                # Release the connection of the response being retried.
+                close = getattr(rbody, 'close', None)
+                if close is not None:
+                    close()
+            time.sleep(delay)
+
+        if exc is not None:
+            raise exc
+
+        util.logger.info(
+            'API request to %s returned (response code, response body) of '
+            '(%d, %r)',
+            abs_url, rcode, rbody)
+        return Response((rbody, rcode, my_api_key), attempt)
+
+    def send(self, method, abs_url, headers, post_data, api_key, kwargs,
+             stream=False):
+        """
+        Make one attempt through the transport, hedged for GETs when a
+        hedge policy is configured. Streamed attempts are never hedged:
+        the losing request would hold its connection until read.
+        """
+        if stream:
+            if isinstance(self._client, http_client.HTTPClient):
+                return self._client.request_stream(
+                    method, abs_url, headers, post_data, user=api_key,
+                    **kwargs)
+            # Custom transports needn't subclass HTTPClient.
+            result = self._client.request(
+                method, abs_url, headers, post_data, user=api_key, **kwargs)
+            return (iter([result[0]]),) + tuple(result[1:])
+
+        def send_once():
+            return self._client.request(
+                method, abs_url, headers, post_data, user=api_key, **kwargs)
+
+        hedge_policy = self.hedge_policy or openpay.hedge_policy
+        if method == 'get' and hedge_policy is not None:
+            return hedge_policy.call(send_once, lambda: self.admit_hedge(
+                send_once, concurrency.endpoint(method, abs_url)))
+        return send_once()
+
+    def admit_hedge(self, send_once, endpoint=None):
+        """
+        Charge a hedged duplicate to the rate and concurrency limiters
+        like any other request and return the callable that sends it, or
+        None to skip the hedge when either has nothing to spare right now.
+        """
+        slots = self.get_concurrency_limiter()
+        slot = None
+        if slots is not None:
+            slot = slots.try_acquire()
+            if slot is None:
+                return None
+        limiter = self.get_rate_limiter()
+        if limiter is not None and \
+                limiter.reserve(self.get_merchant_id(), 0) is None:
+            if slot is not None:
+                slots.release(slot)
+            return None
+        if slot is None:
+            return send_once
+
+        def send_hedge():
+            started = retry.clock()
+            try:
+                result = send_once()
+            except error.APIConnectionError as e:
+                self.release_slot(slots, slot, None, e,
+                                  retry.clock() - started, endpoint)
+                raise
+            except BaseException:
+                slots.release(slot)
+                raise
+            self.release_slot(slots, slot, _unpack_response(result)[1],
+                              None, retry.clock() - started, endpoint)
+            return result
+
+        return send_hedge
+
+    def get_retry_policy(self):
+        return self.retry_policy or openpay.retry_policy or retry.NO_RETRY
+
+    def attempt_kwargs(self, timeout, deadline_at):
+        """
+        Transport keyword arguments for the next attempt, given the
+        (connect, read) ``timeout`` and the overall deadline of the call.
+        """
+        left = timeouts.remaining(deadline_at)
+        if left is not None and left <= 0:
+            raise error.DeadlineExceededError(
+                'The deadline for this Openpay request expired before it '
+                'could be sent.')
+        if timeout == (None, None) and deadline_at is None:
+            # Leave the transport's defaults (and custom transports that
+            # predate the timeout argument) alone.
+            return {}
+        defaults = getattr(self._client, 'timeout', (None, None))
+        return {'timeout': timeouts.for_attempt(timeout, deadline_at,
+                                                defaults)}
+
+    def get_rate_limiter(self):
+        return self.rate_limiter or openpay.rate_limiter
+
+    def rate_limit_delay(self, limiter, deadline_at):
         """
-        Mechanism for issuing an API call
+        Reserve a token from the current merchant's bucket and return how
+        long to wait before sending. No token is taken if the wait would
+        outlast the deadline.
+        """
+        wait = limiter.reserve(self.get_merchant_id(),
+                               timeouts.remaining(deadline_at))
+        if wait is None:
+            raise error.DeadlineExceededError(
+                'The deadline for this Openpay request would expire while '
+                'waiting for the client-side rate limit.')
+        return wait
+
+    def note_rate_limit(self, limiter, rcode, rheaders):
+        """
+        On a 429, pause the merchant's bucket for the Retry-After period
+        so other threads hold off too, and return that period.
+        """
+        if rcode != 429:
+            return None
+        retry_after = ratelimit.retry_after(rheaders)
+        if limiter is not None and retry_after:
+            limiter.pause(self.get_merchant_id(), retry_after)
+        return retry_after
+
+    def get_concurrency_limiter(self):
+        return self.concurrency_limiter or openpay.concurrency_limiter
+
+    def acquire_slot(self, limiter, deadline_at):
+        slot = limiter.acquire(timeouts.remaining(deadline_at))
+        if slot is None:
+            raise error.DeadlineExceededError(
+                'The deadline for this Openpay request expired while '
+                'waiting for a concurrency slot.')
+        return slot
+
+    def release_slot(self, limiter, slot, rcode, exc, elapsed,
+                     endpoint=None):
+        if isinstance(exc, _NOT_SENT):
+            limiter.release(slot)
+        else:
+            limiter.release(slot, elapsed,
+                            concurrency.is_overload(rcode, exc), endpoint)
+
+    def get_circuit_breaker(self, abs_url):
+        registry = openpay.circuit_breakers
+        if registry is None:
+            return None
+        return registry.get(urlsplit(abs_url).netloc)
+
+    def record_attempt(self, method, url, attempt, rcode, exc, elapsed,
+                       delay):
+        if exc is not None:
+            exc.attempts = attempt
+        if delay is not None:
+            util.logger.info(
+                'Retrying API request to %s in %.2fs (attempt %d, %s)',
+                url, delay, attempt, exc or 'response code %d' % (rcode,))
+
+        event = RequestEvent(method, url, attempt, rcode, exc, elapsed,
+                             delay is not None)
+        for hook in openpay.request_hooks:
+            try:
+                hook(event)
+            except Exception:
+                util.logger.exception('Request hook %r failed', hook)
+
+    def prepare_request(self, method, url, params=None,
+                        idempotency_key=None):
+        """
+        Resolve the API key, absolute URL, headers and body for a call
+        without sending it.
         """
         from openpay import api_version
 
@@ -116,63 +593,36 @@ class APIClient(object):
                 'for details, or email soporte@openpay.mx if you have any '
                 'questions.')
 
-        abs_url = "{0}{1}".format(openpay.get_api_base(), url)
+        abs_url = self.api_url(url)
 
         if method == 'get' or method == 'delete':
             if params:
                 abs_url = _build_api_url(abs_url, params)
             post_data = None
         elif method == 'post' or method == 'put':
-            post_data = json.dumps(params)
+            post_data = codec.dumps(params)
         else:
             raise error.APIConnectionError(
                 'Unrecognized HTTP method %r.  This may indicate a bug in the '
                 'Openpay bindings.  Please contact soportesu@openpay.mx for '
                 'assistance.' % (method,))
 
-        ua = {
-            'bindings_version': version.VERSION,
-            'lang': 'python',
-            'publisher': 'openpay',
-            'httplib': self._client.name
-        }
-        for attr, func in [['lang_version', platform.python_version],
-                           ['platform', platform.platform],
-                           ['uname', lambda: ' '.join(platform.uname())]]:
-            try:
-                val = func()
-            except Exception as e:
-                val = "!! %s" % (e,)
-            ua[attr] = val
-
-        headers = {
-            'X-Openpay-Client-User-Agent': json.dumps(ua),
-            'User-Agent': 'Openpay/v1 PythonBindings/%s' % (version.VERSION,),
-            'content-type': 'application/json',
-        }
+        headers = dict(_static_headers(self._client.name, api_version))
+        if idempotency_key:
+            headers[retry.IDEMPOTENCY_HEADER] = idempotency_key
 
-        if api_version is not None:
-            headers['Openpay-Version'] = api_version
-
-        rbody, rcode = self._client.request(
-            method, abs_url, headers, post_data, user=my_api_key)
-
-        util.logger.info(
-            'API request to %s returned (response code, response body) of '
-            '(%d, %r)',
-            abs_url, rcode, rbody)
-        return rbody, rcode, my_api_key
+        return abs_url, headers, post_data, my_api_key
 
     def interpret_response(self, rbody, rcode):
         try:
-            if hasattr(rbody, 'decode'):
-                rbody = rbody.decode('utf-8')
-
             if rcode == 204:
-                rbody = json.dumps({})
-
-            resp = json.loads(rbody)
+                resp = {}
+            else:
+                # Codecs parse the raw bytes; no need to decode first.
+                resp = codec.loads(rbody)
         except Exception:
+            if hasattr(rbody, 'decode'):
+                rbody = rbody.decode('utf-8', 'replace')
             raise error.APIError(
                 "Invalid response body from API: %s "
                 "(HTTP response code was %d)" % (rbody, rcode),
@@ -0,0 +1,156 @@
+"""
+Per-host circuit breakers.
+
+Enable them with::
+
+    openpay.circuit_breakers = openpay.breaker.CircuitBreakerRegistry(
+        failure_threshold=5, recovery_timeout=30)
+
+Every API request is then checked against the breaker of its API host
+(sandbox-api.openpay.mx, api.openpay.co, ...). Once that host keeps
+failing, requests fail immediately with error.CircuitOpenError instead of
+tying up a worker until the transport times out.
+"""
+import threading
+
+from openpay import error
+from openpay.retry import clock
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    Classic three-state breaker.
+
+    While CLOSED, a call fails when the transport raises, the API answers
+    5xx, or the call takes longer than ``slow_call_threshold`` seconds (if
+    set). ``failure_threshold`` consecutive failures OPEN the circuit.
+    After ``recovery_timeout`` seconds it goes HALF_OPEN and lets up to
+    ``half_open_max_calls`` trial requests through: a success closes the
+    circuit again, a failure reopens it.
+    """
+
+    def __init__(self, host, failure_threshold=5, recovery_timeout=30.0,
+                 slow_call_threshold=None, half_open_max_calls=1):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.slow_call_threshold = slow_call_threshold
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_calls = 0
+
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and \
+                clock() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._trial_calls = 0
+        return self._state
+
+    def before_request(self):
+        """
+        Raise CircuitOpenError if the request must not be sent now.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and \
+                    self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return
+
+            self.total_rejected += 1
+            if state == OPEN:
+                retry_after = max(0.0, self.recovery_timeout -
+                                  (clock() - self._opened_at))
+            else:
+                retry_after = 0.0
+        raise error.CircuitOpenError(
+            'Circuit breaker for %s is open after repeated failures; not '
+            'sending the request. Retry in %.1fs.' % (self.host, retry_after),
+            host=self.host, retry_after=retry_after)
+
+    def record(self, rcode=None, exc=None, elapsed=0.0):
+        """
+        Record the outcome of a request that before_request let through.
+        Failures of calls that were in flight when the circuit opened are
+        counted but leave it OPEN for the rest of ``recovery_timeout``.
+        """
+        failed = (exc is not None or (rcode is not None and rcode >= 500) or
+                  (self.slow_call_threshold is not None and
+                   elapsed > self.slow_call_threshold))
+
+        with self._lock:
+            if not failed:
+                self._state = CLOSED
+                self._consecutive_failures = 0
+                return
+
+            self.total_failures += 1
+            if self._current_state() == OPEN:
+                return
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or \
+                    self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.times_opened += 1
+                self._state = OPEN
+                self._opened_at = clock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'total_failures': self.total_failures,
+                'total_rejected': self.total_rejected,
+                'times_opened': self.times_opened,
+            }
+
+
+class CircuitBreakerRegistry(object):
+    """
+    Hands out one CircuitBreaker per API host, all built with the
+    keyword arguments given here.
+    """
+
+    def __init__(self, **settings):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(host)
+                if breaker is None:
+                    breaker = CircuitBreaker(host, **self._settings)
+                    self._breakers[host] = breaker
+        return breaker
+
+    def stats(self):
+        """
+        Return ``{host: breaker.stats()}`` for every host seen so far.
+        """
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return dict((b.host, b.stats()) for b in breakers)
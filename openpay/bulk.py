@@ -0,0 +1,285 @@
+"""
+Helpers for running many API calls at once over the shared, pooled
+transport (see openpay.default_http_client).
+
+``concurrency`` is a fixed number of calls in flight. Leave it as None to
+follow openpay.concurrency_limiter when one is configured (see
+openpay.concurrency), or DEFAULT_CONCURRENCY otherwise.
+"""
+import datetime
+import threading
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait)
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import openpay
+from openpay import timeouts
+
+DEFAULT_CONCURRENCY = 8
+# Largest ``limit`` the list endpoints accept.
+DEFAULT_PAGE_SIZE = 100
+
+# One outcome of a bulk operation. ``index`` is the position of ``params``
+# in the input; exactly one of ``result`` and ``error`` is set.
+# ``idempotency_key`` is the key the call was sent with, if any.
+BulkResult = namedtuple('BulkResult', ['index', 'params', 'result', 'error',
+                                       'idempotency_key'])
+
+
+def _capacity(concurrency):
+    """
+    Return ``(workers, capacity)``: the size of the thread pool, and a
+    callable giving how many calls to keep in flight right now.
+    """
+    if concurrency is None:
+        limiter = openpay.concurrency_limiter
+        if limiter is not None:
+            return max(1, limiter.max_limit), lambda: max(1, limiter.limit)
+        concurrency = DEFAULT_CONCURRENCY
+    concurrency = max(1, concurrency)
+    return concurrency, lambda: concurrency
+
+
+def retrieve_many(fetch, ids, concurrency=None):
+    """
+    Call ``fetch(id)`` for every distinct id in ``ids`` using at most
+    ``concurrency`` worker threads.
+
+    Returns a list aligned with ``ids``: each entry is the fetched object,
+    or the exception raised while fetching it (usually an OpenpayError),
+    so one bad id doesn't abort the batch. Repeated ids are fetched once
+    and share the result.
+    """
+    ids = list(ids)
+    unique = list(OrderedDict.fromkeys(ids))
+    fetch = timeouts.propagate(fetch)
+    results = {}
+
+    if unique:
+        workers = min(_capacity(concurrency)[0], len(unique))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = dict((pool.submit(fetch, id), id) for id in unique)
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+
+    return [results[id] for id in ids]
+
+
+def create_many(create, params_iter, concurrency=None, idempotent=False):
+    """
+    Call ``create(params)`` for each item of ``params_iter``, keeping at
+    most ``concurrency`` calls in flight, and yield a BulkResult for each
+    one as it completes (not in input order).
+
+    The input is consumed lazily, so it can be a generator over a large
+    file or query. Failed items are reported with their input index and
+    the exception raised so a run can be resumed or retried. With
+    ``idempotent`` set, items without an ``idempotency_key`` are sent with
+    a generated one; either way the key is reported, so a retried item
+    can't be created twice.
+    """
+    params_iter = enumerate(params_iter)
+    create = timeouts.propagate(create)
+    pending = {}
+
+    def submit_next(pool):
+        for index, params in params_iter:
+            key = params.get('idempotency_key')
+            sent = params
+            if key is None and idempotent:
+                key = str(uuid.uuid4())
+                sent = dict(params, idempotency_key=key)
+            pending[pool.submit(create, sent)] = (index, params, key)
+            return True
+        return False
+
+    workers, capacity = _capacity(concurrency)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while len(pending) < capacity() and submit_next(pool):
+            pass
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, params, key = pending.pop(future)
+                try:
+                    outcome = BulkResult(index, params, future.result(),
+                                         None, key)
+                except Exception as e:
+                    outcome = BulkResult(index, params, None, e, key)
+                # The adaptive limit may have moved since the last submit.
+                while len(pending) < capacity() and submit_next(pool):
+                    pass
+                yield outcome
+    finally:
+        # Stop feeding work if the caller abandons the generator early.
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+class _PageError(object):
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+_END = object()
+
+
+def iter_pages(fetch_page, filters=None, page_size=None, prefetch=1):
+    """
+    Yield every item of a list endpoint, walking it with offset/limit.
+
+    ``fetch_page(params)`` must return the items of one page. Pages are
+    requested with ``page_size`` (or the ``limit`` filter) capped at
+    DEFAULT_PAGE_SIZE, and iteration stops at the first page shorter
+    than that. With ``prefetch`` above zero the next pages are fetched on
+    a background thread while the caller consumes the current one; at
+    most ``prefetch`` fetched pages are held in memory besides the one
+    being consumed.
+    """
+    filters = dict(filters or {})
+    # A larger limit would come back as a short page of DEFAULT_PAGE_SIZE
+    # items and end the walk early.
+    page_size = min(int(page_size or filters.get('limit') or
+                        DEFAULT_PAGE_SIZE), DEFAULT_PAGE_SIZE)
+    offset = int(filters.get('offset', 0))
+
+    def pages():
+        params = dict(filters, limit=page_size)
+        current = offset
+        while True:
+            params['offset'] = current
+            page = fetch_page(dict(params))
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            current += len(page)
+
+    if prefetch <= 0:
+        source = pages()
+    else:
+        source = _prefetch(pages(), prefetch)
+
+    for page in source:
+        for item in page:
+            yield item
+
+
+def _prefetch(iterator, size):
+    buffered = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffered.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_PageError(e))
+            return
+        put(_END)
+
+    worker = threading.Thread(target=timeouts.propagate(produce),
+                              name='openpay-prefetch')
+    worker.daemon = True
+    worker.start()
+
+    try:
+        while True:
+            item = buffered.get()
+            if item is _END:
+                return
+            if isinstance(item, _PageError):
+                raise item.exc
+            yield item
+    finally:
+        stopped.set()
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def date_slices(start, end, slice_days=1):
+    """
+    Split the inclusive date range [start, end] into consecutive,
+    non-overlapping (gte, lte) ranges of at most ``slice_days`` days,
+    formatted the way the ``creation`` filter expects them.
+    """
+    start, end = _as_date(start), _as_date(end)
+    step = datetime.timedelta(days=max(1, int(slice_days)))
+    one_day = datetime.timedelta(days=1)
+    slices = []
+    while start <= end:
+        last = min(start + step - one_day, end)
+        slices.append((start.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')))
+        start = last + one_day
+    return slices
+
+
+def _creation_key(item):
+    return item.get('creation_date') or ''
+
+
+def iter_time_slices(fetch_slice, start, end, slice_days=1,
+                     concurrency=None):
+    """
+    Fetch the items created between ``start`` and ``end`` (inclusive
+    dates) by calling ``fetch_slice(gte, lte)`` for each sub-range from
+    date_slices, up to ``concurrency`` sub-ranges at a time.
+
+    Items are yielded in ascending ``creation_date`` order: slices are
+    emitted oldest first, each sorted on its own, and only the slices in
+    the fetch window are held in memory.
+    """
+    slices = iter(date_slices(start, end, slice_days))
+    fetch_slice = timeouts.propagate(fetch_slice)
+    window = deque()
+    workers, capacity = _capacity(concurrency)
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def fill():
+        while len(window) < capacity():
+            for gte, lte in slices:
+                window.append(pool.submit(fetch_slice, gte, lte))
+                break
+            else:
+                return
+
+    try:
+        fill()
+        while window:
+            items = window.popleft().result()
+            fill()
+            for item in sorted(items, key=_creation_key):
+                yield item
+    finally:
+        for future in window:
+            future.cancel()
+        pool.shutdown(wait=True)
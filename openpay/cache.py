@@ -0,0 +1,439 @@
+"""
+Read-through response cache for single-object reads.
+
+Enable with::
+
+    openpay.response_cache = openpay.cache.ResponseCache(ttl=300)
+
+``retrieve()`` and ``refresh()`` of the slowly-changing classes that opt
+in with ``_cacheable`` (Plan, Customer and BankAccount, also through
+``customer.bank_accounts.retrieve(...)``) then answer from the cache while
+an entry for the same URL and API key is fresh; charges, payouts and the
+like are always read from the API. Any POST, PUT or DELETE sent through the client (save,
+delete, refund, capture, subscription updates ...) drops the entries for
+its URL, the URLs above it (and below it, for PUT and DELETE), and the
+object it returns, so a write is never followed by a stale read.
+
+Entries live in a CacheBackend. The default MemoryBackend is private to
+the process; to share one cache between all the worker processes of a
+host, point them at the same SQLite file::
+
+    openpay.response_cache = openpay.cache.ResponseCache(
+        ttl=300, backend=openpay.cache.SQLiteBackend('/var/run/app/op.db'))
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+from openpay import codec
+from openpay.retry import clock
+
+
+def url_path(url):
+    return urlsplit(url).path.rstrip('/')
+
+
+def _object_id(value):
+    if isinstance(value, dict):
+        return value.get('id')
+    return None
+
+
+def _is_under(path, ancestor):
+    return path == ancestor or path.startswith(ancestor + '/')
+
+
+def is_stale(path, entry_id, written, object_id=None, subtree=False):
+    """
+    Whether a read of ``path`` that returned the object ``entry_id`` may be
+    stale after a write to the path ``written``: it reads that path or one
+    above it, or (with ``subtree``) one below it, or the object
+    ``object_id``. The rule of ResponseCache.invalidate, shared with the
+    coalescing of in-flight GETs (openpay.singleflight).
+    """
+    return (_is_under(written, path) or
+            (subtree and _is_under(path, written)) or
+            (object_id is not None and entry_id == object_id))
+
+
+class CacheBackend(object):
+    """
+    Storage behind a ResponseCache. Keys are ``(url, api_key)`` pairs and
+    values parsed JSON responses. Implementations must be safe to share
+    between threads.
+    """
+
+    def get(self, key):
+        """
+        Return the unexpired value stored for ``key``, or None.
+        """
+        raise NotImplementedError(
+            'CacheBackend subclasses must implement `get`')
+
+    def set(self, key, value, ttl, generation):
+        """
+        Store ``value`` for ``ttl`` seconds unless the cache has been
+        invalidated since ``generation`` was read. Returns the number of
+        entries evicted to make room.
+        """
+        raise NotImplementedError(
+            'CacheBackend subclasses must implement `set`')
+
+    def generation(self):
+        """
+        A counter bumped by every invalidate() and clear().
+        """
+        raise NotImplementedError(
+            'CacheBackend subclasses must implement `generation`')
+
+    def invalidate(self, url, object_id=None, subtree=False):
+        """
+        Drop the entries described in ResponseCache.invalidate and return
+        how many there were.
+        """
+        raise NotImplementedError(
+            'CacheBackend subclasses must implement `invalidate`')
+
+    def clear(self):
+        raise NotImplementedError(
+            'CacheBackend subclasses must implement `clear`')
+
+    def stats(self):
+        """
+        Return ``{'entries': ..., 'bytes': ...}``.
+        """
+        raise NotImplementedError(
+            'CacheBackend subclasses must implement `stats`')
+
+
+class _Entry(object):
+    __slots__ = ('value', 'expires_at', 'size', 'path', 'object_id')
+
+    def __init__(self, value, expires_at, size, path, object_id):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.path = path
+        self.object_id = object_id
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU holding at most ``max_entries`` entries and, if set,
+    ``max_bytes`` of JSON-encoded responses.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= clock():
+                self._remove(key)
+                return None
+            self._entries[key] = self._entries.pop(key)
+            return entry.value
+
+    def set(self, key, value, ttl, generation):
+        size = len(codec.dumps(value))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return 0
+        entry = _Entry(value, clock() + ttl, size, url_path(key[0]),
+                       _object_id(value))
+        evicted = 0
+        with self._lock:
+            if generation != self._generation:
+                return 0
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_bytes is not None and
+                     self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        return evicted
+
+    def generation(self):
+        return self._generation
+
+    def invalidate(self, url, object_id=None, subtree=False):
+        path = url_path(url)
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, entry in self._entries.items()
+                     if is_stale(entry.path, entry.object_id, path,
+                                 object_id, subtree)]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes}
+
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    '  key TEXT PRIMARY KEY, payload TEXT NOT NULL,'
+    '  expires_at REAL NOT NULL, size INTEGER NOT NULL,'
+    '  path TEXT NOT NULL, object_id TEXT)',
+    'CREATE INDEX IF NOT EXISTS entries_path ON entries (path)',
+    'CREATE INDEX IF NOT EXISTS entries_object_id ON entries (object_id)',
+    'CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)',
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)',
+    "INSERT OR IGNORE INTO meta VALUES ('generation', 0)",
+)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache stored in the SQLite database at ``path``, shared by every
+    process (and thread) that opens the same file. Responses are stored
+    as JSON and API keys only as hashes; the file is created readable by
+    its owner only. Beyond ``max_entries`` entries or ``max_bytes`` of
+    payload the entries closest to expiry are evicted.
+    """
+
+    def __init__(self, path, max_entries=10000, max_bytes=None,
+                 busy_timeout=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+
+        self._local = threading.local()
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        with self._transaction() as db:
+            for statement in _SCHEMA:
+                db.execute(statement)
+
+    def _connection(self):
+        # Connections must not cross threads or survive a fork.
+        pid = os.getpid()
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != pid:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db, self._local.pid = db, pid
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    @staticmethod
+    def _key(key):
+        url, api_key = key
+        digest = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
+        return '%s %s' % (digest, url)
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT payload FROM entries WHERE key = ? AND expires_at > ?',
+            (self._key(key), time.time())).fetchone()
+        if row is None:
+            return None
+        return codec.loads(row[0])
+
+    def set(self, key, value, ttl, generation):
+        payload = codec.dumps(value)
+        size = len(payload)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return 0
+        object_id = _object_id(value)
+        now = time.time()
+        with self._transaction() as db:
+            if self._generation(db) != generation:
+                return 0
+            db.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+            db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                (self._key(key), payload, now + ttl, size, url_path(key[0]),
+                 None if object_id is None else str(object_id)))
+            return self._evict(db)
+
+    def _evict(self, db):
+        evicted = 0
+        while True:
+            count, total = db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+            excess = max(0, count - self.max_entries)
+            if not excess and self.max_bytes is not None and \
+                    total > self.max_bytes:
+                excess = 1
+            if not excess:
+                return evicted
+            db.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries '
+                'ORDER BY expires_at LIMIT ?)', (excess,))
+            evicted += excess
+
+    @staticmethod
+    def _generation(db):
+        return db.execute(
+            "SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def _bump_generation(self, db):
+        db.execute("UPDATE meta SET value = value + 1 "
+                   "WHERE name = 'generation'")
+
+    def generation(self):
+        return self._generation(self._connection())
+
+    def invalidate(self, url, object_id=None, subtree=False):
+        path = url_path(url)
+        # Exact prefix tests rather than LIKE, whose wildcards (_) are
+        # common in Openpay ids.
+        where = ('path = :path OR '
+                 "substr(:path, 1, length(path) + 1) = path || '/'")
+        if subtree:
+            where += (" OR substr(path, 1, length(:path) + 1) = "
+                      ":path || '/'")
+        if object_id is not None:
+            where += ' OR object_id = :object_id'
+        with self._transaction() as db:
+            self._bump_generation(db)
+            cursor = db.execute(
+                'DELETE FROM entries WHERE ' + where,
+                {'path': path, 'object_id': None if object_id is None
+                 else str(object_id)})
+            return cursor.rowcount
+
+    def clear(self):
+        with self._transaction() as db:
+            self._bump_generation(db)
+            db.execute('DELETE FROM entries')
+
+    def stats(self):
+        count, total = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries '
+            'WHERE expires_at > ?', (time.time(),)).fetchone()
+        return {'entries': count, 'bytes': total}
+
+
+class _Transaction(object):
+    """
+    BEGIN IMMEDIATE ... COMMIT, so concurrent writers queue on SQLite's
+    lock instead of failing halfway through.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.db.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+class ResponseCache(object):
+    """
+    Read-through cache of parsed responses keyed by ``(url, api_key)``.
+    Entries live ``ttl`` seconds in ``backend``, by default a
+    MemoryBackend of ``max_entries`` entries and ``max_bytes`` bytes.
+    Hit and miss counters are per process.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=1000, max_bytes=None,
+                 backend=None):
+        self.ttl = ttl
+        self.backend = backend or MemoryBackend(max_entries, max_bytes)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self):
+        """
+        Bumped by every invalidation. Read it before fetching and hand
+        it to store() so a response fetched across a write is dropped.
+        """
+        return self.backend.generation()
+
+    def lookup(self, key):
+        """
+        Return the fresh value cached for ``key``, or None.
+        """
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def store(self, key, value, generation):
+        evicted = self.backend.set(key, value, self.ttl, generation)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def fetch(self, key, load):
+        """
+        Return the cached value for ``key``, or ``load()`` it and cache it.
+        """
+        value = self.lookup(key)
+        if value is None:
+            generation = self.generation
+            value = load()
+            self.store(key, value, generation)
+        return value
+
+    def invalidate(self, url, object_id=None, subtree=False):
+        """
+        Drop every entry for ``url`` or a URL above it (a customer when
+        one of its cards changes), or for the object ``object_id``. With
+        ``subtree`` also drop the URLs below it, as when deleting.
+        """
+        dropped = self.backend.invalidate(url, object_id, subtree)
+        with self._lock:
+            self.invalidations += dropped
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        stats = self.backend.stats()
+        with self._lock:
+            stats.update(hits=self.hits, misses=self.misses,
+                         evictions=self.evictions,
+                         invalidations=self.invalidations)
+        return stats
@@ -0,0 +1,137 @@
+"""
+JSON codecs for request and response bodies.
+
+The fastest installed library is picked automatically: orjson, then
+ujson, then simplejson, then the standard library. Force one with::
+
+    openpay.json_codec = openpay.codec.get('stdlib')
+
+or set it to any object with ``name``, ``dumps(obj) -> str`` and
+``loads(bytes_or_str)``. Responses are parsed straight from the bytes
+the transport returns; none of the codecs needs them decoded first.
+"""
+import json
+import sys
+
+import openpay
+
+
+class StdlibCodec(object):
+    name = 'stdlib'
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def loads(self, data):
+        if isinstance(data, bytes) and sys.version_info[:2] < (3, 6):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class SimplejsonCodec(object):
+    name = 'simplejson'
+
+    def __init__(self):
+        import simplejson
+        self._json = simplejson
+
+    def dumps(self, obj):
+        return self._json.dumps(obj)
+
+    def loads(self, data):
+        return self._json.loads(data)
+
+
+class UjsonCodec(object):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._json = ujson
+        self._fallback = StdlibCodec()
+
+    def dumps(self, obj):
+        try:
+            return self._json.dumps(obj, ensure_ascii=False)
+        except (TypeError, OverflowError):
+            return self._fallback.dumps(obj)
+
+    def loads(self, data):
+        return self._json.loads(data)
+
+
+class OrjsonCodec(object):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._json = orjson
+        self._fallback = StdlibCodec()
+
+    def dumps(self, obj):
+        try:
+            return self._json.dumps(obj).decode('utf-8')
+        except TypeError:
+            # Non-str keys, ints beyond 64 bits, ...: things the stdlib
+            # has always accepted in request params.
+            return self._fallback.dumps(obj)
+
+    def loads(self, data):
+        return self._json.loads(data)
+
+
+CODECS = (
+    ('orjson', OrjsonCodec),
+    ('ujson', UjsonCodec),
+    ('simplejson', SimplejsonCodec),
+    ('stdlib', StdlibCodec),
+)
+
+_default = None
+
+
+def get(name):
+    """
+    Return the codec called ``name``; raises ImportError if its library
+    isn't installed.
+    """
+    for codec_name, codec_class in CODECS:
+        if codec_name == name:
+            return codec_class()
+    raise ValueError('Unknown JSON codec %r; expected one of %s' % (
+        name, ', '.join(codec_name for codec_name, _ in CODECS)))
+
+
+def available():
+    """
+    Return an instance of every codec whose library is installed, fastest
+    first.
+    """
+    codecs = []
+    for _, codec_class in CODECS:
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            pass
+    return codecs
+
+
+def current():
+    """
+    The codec in use: openpay.json_codec if set, else the fastest one
+    available.
+    """
+    if openpay.json_codec is not None:
+        return openpay.json_codec
+    global _default
+    if _default is None:
+        _default = available()[0]
+    return _default
+
+
+def dumps(obj):
+    return current().dumps(obj)
+
+
+def loads(data):
+    return current().loads(data)
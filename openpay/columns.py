@@ -0,0 +1,146 @@
+"""
+Columnar views of list results, for vectorized analysis with NumPy.
+
+    cols = openpay.Charge.to_columns(
+        ['amount', 'creation_date', 'status'], limit=100)
+    completed = cols['status'].codes == cols['status'].categories.index(
+        'completed')
+    cols['amount'][completed].sum()
+
+Each field becomes one array with an entry per item:
+
+- ``number``: float64, NaN where missing.
+- ``datetime``: datetime64[s] in UTC, NaT where missing.
+- ``category``: a Categorical of int32 codes (-1 where missing) into
+  ``categories``, in order of first appearance.
+- ``bool``: bool, False where missing.
+- ``object``: anything else, as is.
+
+The kind is inferred from the first value present unless given. Values are
+read straight from the parsed response (nested ones with dotted names,
+e.g. ``card.brand``). The class method (``Charge.to_columns``) builds no
+object at all; ``ListObject.to_columns`` on a page already fetched builds
+none beyond the page's own items, and none with openpay.lazy_objects or
+``compact=True``. Requires NumPy (``pip install openpay[columns]``).
+"""
+import numbers
+import re
+import sys
+from collections import namedtuple, OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if sys.version_info >= (3, 0):
+    _STRING_TYPES = (str,)
+else:
+    _STRING_TYPES = (str, unicode)  # noqa: F821
+
+NUMBER = 'number'
+DATETIME = 'datetime'
+CATEGORY = 'category'
+BOOL = 'bool'
+OBJECT = 'object'
+
+Categorical = namedtuple('Categorical', ['codes', 'categories'])
+
+_DATETIME = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d')
+_UTC_OFFSET = re.compile(r'([+-])(\d\d):?(\d\d)$')
+
+
+def to_columns(items, fields):
+    """
+    Return an OrderedDict mapping each of ``fields`` to a column of its
+    values across ``items`` (parsed list items, resource objects or
+    CompactObjects; any iterable, consumed once). ``fields`` holds names,
+    or ``(name, kind)`` pairs to skip inference.
+    """
+    if numpy is None:
+        raise ImportError(
+            'to_columns requires NumPy. Install it with '
+            '"pip install openpay[columns]".')
+
+    specs = [(field, None) if isinstance(field, _STRING_TYPES) else field
+             for field in fields]
+    paths = [name.split('.') for name, _ in specs]
+    values = [[] for _ in specs]
+    for item in items:
+        for path, column in zip(paths, values):
+            column.append(lookup(item, path))
+
+    return OrderedDict(
+        (name, _column(column, kind or _infer(column)))
+        for (name, kind), column in zip(specs, values))
+
+
+def lookup(item, path):
+    """
+    The value at ``path`` (a list of keys) in ``item``, or None if any
+    step is missing.
+    """
+    for key in path:
+        if item is None:
+            return None
+        if isinstance(item, dict):
+            # dict.get: read lazy objects' values without converting them.
+            item = dict.get(item, key)
+        else:
+            item = item.get(key)
+    return item
+
+
+def _infer(values):
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return BOOL
+        if isinstance(value, numbers.Real):
+            return NUMBER
+        if isinstance(value, _STRING_TYPES):
+            if _DATETIME.match(value):
+                return DATETIME
+            return CATEGORY
+        return OBJECT
+    return OBJECT
+
+
+def _column(values, kind):
+    if kind == NUMBER:
+        return numpy.array([numpy.nan if v is None else v for v in values],
+                           dtype=numpy.float64)
+    if kind == DATETIME:
+        local = numpy.array([v[:19] if v else 'NaT' for v in values],
+                            dtype='datetime64[s]')
+        offsets = numpy.array([utc_offset(v) for v in values],
+                              dtype='timedelta64[s]')
+        return local - offsets
+    if kind == CATEGORY:
+        index = {}
+        codes = numpy.array(
+            [-1 if v is None else index.setdefault(v, len(index))
+             for v in values], dtype=numpy.int32)
+        return Categorical(codes, sorted(index, key=index.get))
+    if kind == BOOL:
+        return numpy.array([bool(v) for v in values], dtype=numpy.bool_)
+    if kind == OBJECT:
+        column = numpy.empty(len(values), dtype=object)
+        for i, v in enumerate(values):
+            column[i] = v
+        return column
+    raise ValueError('Unknown column kind %r; expected one of %s' % (
+        kind, ', '.join((NUMBER, DATETIME, CATEGORY, BOOL, OBJECT))))
+
+
+def utc_offset(value):
+    """
+    Seconds east of UTC of an ISO 8601 timestamp ("-06:00", "Z", none).
+    """
+    match = value and _UTC_OFFSET.search(value)
+    if not match:
+        return 0
+    sign, hours, minutes = match.groups()
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    return -seconds if sign == '-' else seconds
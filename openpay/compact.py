@@ -0,0 +1,155 @@
+"""
+Compact read-only representation of list results.
+
+Pass ``compact=True`` to a list call (``Charge.all``, ``iter_all``,
+``stream``, ``customer.charges.all``, ...) to get its items as
+CompactObjects instead of resource objects::
+
+    for charge in openpay.Charge.iter_all(compact=True):
+        totals[charge.status] += charge.amount
+
+A CompactObject supports the same attribute and mapping access as a
+BaseObject, but can't be modified, saved or refreshed. It keeps its
+values in a tuple and shares the key layout with every object of the
+same shape, so a page of charges takes a fraction of the memory of the
+equivalent BaseObjects (see benchmarks/bench_memory.py).
+"""
+import json
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Key layouts seen so far, by key tuple. Responses of one endpoint share a
+# handful of them; the cap only guards against unbounded growth.
+MAX_SHAPES = 1024
+_shapes = {}
+
+
+class _Shape(object):
+    __slots__ = ('keys', 'index')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((k, i) for i, k in enumerate(keys))
+
+
+def _shape(keys):
+    shape = _shapes.get(keys)
+    if shape is None:
+        if len(_shapes) >= MAX_SHAPES:
+            _shapes.clear()
+        shape = _shapes.setdefault(keys, _Shape(keys))
+    return shape
+
+
+def convert(value):
+    """
+    Return ``value`` (parsed JSON) with every dict in it turned into a
+    CompactObject.
+    """
+    if isinstance(value, dict):
+        return CompactObject(value)
+    if isinstance(value, list):
+        return [convert(v) for v in value]
+    return value
+
+
+class CompactObject(object):
+    """
+    Immutable mapping built from a parsed JSON object, with its keys also
+    readable as attributes.
+    """
+    __slots__ = ('_shape', '_values')
+
+    def __init__(self, values):
+        shape = _shape(tuple(values))
+        object.__setattr__(self, '_shape', shape)
+        object.__setattr__(self, '_values', tuple(
+            convert(values[k]) for k in shape.keys))
+
+    def __getattr__(self, k):
+        if k[0] == '_':
+            raise AttributeError(k)
+        try:
+            return self._values[self._shape.index[k]]
+        except KeyError:
+            raise AttributeError(k)
+
+    def __setattr__(self, k, v):
+        raise TypeError('CompactObject is read-only')
+
+    __setitem__ = __delattr__ = __delitem__ = __setattr__
+
+    def __getitem__(self, k):
+        return self._values[self._shape.index[k]]
+
+    def get(self, k, default=None):
+        i = self._shape.index.get(k)
+        return default if i is None else self._values[i]
+
+    def __contains__(self, k):
+        return k in self._shape.index
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self):
+        return list(self._shape.keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._shape.keys, self._values))
+
+    def __eq__(self, other):
+        if isinstance(other, CompactObject):
+            return (self._shape.keys == other._shape.keys and
+                    self._values == other._values)
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return CompactObject, (self.to_dict(),)
+
+    def to_dict(self):
+        """
+        Return a plain dict copy, with nested objects converted too.
+        """
+        return dict((k, _to_plain(v))
+                    for k, v in zip(self._shape.keys, self._values))
+
+    def __repr__(self):
+        ident_parts = [type(self).__name__]
+        if self.get('object'):
+            ident_parts.append(str(self.get('object')))
+        if self.get('id'):
+            ident_parts.append('id=%s' % (self.get('id'),))
+        return '<%s at %s> JSON: %s' % (
+            ' '.join(ident_parts), hex(id(self)), str(self))
+
+    def __str__(self):
+        return json.dumps(self.to_dict(), sort_keys=True, indent=2)
+
+
+Mapping.register(CompactObject)
+
+
+def _to_plain(value):
+    if isinstance(value, CompactObject):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_plain(v) for v in value]
+    return value
@@ -0,0 +1,171 @@
+"""
+Adaptive concurrency limiting.
+
+Enable with::
+
+    openpay.concurrency_limiter = openpay.concurrency.AdaptiveLimiter()
+
+Every HTTP attempt then needs a slot from the limiter, so the number of
+requests in flight across all threads (and coroutines of the async
+client) never exceeds ``limiter.limit``. The limit follows AIMD: it grows
+by one per ``limit`` successful requests while at least half of it is in
+use, and shrinks by ``backoff_ratio`` when Openpay answers 5xx or 429,
+a connection fails, or latency climbs past ``latency_tolerance`` times the
+best latency seen recently for the same endpoint (a page of 100 charges
+is expected to take longer than retrieving one). The bulk helpers size their worker pools from
+it, so a nightly job can simply ask for ``concurrency=None``.
+"""
+import threading
+
+from openpay.retry import clock
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+
+class AdaptiveLimiter(object):
+    """
+    AIMD limit on concurrent requests, between ``min_limit`` and
+    ``max_limit`` and starting at ``initial_limit``.
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=64,
+                 backoff_ratio=0.75, latency_tolerance=2.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+
+        self._cond = threading.Condition(threading.Lock())
+        self._limit = float(min(max_limit, max(min_limit, initial_limit)))
+        self._in_flight = 0
+        # Best recent latency of each endpoint passed to release().
+        self._baselines = {}
+        self._last_decrease = 0.0
+        self._listeners = []
+
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def try_acquire(self):
+        """
+        Take a slot if one is free and return its start time, else None.
+        """
+        with self._cond:
+            if self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return clock()
+            return None
+
+    def acquire(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds (forever if None) for a slot.
+        Returns the slot's start time to pass to release(), or None if
+        the timeout expired first.
+        """
+        deadline = None if timeout is None else clock() + timeout
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                left = None if deadline is None else deadline - clock()
+                if left is not None and left <= 0:
+                    return None
+                self._cond.wait(left)
+            self._in_flight += 1
+            return clock()
+
+    def release(self, started, elapsed=None, failed=False, endpoint=None):
+        """
+        Free the slot taken at ``started`` and adjust the limit. Pass the
+        request's ``elapsed`` time, and ``failed=True`` if Openpay signalled
+        overload; leave both unset when nothing was sent. ``endpoint``
+        (see endpoint()) picks the latency baseline ``elapsed`` is judged
+        against.
+        """
+        with self._cond:
+            # Only grow a limit that is actually being used.
+            busy = self._in_flight * 2 >= int(self._limit)
+            self._in_flight -= 1
+
+            if elapsed is not None and not failed:
+                baseline = self._baselines.get(endpoint)
+                if baseline is None or elapsed < baseline:
+                    baseline = elapsed
+                else:
+                    # Let the baseline drift up slowly so one lucky fast
+                    # call doesn't pin it forever.
+                    baseline += (elapsed - baseline) * 0.01
+                self._baselines[endpoint] = baseline
+                failed = elapsed > baseline * self.latency_tolerance
+
+            if failed:
+                self.failures += 1
+                # Requests that started before the last decrease report
+                # on the old limit; only cut once per such generation.
+                if started >= self._last_decrease:
+                    self._limit = max(float(self.min_limit),
+                                      self._limit * self.backoff_ratio)
+                    self._last_decrease = clock()
+                    self.decreases += 1
+            elif elapsed is not None:
+                self.successes += 1
+                if busy:
+                    self._limit = min(float(self.max_limit),
+                                      self._limit + 1.0 / self._limit)
+
+            self._cond.notify_all()
+            listeners, self._listeners = self._listeners, []
+        for listener in listeners:
+            listener()
+
+    def add_listener(self, callback):
+        """
+        Call ``callback()`` (once, from whichever thread frees it) the
+        next time a slot is released. Used by the async client to wait
+        without blocking its event loop.
+        """
+        with self._cond:
+            self._listeners.append(callback)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'successes': self.successes,
+                'failures': self.failures,
+                'decreases': self.decreases,
+            }
+
+
+def endpoint(method, url):
+    """
+    The endpoint ``url`` belongs to, e.g. ``get /v1/*/customers/*/cards``:
+    the path with the merchant and object ids wildcarded.
+    """
+    segments = urlsplit(url).path.strip('/').split('/')
+    # /v1/{merchant_id}/customers/{id}/cards/{id}/...: names alternate
+    # with ids after the merchant.
+    template = [segment if i < 1 or (i > 1 and i % 2 == 0) else '*'
+                for i, segment in enumerate(segments)]
+    return '%s /%s' % (method, '/'.join(template))
+
+
+def is_overload(rcode=None, exc=None):
+    """
+    Whether an attempt's outcome means Openpay (or the path to it) is
+    overloaded.
+    """
+    if exc is not None:
+        return True
+    return rcode is not None and (rcode == 429 or rcode >= 500)
@@ -22,10 +22,26 @@ class APIError(OpenpayError):
     pass
 
 
+class RateLimitError(APIError):
+    pass
+
+
 class APIConnectionError(OpenpayError):
     pass
 
 
+class DeadlineExceededError(APIConnectionError):
+    pass
+
+
+class CircuitOpenError(APIConnectionError):
+
+    def __init__(self, message, host=None, retry_after=None):
+        super(CircuitOpenError, self).__init__(message)
+        self.host = host
+        self.retry_after = retry_after
+
+
 class CardError(OpenpayError):
 
     def __init__(self, message, param, code, http_body=None,
@@ -0,0 +1,252 @@
+"""
+Streaming export of list results to CSV, Arrow and Parquet.
+
+    with open('charges-2024-03-01.csv', 'w', newline='') as f:
+        openpay.export.write_csv(
+            openpay.Charge.iter_all(compact=True, creation=day),
+            f, openpay.export.CHARGE_COLUMNS)
+
+    openpay.export.write_parquet(
+        openpay.Payout.iter_all(compact=True, creation=day),
+        'payouts-2024-03-01.parquet', openpay.export.PAYOUT_COLUMNS)
+
+Items are consumed one at a time from any iterable (``iter_all``,
+``stream``, ``ListObject.data``, ...) and flattened into rows by a column
+spec: a sequence of Columns naming a field, nested ones dotted
+(``card.brand``), and its type. CSV needs only the standard library;
+Arrow and Parquet need pyarrow (``pip install openpay[export]``) and are
+written in batches / row groups of ``batch_size`` rows, so memory stays
+bounded by one batch plus whatever the source holds (a page for
+``iter_all``, one item for ``stream``).
+"""
+import csv
+import datetime
+import sys
+from collections import namedtuple
+
+from openpay.columns import lookup, utc_offset
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# ``path`` is the dotted field to read; ``type`` one of STRING, FLOAT,
+# INT, BOOL or TIMESTAMP (ISO 8601 strings, exported in UTC).
+Column = namedtuple('Column', ['name', 'path', 'type'])
+
+STRING = 'string'
+FLOAT = 'float'
+INT = 'int'
+BOOL = 'bool'
+TIMESTAMP = 'timestamp'
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def column(path, type=STRING, name=None):
+    """
+    A Column for ``path``, named after it with dots turned to underscores
+    unless ``name`` is given.
+    """
+    return Column(name or path.replace('.', '_'), path, type)
+
+
+_COMMON_COLUMNS = (
+    column('id'),
+    column('creation_date', TIMESTAMP),
+    column('operation_date', TIMESTAMP),
+    column('status'),
+    column('method'),
+    column('transaction_type'),
+    column('amount', FLOAT),
+    column('currency'),
+    column('order_id'),
+    column('description'),
+    column('customer_id'),
+)
+
+CHARGE_COLUMNS = _COMMON_COLUMNS + (
+    column('authorization'),
+    column('operation_type'),
+    column('conciliated', BOOL),
+    column('error_message'),
+    column('card.brand'),
+    column('card.type'),
+    column('card.card_number'),
+    column('card.holder_name'),
+    column('card.bank_name'),
+    column('fee.amount', FLOAT),
+    column('fee.tax', FLOAT),
+    column('fee.currency'),
+)
+
+PAYOUT_COLUMNS = _COMMON_COLUMNS + (
+    column('bank_account.clabe'),
+    column('bank_account.holder_name'),
+    column('bank_account.bank_name'),
+    column('fee.amount', FLOAT),
+    column('fee.tax', FLOAT),
+    column('fee.currency'),
+)
+
+TRANSFER_COLUMNS = _COMMON_COLUMNS + (
+    column('fee.amount', FLOAT),
+    column('fee.tax', FLOAT),
+    column('fee.currency'),
+)
+
+
+def rows(items, columns):
+    """
+    Yield one tuple per item with its values for ``columns``, as found in
+    the response (None where missing).
+    """
+    paths = [c.path.split('.') for c in columns]
+    for item in items:
+        yield tuple(lookup(item, path) for path in paths)
+
+
+def write_csv(items, fileobj, columns, header=True):
+    """
+    Write ``items`` as CSV rows to the text file ``fileobj`` (open it
+    with ``newline=''``) and return how many were written. Values are
+    converted to their column's type as for Arrow, timestamps written as
+    ISO 8601 in UTC (``2024-03-01T17:00:00Z``). Missing values are left
+    empty.
+    """
+    converters = [_csv_converter(c.type) for c in columns]
+    writer = csv.writer(fileobj)
+    if header:
+        writer.writerow(_csv_row([c.name for c in columns]))
+    count = 0
+    for row in rows(items, columns):
+        writer.writerow(_csv_row(
+            [None if v is None else convert(v)
+             for convert, v in zip(converters, row)]))
+        count += 1
+    return count
+
+
+def _csv_converter(type):
+    if type == STRING:
+        return lambda v: v
+    if type == FLOAT:
+        return float
+    if type == INT:
+        return int
+    if type == BOOL:
+        return bool
+    if type == TIMESTAMP:
+        return _csv_timestamp
+    return _unknown_type(type)
+
+
+def _csv_timestamp(value):
+    value = _utc_datetime(value)
+    return value and value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _csv_row(row):
+    row = ['' if v is None else v for v in row]
+    if sys.version_info < (3, 0):
+        # The Python 2 csv module only writes byte strings.
+        row = [v.encode('utf-8') if isinstance(v, unicode) else v  # noqa
+               for v in row]
+    return row
+
+
+def schema(columns):
+    """
+    The pyarrow schema for ``columns``.
+    """
+    _require_pyarrow()
+    return pyarrow.schema([(c.name, _arrow_type(c.type)) for c in columns])
+
+
+def write_arrow(items, sink, columns, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write ``items`` to ``sink`` (a path or binary file) in the Arrow IPC
+    file format, ``batch_size`` rows per record batch. Returns how many
+    rows were written.
+    """
+    arrow_schema = schema(columns)
+    with pyarrow.ipc.new_file(sink, arrow_schema) as writer:
+        return _write_batches(items, columns, arrow_schema, batch_size,
+                              writer.write_batch)
+
+
+def write_parquet(items, where, columns, batch_size=DEFAULT_BATCH_SIZE,
+                  compression='snappy'):
+    """
+    Write ``items`` to ``where`` (a path or binary file) as Parquet, one
+    row group per ``batch_size`` rows. Returns how many rows were
+    written.
+    """
+    arrow_schema = schema(columns)
+    with pyarrow.parquet.ParquetWriter(
+            where, arrow_schema, compression=compression) as writer:
+        return _write_batches(
+            items, columns, arrow_schema, batch_size,
+            lambda batch: writer.write_table(
+                pyarrow.Table.from_batches([batch])))
+
+
+def _write_batches(items, columns, arrow_schema, batch_size, write):
+    count = 0
+    batch = []
+    for row in rows(items, columns):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            write(_record_batch(batch, columns, arrow_schema))
+            count += len(batch)
+            batch = []
+    if batch or not count:
+        write(_record_batch(batch, columns, arrow_schema))
+        count += len(batch)
+    return count
+
+
+def _record_batch(batch, columns, arrow_schema):
+    arrays = []
+    for i, c in enumerate(columns):
+        values = [row[i] for row in batch]
+        if c.type == TIMESTAMP:
+            values = [_utc_datetime(v) for v in values]
+        arrays.append(pyarrow.array(values, type=arrow_schema.field(i).type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+
+
+def _utc_datetime(value):
+    if not value:
+        return None
+    local = datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    return local - datetime.timedelta(seconds=utc_offset(value))
+
+
+def _arrow_type(type):
+    if type == STRING:
+        return pyarrow.string()
+    if type == FLOAT:
+        return pyarrow.float64()
+    if type == INT:
+        return pyarrow.int64()
+    if type == BOOL:
+        return pyarrow.bool_()
+    if type == TIMESTAMP:
+        return pyarrow.timestamp('s', tz='UTC')
+    _unknown_type(type)
+
+
+def _unknown_type(type):
+    raise ValueError('Unknown column type %r; expected one of %s' % (
+        type, ', '.join((STRING, FLOAT, INT, BOOL, TIMESTAMP))))
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError(
+            'Arrow and Parquet export require pyarrow. Install it with '
+            '"pip install openpay[export]".')
@@ -0,0 +1,185 @@
+"""
+Hedged GET requests.
+
+Enable with ``openpay.hedge_policy = openpay.hedge.HedgePolicy()`` (or
+pass ``hedge_policy`` to an APIClient). When a GET hasn't answered within
+the recent ``percentile`` latency, a second identical request is sent on
+another pooled connection and whichever answers first is used. The
+slower one is left to finish in the background and its result dropped.
+"""
+import bisect
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from openpay.retry import clock
+
+
+class HedgePolicy(object):
+    """
+    ``percentile`` of the last ``window`` GET latencies, clamped to
+    [min_delay, max_delay], is how long to wait before hedging. Until
+    ``min_samples`` latencies have been seen ``initial_delay`` is used.
+    Requests run on a pool of ``max_workers`` threads shared by all
+    clients using this policy; when all are busy, GETs are sent unhedged
+    from the calling thread.
+    """
+
+    def __init__(self, percentile=95, min_delay=0.05, max_delay=2.0,
+                 initial_delay=0.5, window=200, min_samples=20,
+                 max_workers=16):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+        self._pool = None
+        self._busy = 0
+
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedges_skipped = 0
+
+    def delay(self):
+        with self._lock:
+            if len(self._sorted) < self.min_samples:
+                return self.initial_delay
+            index = int(len(self._sorted) * self.percentile / 100.0)
+            value = self._sorted[min(index, len(self._sorted) - 1)]
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def _record_latency(self, elapsed):
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                oldest = self._samples[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._samples.append(elapsed)
+            bisect.insort(self._sorted, elapsed)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+            return self._pool
+
+    def call(self, send, admit_hedge=None):
+        """
+        Run ``send()``, hedging it with a second call if it is slow, and
+        return the first successful result. If both calls fail the
+        original call's exception is raised. ``admit_hedge()``, if given,
+        is called when it is time to hedge and returns the callable that
+        sends the hedge, or None to skip it.
+
+        The hedge delay counts from when the call starts on a worker, not
+        from when it was queued. While every worker is busy the call runs
+        on the calling thread and isn't hedged: the hedge would only
+        queue behind the same requests.
+        """
+        with self._lock:
+            self.requests += 1
+
+        first = self._start(lambda: send)
+        if first is None:
+            with self._lock:
+                self.hedges_skipped += 1
+            started = clock()
+            result = send()
+            self._record_latency(clock() - started)
+            return result
+
+        first.started.wait()
+        done, _ = wait([first.future], timeout=max(
+            0, self.delay() - (clock() - first.started_at)))
+        if done:
+            if first.future.exception() is None:
+                self._record_latency(clock() - first.started_at)
+            return first.future.result()
+
+        second = self._start(admit_hedge or (lambda: send))
+        if second is None:
+            with self._lock:
+                self.hedges_skipped += 1
+            return first.future.result()
+        with self._lock:
+            self.hedges_fired += 1
+
+        pending = set([first.future, second.future])
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Track how long the caller waited, whichever won.
+                    self._record_latency(clock() - first.started_at)
+                    if future is second.future:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return future.result()
+        return first.future.result()
+
+    def _start(self, admit):
+        # Submit the callable admit() returns to the pool, or return None
+        # if no worker is free or admit() returns None.
+        with self._lock:
+            if self._busy >= self.max_workers:
+                return None
+            self._busy += 1
+        try:
+            send = admit()
+        except BaseException:
+            self._finished()
+            raise
+        if send is None:
+            self._finished()
+            return None
+        attempt = _Attempt(send, self._finished)
+        try:
+            attempt.future = self._get_pool().submit(attempt)
+        except Exception:
+            self._finished()
+            raise
+        return attempt
+
+    def _finished(self):
+        with self._lock:
+            self._busy -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges_fired': self.hedges_fired,
+                'hedges_won': self.hedges_won,
+                'hedges_skipped': self.hedges_skipped,
+            }
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+class _Attempt(object):
+    # One send() on the pool, noting when a worker actually picked it up.
+
+    def __init__(self, send, finished):
+        self.send = send
+        self.finished = finished
+        self.started = threading.Event()
+        self.started_at = None
+        self.future = None
+
+    def __call__(self):
+        self.started_at = clock()
+        self.started.set()
+        try:
+            return self.send()
+        finally:
+            self.finished()
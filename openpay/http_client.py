@@ -1,10 +1,11 @@
 from __future__ import unicode_literals
 from future.builtins import str
-from future.builtins import bytes
 
 import os
+import socket
 import sys
 import textwrap
+import threading
 import warnings
 
 from openpay import error
@@ -15,10 +16,12 @@ from openpay import error
 # - Fall back to urllib2 with a warning if needed
 try:
     import ssl, urllib2
+    from httplib import HTTPException
     # import contextlib
 except ImportError:
     import urllib.request
     import urllib.error
+    from http.client import HTTPException
 
 try:
     # base64.encodestring is deprecated in Python 3.x
@@ -43,6 +46,46 @@ except ImportError:
     urlfetch = None
 
 
+_auth_header_cache = {}
+
+# (connect, read) timeouts in seconds used when neither the transport nor
+# the call specifies one.
+DEFAULT_TIMEOUT = (30, 80)
+
+# Bytes read at a time from streamed responses.
+CHUNK_SIZE = 64 * 1024
+
+
+def timeout_pair(timeout):
+    """
+    Normalize a timeout given as a number, a (connect, read) pair or None
+    (meaning DEFAULT_TIMEOUT) to a (connect, read) pair.
+    """
+    if timeout is None:
+        return DEFAULT_TIMEOUT
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return (DEFAULT_TIMEOUT[0] if connect is None else connect,
+                DEFAULT_TIMEOUT[1] if read is None else read)
+    return timeout, timeout
+
+
+def basic_auth_header(user):
+    """
+    Return the ``Authorization`` header value for ``user``, memoizing it
+    since the same handful of API keys sign every request.
+    """
+    header = _auth_header_cache.get(user)
+    if header is None:
+        user_string = '%s:%s' % (user, '')
+        header = encodebytes(user_string.encode('utf-8'))
+        header = "Basic %s" % header.decode('utf-8').replace('\n', '')
+        if len(_auth_header_cache) >= 64:
+            _auth_header_cache.clear()
+        _auth_header_cache[user] = header
+    return header
+
+
 def new_default_http_client(*args, **kwargs):
     if urlfetch:
         impl = UrlFetchClient
@@ -64,43 +107,120 @@ def new_default_http_client(*args, **kwargs):
 
 class HTTPClient(object):
 
-    def __init__(self, verify_ssl_certs=True):
+    def __init__(self, verify_ssl_certs=True, timeout=None):
         self._verify_ssl_certs = verify_ssl_certs
-
-    def request(self, method, url, headers, post_data=None, user=None):
+        self.timeout = timeout_pair(timeout)
+
+    def request(self, method, url, headers, post_data=None, user=None,
+                timeout=None):
+        """
+        Send the request and return ``(body, status_code, headers)``.
+        ``timeout`` is a (connect, read) pair overriding the client's
+        default. APIClient also accepts a plain ``(body, status_code)``
+        from transports that don't expose response headers.
+        """
         raise NotImplementedError(
             'HTTPClient subclasses must implement `request`')
 
+    def request_stream(self, method, url, headers, post_data=None,
+                       user=None, timeout=None):
+        """
+        Like request(), but return the body as an iterator of byte chunks
+        read off the connection as they are consumed. Transports that
+        can't stream return the whole body as a single chunk.
+        """
+        result = self.request(method, url, headers, post_data, user=user,
+                              timeout=timeout)
+        return (iter([result[0]]),) + tuple(result[1:])
 
-class RequestsClient(HTTPClient):
-    name = 'requests'
+    def close(self):
+        pass
 
-    def request(self, method, url, headers, post_data=None, user=None):
-        kwargs = {}
+    def __enter__(self):
+        return self
 
-        if self._verify_ssl_certs:
-            kwargs['verify'] = os.path.join(
-                os.path.dirname(__file__), 'data/ca-certificates.crt')
-        else:
-            kwargs['verify'] = False
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _StreamedBody(object):
+    """
+    The body of a streamed requests response, as an iterator of byte
+    chunks. close() releases the connection even before the first chunk
+    is read, which closing a generator that hasn't started wouldn't do.
+    """
 
+    def __init__(self, client, result):
+        self._client = client
+        self._result = result
+        self._chunks = result.iter_content(CHUNK_SIZE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
         try:
-            try:
-                result = requests.request(method,
-                                          url,
-                                          headers=headers,
-                                          data=post_data,
-                                          timeout=80,
-                                          auth=(user, ''),
-                                          ** kwargs)
-            except TypeError as e:
-                raise TypeError(
-                    'Warning: It looks like your installed version of the '
-                    '"requests" library is not compatible with Openpay\'s '
-                    'usage thereof. (HINT: The most likely cause is that '
-                    'your "requests" library is out of date. You can fix '
-                    'that by running "pip install -U requests".) The '
-                    'underlying error was: %s' % (e,))
+            return next(self._chunks)
+        except StopIteration:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            self._client._handle_request_error(e)
+
+    next = __next__
+
+    def close(self):
+        self._result.close()
+
+
+class RequestsClient(HTTPClient):
+    name = 'requests'
+
+    def __init__(self, verify_ssl_certs=True, pool_connections=10,
+                 pool_maxsize=10, pool_block=False, timeout=None):
+        super(RequestsClient, self).__init__(verify_ssl_certs, timeout)
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._pool_block = pool_block
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._adapter = None
+
+    def _get_session(self):
+        # Every thread gets its own Session (sessions carry mutable state
+        # such as cookies), but all of them mount the same adapter so the
+        # keep-alive connection pool is shared across threads.
+        session = getattr(self._local, 'session', None)
+        if session is not None and session.adapter is self._adapter:
+            return session.session
+
+        with self._lock:
+            if self._adapter is None:
+                self._adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=self._pool_connections,
+                    pool_maxsize=self._pool_maxsize,
+                    pool_block=self._pool_block)
+            adapter = self._adapter
+
+        new_session = requests.Session()
+        new_session.mount('https://', adapter)
+        new_session.mount('http://', adapter)
+        self._local.session = _BoundSession(new_session, adapter)
+        return new_session
+
+    def close(self):
+        with self._lock:
+            adapter, self._adapter = self._adapter, None
+        if adapter is not None:
+            adapter.close()
+
+    def request(self, method, url, headers, post_data=None, user=None,
+                timeout=None):
+        try:
+            result = self._send(method, url, headers, post_data, user,
+                                timeout)
 
             # This causes the content to actually be read, which could cause
             # e.g. a socket timeout. TODO: The other fetch methods probably
@@ -108,11 +228,55 @@ class RequestsClient(HTTPClient):
             content = result.content
 
             status_code = result.status_code
+            rheaders = result.headers
         except Exception as e:
             # Would catch just requests.exceptions.RequestException, but can
             # also raise ValueError, RuntimeError, etc.
             self._handle_request_error(e)
-        return content, status_code
+        return content, status_code, rheaders
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       user=None, timeout=None):
+        try:
+            result = self._send(method, url, headers, post_data, user,
+                                timeout, stream=True)
+        except Exception as e:
+            self._handle_request_error(e)
+        return (_StreamedBody(self, result), result.status_code,
+                result.headers)
+
+    def _send(self, method, url, headers, post_data, user, timeout,
+              stream=False):
+        kwargs = {'timeout': tuple(timeout or self.timeout)}
+        if stream:
+            kwargs['stream'] = True
+
+        if self._verify_ssl_certs:
+            kwargs['verify'] = os.path.join(
+                os.path.dirname(__file__), 'data/ca-certificates.crt')
+        else:
+            kwargs['verify'] = False
+
+        # Send bytes: given text, http.client would encode it as Latin-1.
+        if isinstance(post_data, str):
+            post_data = post_data.encode('utf-8')
+
+        try:
+            headers = dict(headers)
+            headers['Authorization'] = basic_auth_header(user)
+            return self._get_session().request(method,
+                                               url,
+                                               headers=headers,
+                                               data=post_data,
+                                               ** kwargs)
+        except TypeError as e:
+            raise TypeError(
+                'Warning: It looks like your installed version of the '
+                '"requests" library is not compatible with Openpay\'s '
+                'usage thereof. (HINT: The most likely cause is that '
+                'your "requests" library is out of date. You can fix '
+                'that by running "pip install -U requests".) The '
+                'underlying error was: %s' % (e,))
 
     def _handle_request_error(self, e):
         if isinstance(e, requests.exceptions.RequestException):
@@ -134,6 +298,13 @@ class RequestsClient(HTTPClient):
         raise error.APIConnectionError(msg)
 
 
+class _BoundSession(object):
+
+    def __init__(self, session, adapter):
+        self.session = session
+        self.adapter = adapter
+
+
 class UrlFetchClient(HTTPClient):
     pass
 
@@ -148,51 +319,62 @@ class Urllib2Client(HTTPClient):
     else:
         name = 'urllib2'
 
-    def request(self, method, url, headers, post_data=None, user=None):
+    def request(self, method, url, headers, post_data=None, user=None,
+                timeout=None):
+        # urllib has a single socket timeout covering both connecting and
+        # reading, so use the larger of the two.
+        socket_timeout = max(timeout or self.timeout)
+
         if sys.version_info >= (3, 0) and isinstance(post_data, str):
             post_data = post_data.encode('utf-8')
 
         if sys.version_info >= (3, 0):
             req = urllib.request.Request(url, post_data, headers)
-            user_string = '%s:%s' % (user, '')
-            base64string = encodebytes(bytes(user_string, encoding='utf-8'))
-            base64string = base64string.decode('utf-8').replace('\n', '')
-            req.add_header("Authorization", "Basic %s" % base64string)
+            req.add_header("Authorization", basic_auth_header(user))
 
             if method not in ('get', 'post'):
                 req.get_method = lambda: method.upper()
 
+            # Timeouts and resets while reading the body surface as
+            # socket or http.client errors rather than URLError.
             try:
-                with urllib.request.urlopen(req) as response:
-                    rbody = response.read()
-                    rcode = response.code
-            except urllib.error.HTTPError as e:
-                rcode = e.code
-                rbody = e.read()
-            except (urllib.error.URLError, ValueError) as e:
+                try:
+                    with urllib.request.urlopen(
+                            req, timeout=socket_timeout) as response:
+                        rbody = response.read()
+                        rcode = response.code
+                        rheaders = response.headers
+                except urllib.error.HTTPError as e:
+                    rcode = e.code
+                    rbody = e.read()
+                    rheaders = e.headers
+            except (urllib.error.URLError, socket.error, HTTPException,
+                    ValueError) as e:
                 self._handle_request_error(e)
-            return rbody, rcode
+            return rbody, rcode, rheaders
         else:
             req = urllib2.Request(url, post_data, headers)
-            base64string = encodebytes('%s:%s' % (user, ''))
-            auth_string = "Basic %s" % base64string
-            auth_string = auth_string.replace('\n', '')
-            req.add_header("Authorization", auth_string)
+            req.add_header("Authorization", basic_auth_header(user))
 
             if method not in ('get', 'post'):
                 req.get_method = lambda: method.upper()
 
             try:
-                ctx = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-                response = urllib2.urlopen(req, context=ctx)
-                rbody = response.read()
-                rcode = response.code
-            except urllib2.HTTPError as e:
-                rcode = e.code
-                rbody = e.read()
-            except (urllib2.URLError, ValueError) as e:
+                try:
+                    ctx = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
+                    response = urllib2.urlopen(req, context=ctx,
+                                               timeout=socket_timeout)
+                    rbody = response.read()
+                    rcode = response.code
+                    rheaders = response.info()
+                except urllib2.HTTPError as e:
+                    rcode = e.code
+                    rbody = e.read()
+                    rheaders = e.info()
+            except (urllib2.URLError, socket.error, HTTPException,
+                    ValueError) as e:
                 self._handle_request_error(e)
-            return rbody, rcode
+            return rbody, rcode, rheaders
 
     def _handle_request_error(self, e):
         msg = ("Unexpected error communicating with Openpay. "
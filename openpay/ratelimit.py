@@ -0,0 +1,147 @@
+"""
+Client-side rate limiting.
+
+Enable with::
+
+    openpay.rate_limiter = openpay.ratelimit.RateLimiter(rate=20, burst=40)
+
+Every API request then takes a token from the bucket of its merchant
+(the APIClient's ``merchant_id``, else ``openpay.merchant_id``), waiting if
+the bucket is empty. A 429 response with a Retry-After header pauses that
+merchant's bucket for all threads instead of letting each of them fail on
+its own.
+"""
+import email.utils
+import threading
+import time
+
+from openpay.retry import clock
+
+
+class TokenBucket(object):
+    """
+    Refills ``rate`` tokens per second up to ``burst``. Tokens are
+    reserved rather than waited for under the lock: reserve() returns how
+    long the caller must sleep before its request may go out.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last = clock()
+
+    def reserve(self, max_wait=None):
+        """
+        Take a token and return how long to wait before using it. If that
+        would be longer than ``max_wait`` no token is taken and None is
+        returned.
+        """
+        with self._lock:
+            now = clock()
+            if now > self._last:
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+            tokens = self._tokens - 1
+
+            # _last is in the future while the bucket is paused.
+            wait = max(0.0, self._last - now)
+            if tokens < 0:
+                wait += -tokens / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens = tokens
+            return wait
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for ``seconds``. Afterwards the bucket holds at
+        most one token, so waiting callers resume one at a time at
+        ``rate`` rather than all at once.
+        """
+        with self._lock:
+            until = clock() + seconds
+            if until > self._last:
+                self._tokens = min(self._tokens, 1.0)
+                self._last = until
+
+
+class RateLimiter(object):
+    """
+    One TokenBucket of ``rate`` requests/second and ``burst`` capacity per
+    merchant, shared by every thread and client.
+    """
+
+    def __init__(self, rate=10, burst=20):
+        self.rate = rate
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+        self.total_waited = 0.0
+        self.times_paused = 0
+
+    def bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(self.rate, self.burst)
+                    self._buckets[key] = bucket
+        return bucket
+
+    def reserve(self, key, max_wait=None):
+        wait = self.bucket(key).reserve(max_wait)
+        if wait:
+            with self._lock:
+                self.total_waited += wait
+        return wait
+
+    def pause(self, key, seconds):
+        self.bucket(key).pause(seconds)
+        with self._lock:
+            self.times_paused += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'merchants': len(self._buckets),
+                'total_waited': self.total_waited,
+                'times_paused': self.times_paused,
+            }
+
+
+def retry_after(headers):
+    """
+    Seconds to wait according to the Retry-After header in ``headers``
+    (any mapping of response headers), or None.
+    """
+    if not headers:
+        return None
+    value = headers.get('Retry-After')
+    if value is None:
+        value = headers.get('retry-after')
+    return parse_retry_after(value)
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait according to a Retry-After header value (either
+    delta-seconds or an HTTP date), or None if it can't be parsed.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
@@ -1,4 +1,5 @@
 from __future__ import unicode_literals
+import uuid
 
 try:
     import json
@@ -14,48 +15,190 @@ from future.builtins import super
 from future.builtins import hex
 from future.builtins import str
 import openpay
-from openpay import api, error
+from openpay import api, bulk, columns, error
+from openpay.compact import convert as compact_convert
 from openpay.util import utf8, logger
 
 
-def convert_to_openpay_object(resp, api_key, item_type=None):
-    types = {'charge': Charge, 'customer': Customer,
-             'plan': Plan, 'transfer': Transfer, 'list': ListObject,
-             'card': Card, 'payout': Payout, 'subscription': Subscription,
-             'bank_account': BankAccount, 'fee': Fee, 'pse': Pse, 'checkout': Checkout,
-             'webhook': Webhook, 'token': Token}
+def convert_result(result, item_type=None, client=None):
+    """
+    convert_to_openpay_object for the ``(response, api key)`` result of
+    an APIClient call, noting its attempts on the object built and
+    binding it to ``client`` (see bind_client).
+    """
+    obj = convert_to_openpay_object(result[0], result[1], item_type)
+    return bind_client(note_attempts(obj, result), client)
+
+
+def note_attempts(obj, result):
+    """
+    Set ``obj.attempts`` to the number of HTTP attempts the APIClient
+    ``result`` it was built from took.
+    """
+    if isinstance(obj, BaseObject):
+        obj.attempts = api.attempts(result)
+    return obj
+
+
+def idempotency_kwargs(params, generate=False):
+    """
+    Pop a caller-supplied ``idempotency_key`` out of ``params`` (or make
+    one up when ``generate`` is set) and return it as keyword arguments
+    for APIClient.request. The key is reused by every retry of the call.
+    """
+    key = params.pop('idempotency_key', None)
+    if key is None and generate:
+        key = str(uuid.uuid4())
+    return {'idempotency_key': key} if key else {}
+
+
+def coalesce_kwargs(params):
+    """
+    Pop a ``coalesce`` flag out of ``params`` and return it as keyword
+    arguments for APIClient.request. See openpay.singleflight.
+    """
+    if params.pop('coalesce', True):
+        return {}
+    return {'coalesce': False}
+
+
+def read_kwargs(params, cacheable):
+    """
+    Like coalesce_kwargs, for reading one object: also pops a ``cache``
+    flag and, for a ``cacheable`` class, reads through
+    openpay.response_cache unless it is False.
+    """
+    extra = coalesce_kwargs(params)
+    if (params.pop('cache', True) and cacheable and
+            openpay.response_cache is not None):
+        extra['cache'] = True
+    return extra
+
+
+# API ``object`` names and the resource classes convert_to_openpay_object
+# builds for them; filled in by register_type.
+OBJECT_TYPES = {}
+
+_NESTED = (dict, list)
+
+
+def register_type(name):
+    """
+    Class decorator making convert_to_openpay_object build the class for
+    API objects whose ``object`` (or list ``item_type``) is ``name``.
+    """
+    def register(klass):
+        OBJECT_TYPES[name] = klass
+        return klass
+    return register
+
 
+def convert_to_openpay_object(resp, api_key, item_type=None):
     if isinstance(resp, list):
         return [convert_to_openpay_object(i, api_key, item_type) for i in resp]
     elif isinstance(resp, dict) and not isinstance(resp, BaseObject):
-        resp = resp.copy()
-        klass_name = resp.get('object')
+        klass_name = resp.get('object') or item_type
         if klass_name:
-            klass_name = str(klass_name)
-
-        if not klass_name and item_type:
-            klass_name = str(item_type)
-        if isinstance(klass_name, str):
-            klass = types.get(klass_name, BaseObject)
+            klass = OBJECT_TYPES.get(str(klass_name), BaseObject)
         else:
             klass = BaseObject
+        # construct_from copies what it needs, so ``resp`` can be used
+        # as parsed (and stays untouched for other holders).
         return klass.construct_from(resp, api_key)
     else:
         return resp
 
 
+def list_items(response, item_type, compact=False):
+    """
+    The items of a list response tagged with ``item_type``, as
+    CompactObjects when ``compact`` is set (see openpay.compact).
+    """
+    # The response may be shared with coalesced callers; copy rather
+    # than tag it in place.
+    items = [item if 'object' in item else dict(item, object=item_type)
+             for item in response]
+    if compact:
+        return [compact_convert(item) for item in items]
+    return items
+
+
+def stream_objects(items, api_key, item_type, compact=False, client=None):
+    """
+    Convert each parsed item of a streamed list to its resource class (or
+    a CompactObject) as it arrives, bound to ``client``. See
+    openpay.streaming.
+    """
+    try:
+        for item in items:
+            # Freshly parsed and not shared, so tagging in place is safe.
+            if isinstance(item, dict) and 'object' not in item:
+                item['object'] = item_type
+            if compact:
+                yield compact_convert(item)
+            else:
+                yield bind_client(convert_to_openpay_object(item, api_key),
+                                  client)
+    finally:
+        items.close()
+
+
+def api_client(api_key=None, client=None):
+    """
+    The APIClient a resource call goes through: ``client`` when the
+    caller passed one (or the object is bound to one), else a default
+    APIClient for ``api_key``.
+    """
+    if client is not None:
+        return client
+    return api.APIClient(api_key)
+
+
+def bind_client(obj, client):
+    """
+    Make the calls of ``obj`` and of the objects nested in it (list items
+    included) go through ``client``. Values still awaiting conversion are
+    bound when they are converted.
+    """
+    if client is None:
+        return obj
+    if isinstance(obj, list):
+        for item in obj:
+            bind_client(item, client)
+    elif isinstance(obj, BaseObject):
+        obj._client = client
+        for k, v in dict.items(obj):
+            if k not in obj._lazy_keys:
+                bind_client(v, client)
+    return obj
+
+
+# Shared by every object with no values awaiting conversion.
+_NO_KEYS = frozenset()
+
+
 class BaseObject(dict):
 
     def __init__(self, id=None, api_key=None, **params):
         super(BaseObject, self).__init__()
 
-        self._unsaved_values = set()
-        self._transient_values = set()
-
-        self._retrieve_params = params
-        self._previous_metadata = None
-
-        object.__setattr__(self, 'api_key', api_key)
+        # One update instead of a __setattr__ round trip per attribute:
+        # objects are built by the thousand from list responses.
+        self.__dict__.update(
+            _unsaved_values=set(),
+            _transient_values=set(),
+            # Keys whose values are still raw parsed JSON
+            # (openpay.lazy_objects).
+            _lazy_keys=_NO_KEYS,
+            _retrieve_params=params,
+            _previous_metadata=None,
+            # The APIClient this object's calls go through, when not a
+            # default one for api_key; see bind_client.
+            _client=None,
+            api_key=api_key,
+            # HTTP attempts the API call this came from took; see
+            # openpay.api.Response.
+            attempts=None)
 
         if id:
             self['id'] = id
@@ -85,10 +228,12 @@ class BaseObject(dict):
 
         super(BaseObject, self).__setitem__(k, v)
         self._unsaved_values.add(k)
+        if k in self._lazy_keys:
+            self._lazy_keys.discard(k)
 
     def __getitem__(self, k):
         try:
-            return super(BaseObject, self).__getitem__(k)
+            v = super(BaseObject, self).__getitem__(k)
         except KeyError as err:
             if k in self._transient_values:
                 raise KeyError(
@@ -100,6 +245,33 @@ class BaseObject(dict):
                     (k, k, ', '.join(list(self.keys()))))
             else:
                 raise err
+        if k in self._lazy_keys:
+            v = self._convert_lazy(k, v)
+        return v
+
+    def get(self, k, default=None):
+        if k in self._lazy_keys:
+            return self[k]
+        return super(BaseObject, self).get(k, default)
+
+    def items(self):
+        self._convert_all_lazy()
+        return super(BaseObject, self).items()
+
+    def values(self):
+        self._convert_all_lazy()
+        return super(BaseObject, self).values()
+
+    def _convert_lazy(self, k, v):
+        v = bind_client(convert_to_openpay_object(v, self.api_key),
+                        self._client)
+        super(BaseObject, self).__setitem__(k, v)
+        self._lazy_keys.discard(k)
+        return v
+
+    def _convert_all_lazy(self):
+        for k in list(self._lazy_keys):
+            self._convert_lazy(k, super(BaseObject, self).__getitem__(k))
 
     def __delitem__(self, k):
         raise TypeError(
@@ -108,12 +280,13 @@ class BaseObject(dict):
 
     @classmethod
     def construct_from(cls, values, api_key):
-        instance = cls(values.get('id'), api_key)
-        instance.refresh_from(values, api_key)
+        instance = cls(None, api_key or getattr(values, 'api_key', None))
+        instance._load(values, api_key, None)
         return instance
 
     def refresh_from(self, values, api_key=None, partial=False):
         self.api_key = api_key or getattr(values, 'api_key', None)
+        self.attempts = getattr(values, 'attempts', None)
 
         # Wipe old state before setting new.  This is useful for e.g.
         # updating a customer, where there is no persistent card
@@ -129,23 +302,51 @@ class BaseObject(dict):
 
         self._transient_values = self._transient_values - set(values)
 
-        for k, v in values.items():
-            super(BaseObject, self).__setitem__(
-                k, convert_to_openpay_object(v, api_key))
+        lazy_keys = None
+        if partial and self._lazy_keys:
+            lazy_keys = set(self._lazy_keys).difference(values)
+        self._load(values, api_key, lazy_keys)
+
+    def _load(self, values, api_key, lazy_keys):
+        """
+        Store ``values`` converted to openpay objects, or as they are for
+        nested ones while openpay.lazy_objects is set. ``lazy_keys`` are
+        keys already awaiting conversion.
+        """
+        # dict.items: ``values`` may itself hold values not yet converted.
+        if openpay.lazy_objects:
+            # Kept as parsed; __getitem__ converts them when first read.
+            lazy_keys = set(lazy_keys or ())
+            lazy_keys.update(
+                k for k, v in dict.items(values)
+                if isinstance(v, _NESTED) and not isinstance(v, BaseObject))
+            dict.update(self, values)
+        else:
+            dict.update(self, (
+                (k, convert_to_openpay_object(v, api_key)
+                 if isinstance(v, _NESTED) else v)
+                for k, v in dict.items(values)))
 
-        self._previous_metadata = values.get('metadata')
+        self.__dict__.update(_lazy_keys=lazy_keys or _NO_KEYS,
+                             _previous_metadata=values.get('metadata'))
 
-    def request(self, method, url, params=None):
+    def request(self, method, url, params=None, compact=False, **kwargs):
         if params is None:
             params = self._retrieve_params
 
-        requestor = api.APIClient(self.api_key)
-        response, api_key = requestor.request(method, url, params)
+        requestor = api_client(self.api_key, self._client)
+        result = requestor.request(method, url, params, **kwargs)
+        return bind_client(note_attempts(
+            self._convert_response(result[0], result[1], url, compact),
+            result), self._client)
+
+    def request_async(self, method, url, params=None, **kwargs):
+        from openpay import aio
+        return aio.request(self, method, url, params, **kwargs)
 
+    def _convert_response(self, response, api_key, url, compact=False):
         if isinstance(response, list):
-            for item in response:
-                if 'object' not in list(item.keys()):
-                    item.update({'object': self.get('item_type')})
+            response = list_items(response, self.get('item_type'), compact)
 
             data = {
                 'object': 'list',
@@ -158,8 +359,9 @@ class BaseObject(dict):
             response = data
 
         if isinstance(response, dict) and self.get('item_type'):
-            if 'object' not in list(response.keys()):
-                response.update({'object': self.get('item_type')})
+            if 'object' not in response:
+                # A copy, as in list_items.
+                response = dict(response, object=self.get('item_type'))
 
         return convert_to_openpay_object(response, api_key)
 
@@ -184,17 +386,49 @@ class BaseObject(dict):
 
 
 class APIResource(BaseObject):
+    # Let retrieve() and refresh() read through openpay.response_cache.
+    # Only for objects that change slowly enough to serve a stale copy
+    # for the cache's ttl.
+    _cacheable = False
 
     @classmethod
     def retrieve(cls, id, api_key=None, **params):
+        coalesce = params.pop('coalesce', True)
+        cache = params.pop('cache', True)
+        client = params.pop('client', None)
         instance = cls(id, api_key, **params)
-        instance.refresh()
+        instance._client = client
+        instance.refresh(coalesce, cache)
         return instance
 
-    def refresh(self):
-        self.refresh_from(self.request('get', self.instance_url()))
+    @classmethod
+    def retrieve_async(cls, id, api_key=None, **params):
+        from openpay import aio
+        coalesce = params.pop('coalesce', True)
+        cache = params.pop('cache', True)
+        return aio.retrieve(cls, id, api_key, params, coalesce, cache)
+
+    @classmethod
+    def retrieve_many(cls, ids, concurrency=None, api_key=None, **params):
+        """
+        Retrieve several objects concurrently. Results come back in the
+        order of ``ids``; an id that fails yields the exception raised for
+        it (usually an OpenpayError) instead of an object.
+        """
+        return bulk.retrieve_many(
+            lambda id: cls.retrieve(id, api_key, **params), ids,
+            concurrency)
+
+    def refresh(self, coalesce=True, cache=True):
+        extra = read_kwargs({'coalesce': coalesce, 'cache': cache},
+                            self._cacheable)
+        self.refresh_from(self.request('get', self.instance_url(), **extra))
         return self
 
+    def refresh_async(self, coalesce=True, cache=True):
+        from openpay import aio
+        return aio.refresh(self, coalesce, cache)
+
     @classmethod
     def class_name(cls):
         if cls == APIResource:
@@ -229,13 +463,45 @@ class APIResource(BaseObject):
         return "%s/%s" % (base, extn)
 
 
+@register_type('list')
 class ListObject(BaseObject):
 
     def all(self, **params):
-        return self.request('get', self['url'], params)
+        compact = params.pop('compact', False)
+        extra = coalesce_kwargs(params)
+        return self.request('get', self['url'], params, compact, **extra)
 
     def create(self, **params):
-        return self.request('post', self['url'], params)
+        # Same Idempotency-Key rules as the item class's own create().
+        item_class = OBJECT_TYPES.get(self.get('item_type'))
+        extra = idempotency_kwargs(
+            params, getattr(item_class, '_auto_idempotency_key', False))
+        return self.request('post', self['url'], params, **extra)
+
+    def create_many(self, params_iter, concurrency=None):
+        item_class = OBJECT_TYPES.get(self.get('item_type'))
+        return bulk.create_many(
+            lambda params: self.create(**params), params_iter, concurrency,
+            getattr(item_class, '_auto_idempotency_key', False))
+
+    def to_columns(self, fields):
+        """
+        Return the items of this page as NumPy arrays, one per field. See
+        openpay.columns.to_columns.
+        """
+        # dict.get: a lazy page's items needn't become objects for this.
+        return columns.to_columns(dict.get(self, 'data') or [], fields)
+
+    def stream(self, **params):
+        """
+        Like all(), but yield the items one by one as they are parsed
+        off the connection instead of building the whole page.
+        """
+        compact = params.pop('compact', False)
+        requestor = api_client(self.api_key, self._client)
+        items, api_key = requestor.request_stream('get', self['url'], params)
+        return stream_objects(items, api_key, self.get('item_type'),
+                              compact, self._client)
 
     def retrieve(self, id, **params):
         base = self.get('url')
@@ -243,15 +509,33 @@ class ListObject(BaseObject):
         extn = quote_plus(id)
         url = "%s/%s" % (base, extn)
 
-        return self.request('get', url, params)
+        item_class = OBJECT_TYPES.get(self.get('item_type'))
+        extra = read_kwargs(params, getattr(item_class, '_cacheable', False))
+        return self.request('get', url, params, **extra)
+
+    def retrieve_many(self, ids, concurrency=None,
+                      **params):
+        return bulk.retrieve_many(
+            lambda id: self.retrieve(id, **params), ids, concurrency)
+
+    def auto_paging_iter(self, page_size=None, prefetch=1, **params):
+        """
+        Iterate over every item of this list, following offset/limit
+        pages with the filters the list was fetched with (overridable
+        through ``params``). See openpay.bulk.iter_pages.
+        """
+        filters = dict(self._retrieve_params)
+        filters.update(params)
+        return bulk.iter_pages(lambda page_params: self.all(
+            **page_params).data, filters, page_size, prefetch)
 
 
 class SingletonAPIResource(APIResource):
 
     @classmethod
-    def retrieve(cls, api_key=None):
+    def retrieve(cls, api_key=None, client=None):
         return super(SingletonAPIResource, cls).retrieve(
-            None, api_key=api_key)
+            None, api_key=api_key, client=client)
 
     @classmethod
     def class_url(cls):
@@ -268,14 +552,80 @@ class ListableAPIResource(APIResource):
 
     @classmethod
     def all(cls, api_key=None, **params):
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
+        url = cls.class_url(params)
+        compact = params.pop('compact', False)
+        extra = coalesce_kwargs(params)
+
+        result = requestor.request('get', url, params, **extra)
+        return bind_client(note_attempts(cls._list_from_response(
+            result[0], result[1], url, params, compact), result), client)
+
+    @classmethod
+    def stream(cls, api_key=None, **params):
+        """
+        Like all(), but yield the objects one by one as they are parsed
+        off the connection, so memory stays proportional to one object
+        however large ``limit`` is. See openpay.streaming.
+        """
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
+        url = cls.class_url(params)
+        compact = params.pop('compact', False)
+        items, api_key = requestor.request_stream('get', url, params)
+        return stream_objects(items, api_key, cls.__name__.lower(), compact,
+                              client)
+
+    @classmethod
+    def to_columns(cls, fields, api_key=None, **params):
+        """
+        Fetch the page all() would and return its items as NumPy arrays,
+        one per field, read straight from the parsed response: no object
+        is built for the page or its items. See openpay.columns.to_columns.
+        """
+        requestor = api_client(api_key, params.pop('client', None))
         url = cls.class_url(params)
+        extra = coalesce_kwargs(params)
+        response, _ = requestor.request('get', url, params, **extra)
+        return columns.to_columns(response, fields)
 
-        response, api_key = requestor.request('get', url, params)
+    @classmethod
+    def all_async(cls, api_key=None, **params):
+        from openpay import aio
+        return aio.list_all(cls, api_key, params)
+
+    @classmethod
+    def iter_all(cls, api_key=None, page_size=None, prefetch=1, **filters):
+        """
+        Iterate over every object matching ``filters``, fetching page
+        after page in the background. See openpay.bulk.iter_pages.
+        """
+        return bulk.iter_pages(lambda params: cls.all(
+            api_key, **params).data, filters, page_size, prefetch)
+
+    @classmethod
+    def iter_partitioned(cls, start, end, slice_days=1, concurrency=None,
+                         api_key=None, page_size=None, **filters):
+        """
+        Iterate over every object created between the ``start`` and ``end``
+        dates by splitting the window into ``slice_days`` ranges that are
+        paged through concurrently and merged in creation order. See
+        openpay.bulk.iter_time_slices.
+        """
+        def fetch_slice(gte, lte):
+            params = dict(filters, creation={'gte': gte, 'lte': lte})
+            return list(cls.iter_all(api_key, page_size, prefetch=0,
+                                     **params))
+
+        return bulk.iter_time_slices(fetch_slice, start, end, slice_days,
+                                     concurrency)
+
+    @classmethod
+    def _list_from_response(cls, response, api_key, url, params=None,
+                            compact=False):
         klass_name = cls.__name__.lower()
-        for item in response:
-            if 'object' not in list(item.keys()):
-                item.update({'object': klass_name})
+        response = list_items(response, klass_name, compact)
 
         data = {
             'object': 'list',
@@ -285,27 +635,68 @@ class ListableAPIResource(APIResource):
             'item_type': klass_name,
         }
 
-        return convert_to_openpay_object(data, api_key)
+        list_object = convert_to_openpay_object(data, api_key)
+        list_object._retrieve_params = dict(params or {})
+        return list_object
 
 
 class CreateableAPIResource(APIResource):
+    # Send a generated Idempotency-Key with create() when the caller
+    # doesn't pass ``idempotency_key``, so it can be retried safely.
+    _auto_idempotency_key = False
 
     @classmethod
     def create(cls, api_key=None, **params):
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = cls.class_url(params)
+        extra = idempotency_kwargs(params, cls._auto_idempotency_key)
 
         if "clean_params" in dir(cls):
             params = cls.clean_params(params)
 
-        response, api_key = requestor.request('post', url, params)
-        klass_name = cls.__name__.lower()
-        return convert_to_openpay_object(response, api_key, klass_name)
+        result = requestor.request('post', url, params, **extra)
+        return convert_result(result, cls.__name__.lower(), client)
+
+    @classmethod
+    def create_async(cls, api_key=None, **params):
+        from openpay import aio
+        return aio.create(cls, api_key, params)
+
+    @classmethod
+    def create_many(cls, params_iter, concurrency=None, api_key=None):
+        """
+        Create one object per params dict in ``params_iter`` with at most
+        ``concurrency`` requests in flight. Yields openpay.bulk.BulkResult
+        tuples as requests complete; see openpay.bulk.create_many.
+        """
+        def create_one(params):
+            params = dict(params)
+            if api_key is not None:
+                params['api_key'] = api_key
+            return cls.create(**params)
+
+        return bulk.create_many(create_one, params_iter, concurrency,
+                                cls._auto_idempotency_key)
 
 
 class UpdateableAPIResource(APIResource):
 
     def save(self):
+        updated_params = self._save_params()
+
+        if updated_params:
+            self.refresh_from(self.request('put', self.instance_url(),
+                                           updated_params))
+        else:
+            logger.debug("Trying to save already saved object %r", self)
+        return self
+
+    def save_async(self):
+        from openpay import aio
+        return aio.save(self)
+
+    def _save_params(self):
         updated_params = self.serialize(self)
 
         if getattr(self, 'metadata', None):
@@ -319,11 +710,7 @@ class UpdateableAPIResource(APIResource):
             else:
                 updated_params.update({'status': None})
 
-            self.refresh_from(self.request('put', self.instance_url(),
-                                           updated_params))
-        else:
-            logger.debug("Trying to save already saved object %r", self)
-        return self
+        return updated_params
 
     def serialize_metadata(self):
         if 'metadata' in self._unsaved_values:
@@ -356,10 +743,15 @@ class DeletableAPIResource(APIResource):
         self.refresh_from(self.request('delete', self.instance_url(), params))
         return self
 
+    def delete_async(self, **params):
+        from openpay import aio
+        return aio.delete(self, params)
+
 
 # API objects
 
 
+@register_type('card')
 class Card(ListableAPIResource, UpdateableAPIResource,
            DeletableAPIResource, CreateableAPIResource):
 
@@ -385,12 +777,14 @@ class Card(ListableAPIResource, UpdateableAPIResource,
             "Can't retrieve a card without a customer ID. Use "
             "customer.cards.retrieve('card_id') instead.")
 
-    def save(self):
+    def _save_params(self):
         raise NotImplementedError("This feature is not supported yet by API")
 
 
+@register_type('charge')
 class Charge(CreateableAPIResource, ListableAPIResource,
              UpdateableAPIResource):
+    _auto_idempotency_key = True
 
     @classmethod
     def clean_params(cls, params=None):
@@ -426,31 +820,47 @@ class Charge(CreateableAPIResource, ListableAPIResource,
     def refund(self, **params):
         self._as_merchant = params.pop('merchant', False)
         url = self.instance_url() + '/refund'
-        self.refresh_from(self.request('post', url, params))
+        extra = idempotency_kwargs(params, True)
+        self.refresh_from(self.request('post', url, params, **extra))
         return self
 
+    def refund_async(self, **params):
+        from openpay import aio
+        self._as_merchant = params.pop('merchant', False)
+        extra = idempotency_kwargs(params, True)
+        return aio.post_action(self, self.instance_url() + '/refund', params,
+                               **extra)
+
     def capture(self, **params):
         self._as_merchant = params.pop('merchant', False)
         url = self.instance_url() + '/capture'
-        self.refresh_from(self.request('post', url, params))
+        extra = idempotency_kwargs(params, True)
+        self.refresh_from(self.request('post', url, params, **extra))
         return self
 
+    def capture_async(self, **params):
+        from openpay import aio
+        self._as_merchant = params.pop('merchant', False)
+        extra = idempotency_kwargs(params, True)
+        return aio.post_action(self, self.instance_url() + '/capture', params,
+                               **extra)
+
     def update_dispute(self, **params):
-        requestor = api.APIClient(self.api_key)
+        requestor = api_client(self.api_key, self._client)
         url = self.instance_url() + '/dispute'
         response, api_key = requestor.request('post', url, params)
         self.refresh_from({'dispute': response}, api_key, True)
         return self.dispute
 
     def close_dispute(self):
-        requestor = api.APIClient(self.api_key)
+        requestor = api_client(self.api_key, self._client)
         url = self.instance_url() + '/dispute/close'
         response, api_key = requestor.request('post', url, {})
         self.refresh_from({'dispute': response}, api_key, True)
         return self.dispute
 
     @classmethod
-    def as_merchant(cls):
+    def as_merchant(cls, client=None):
 
         params = {}
         if hasattr(cls, 'api_key'):
@@ -458,33 +868,51 @@ class Charge(CreateableAPIResource, ListableAPIResource,
         else:
             api_key = openpay.api_key
 
-        requestor = api.APIClient(api_key)
+        requestor = api_client(api_key, client)
         url = cls.class_url()
-        response, api_key = requestor.request('get', url, params)
-        return convert_to_openpay_object(response, api_key, 'charge')
+        result = requestor.request('get', url, params)
+        return convert_result(result, 'charge', client)
 
     @classmethod
-    def retrieve_as_merchant(cls, id):
-        params = {}
+    def retrieve_as_merchant(cls, id, **params):
         api_key = getattr(cls, 'api_key', openpay.api_key)
         cls._as_merchant = True
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         uid = utf8(id)
         url = "%s/%s" % (cls.class_url(), quote_plus(uid))
-        response, api_key = requestor.request('get', url, params)
-        return convert_to_openpay_object(response, api_key, 'charge')
+        extra = read_kwargs(params, cls._cacheable)
+        result = requestor.request('get', url, params, **extra)
+        return convert_result(result, 'charge', client)
+
+    @classmethod
+    def retrieve_many(cls, ids, concurrency=None, **params):
+        # Charges are only addressable by id at the merchant level; use
+        # customer.charges.retrieve_many for customer charges.
+        return bulk.retrieve_many(
+            lambda id: cls.retrieve_as_merchant(id, **params), ids,
+            concurrency)
 
     @classmethod
     def create_as_merchant(cls, **params):
         api_key = getattr(cls, 'api_key', openpay.api_key)
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
+        extra = idempotency_kwargs(params, True)
         # charge over merchant
-        response, api_key = requestor.request('post', cls.class_url(), params)
-        return convert_to_openpay_object(response, api_key, 'charge')
+        result = requestor.request('post', cls.class_url(), params, **extra)
+        return convert_result(result, 'charge', client)
 
 
+@register_type('customer')
 class Customer(CreateableAPIResource, UpdateableAPIResource,
                ListableAPIResource, DeletableAPIResource):
+    _cacheable = True
+
+    def _list(self, data):
+        # The customer's sub-lists send their calls the way it does.
+        return bind_client(convert_to_openpay_object(data, self.api_key),
+                           self._client)
 
     @property
     def cards(self):
@@ -496,7 +924,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
         }
 
         if not hasattr(self, '_cards'):
-            self._cards = convert_to_openpay_object(data, self.api_key)
+            self._cards = self._list(data)
 
         return self._cards
 
@@ -510,7 +938,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
         }
 
         if not hasattr(self, '_charges'):
-            self._charges = convert_to_openpay_object(data, self.api_key)
+            self._charges = self._list(data)
 
         return self._charges
 
@@ -524,7 +952,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
         }
 
         if not hasattr(self, '_transfers'):
-            self._transfers = convert_to_openpay_object(data, self.api_key)
+            self._transfers = self._list(data)
 
         return self._transfers
 
@@ -538,7 +966,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
         }
 
         if not hasattr(self, '_payouts'):
-            self._payouts = convert_to_openpay_object(data, self.api_key)
+            self._payouts = self._list(data)
 
         return self._payouts
 
@@ -552,7 +980,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
         }
 
         if not hasattr(self, '_back_accounts'):
-            self._back_accounts = convert_to_openpay_object(data, self.api_key)
+            self._back_accounts = self._list(data)
 
         return self._back_accounts
 
@@ -566,7 +994,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
         }
 
         if not hasattr(self, '_subscriptions'):
-            self._subscriptions = convert_to_openpay_object(data, self.api_key)
+            self._subscriptions = self._list(data)
 
         return self._subscriptions
 
@@ -579,7 +1007,7 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
             'item_type': 'pse'
         }
         if not hasattr(self, '_pse'):
-            self._pse = convert_to_openpay_object(data, self.api_key)
+            self._pse = self._list(data)
         return self._pse
 
     @property
@@ -591,22 +1019,27 @@ class Customer(CreateableAPIResource, UpdateableAPIResource,
             'item_type': 'checkout'
         }
         if not hasattr(self, '_checkouts'):
-            self._checkouts = convert_to_openpay_object(data, self.api_key)
+            self._checkouts = self._list(data)
         return self._checkouts
 
 
+@register_type('plan')
 class Plan(CreateableAPIResource, DeletableAPIResource,
            UpdateableAPIResource, ListableAPIResource):
-    pass
+    _cacheable = True
 
 
+@register_type('transfer')
 class Transfer(CreateableAPIResource, UpdateableAPIResource,
                ListableAPIResource):
-    pass
+    _auto_idempotency_key = True
 
 
+@register_type('bank_account')
 class BankAccount(CreateableAPIResource, UpdateableAPIResource,
                   DeletableAPIResource, ListableAPIResource):
+    _cacheable = True
+
     def instance_url(self):
         self.id = utf8(self.id)
         if hasattr(self, 'customer'):
@@ -621,28 +1054,35 @@ class BankAccount(CreateableAPIResource, UpdateableAPIResource,
         return "%s/%s/bankaccounts/%s" % (base, cust_extn, extn)
 
 
+@register_type('payout')
 class Payout(CreateableAPIResource, ListableAPIResource,
              DeletableAPIResource):
+    _auto_idempotency_key = True
 
     @classmethod
     def create_as_merchant(cls, **params):
         api_key = getattr(cls, 'api_key', openpay.api_key)
-        requestor = api.APIClient(api_key)
-        response, api_key = requestor.request('post', cls.class_url(), params)
-        return convert_to_openpay_object(response, api_key, 'payout')
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
+        extra = idempotency_kwargs(params, True)
+        result = requestor.request('post', cls.class_url(), params, **extra)
+        return convert_result(result, 'payout', client)
 
     @classmethod
-    def retrieve_as_merchant(cls, payout_id):
-        params = {}
+    def retrieve_as_merchant(cls, payout_id, **params):
         api_key = getattr(cls, 'api_key', openpay.api_key)
 
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = "{0}/{1}".format(cls.class_url(), payout_id)
-        response, api_key = requestor.request('get', url, params)
-        return convert_to_openpay_object(response, api_key, 'payout')
+        extra = read_kwargs(params, cls._cacheable)
+        result = requestor.request('get', url, params, **extra)
+        return convert_result(result, 'payout', client)
 
 
+@register_type('fee')
 class Fee(CreateableAPIResource, ListableAPIResource):
+    _auto_idempotency_key = True
 
     @classmethod
     def refund(cls, fee_id, **params):
@@ -651,13 +1091,16 @@ class Fee(CreateableAPIResource, ListableAPIResource):
         else:
             api_key = openpay.api_key
 
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = cls.class_url()
         url = "{0}/{1}/refund".format(url, fee_id)
-        response, api_key = requestor.request('post', url, params)
-        return convert_to_openpay_object(response, api_key, 'fee')
+        extra = idempotency_kwargs(params, True)
+        result = requestor.request('post', url, params, **extra)
+        return convert_result(result, 'fee', client)
 
 
+@register_type('subscription')
 class Subscription(DeletableAPIResource, UpdateableAPIResource):
 
     def instance_url(self):
@@ -669,6 +1112,7 @@ class Subscription(DeletableAPIResource, UpdateableAPIResource):
                                            self.customer, extn)
 
 
+@register_type('pse')
 class Pse(CreateableAPIResource):
 
     @classmethod
@@ -677,11 +1121,11 @@ class Pse(CreateableAPIResource):
             api_key = cls.api_key
         else:
             api_key = openpay.api_key
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = cls.build_url(customer_id)
-        response, api_key = requestor.request('post', url, params)
-        openpay_object = convert_to_openpay_object(response, api_key)
-        return openpay_object
+        result = requestor.request('post', url, params)
+        return convert_result(result, client=client)
 
     @classmethod
     def build_url(cls, customer_id=None):
@@ -692,14 +1136,16 @@ class Pse(CreateableAPIResource):
             return "/v1/{0}/customers/{1}/charges".format(merchant_id, customer_id)
 
 
+@register_type('webhook')
 class Webhook(CreateableAPIResource, ListableAPIResource, DeletableAPIResource):
     @classmethod
     def retrieve(cls, webhook_id=None, api_key=None, **params):
         api_key = getattr(cls, 'api_key', openpay.api_key)
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = cls.build_url(webhook_id)
-        response, api_key = requestor.request('get', url, params)
-        return convert_to_openpay_object(response, api_key, 'checkout')
+        result = requestor.request('get', url, params)
+        return convert_result(result, 'checkout', client)
 
     @classmethod
     def build_url(cls, webhook_id):
@@ -709,6 +1155,7 @@ class Webhook(CreateableAPIResource, ListableAPIResource, DeletableAPIResource):
         if webhook_id is not None:
             return "/v1/{0}/webhooks/{1}".format(merchant_id, webhook_id)
 
+@register_type('checkout')
 class Checkout(CreateableAPIResource,
                UpdateableAPIResource, ListableAPIResource):
 
@@ -718,19 +1165,20 @@ class Checkout(CreateableAPIResource,
             api_key = cls.api_key
         else:
             api_key = openpay.api_key
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = cls.build_url(customer=customer_id)
-        response, api_key = requestor.request('post', url, params)
-        openpay_object = convert_to_openpay_object(response, api_key)
-        return openpay_object
+        result = requestor.request('post', url, params)
+        return convert_result(result, client=client)
 
     @classmethod
     def retrieve(cls, api_key=None, checkout_id=None, **params):
         api_key = getattr(cls, 'api_key', openpay.api_key)
-        requestor = api.APIClient(api_key)
+        client = params.pop('client', None)
+        requestor = api_client(api_key, client)
         url = cls.build_url(checkout_id)
-        response, api_key = requestor.request('get', url, params)
-        return convert_to_openpay_object(response, api_key, 'checkout')
+        result = requestor.request('get', url, params)
+        return convert_result(result, 'checkout', client)
 
     @classmethod
     def build_url(cls, checkout_id=None, customer=None):
@@ -742,18 +1190,13 @@ class Checkout(CreateableAPIResource,
         if checkout_id is not None:
             return "/v1/{0}/checkouts/{1}".format(merchant_id, checkout_id)
 
-    def save(self):
+    def _save_params(self):
         updated_params = self.serialize(self)
 
         if getattr(self, 'metadata', None):
             updated_params['metadata'] = self.serialize_metadata()
 
-        if updated_params:
-            self.refresh_from(self.request('put', self.instance_url(),
-                                           updated_params))
-        else:
-            logger.debug("Trying to save already saved object %r", self)
-        return self
+        return updated_params
 
     def serialize_metadata(self):
         if 'metadata' in self._unsaved_values:
@@ -791,5 +1234,6 @@ class Checkout(CreateableAPIResource,
         extn = quote_plus(id)
         return "%s/%s?status=%s" % (base, extn, status)
 
+@register_type('token')
 class Token(CreateableAPIResource):
     pass
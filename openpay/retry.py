@@ -0,0 +1,83 @@
+"""
+Retry policy for API requests.
+
+Set ``openpay.retry_policy = RetryPolicy(...)`` to retry failed requests
+from every APIClient, or pass ``retry_policy`` to a single client.
+Each attempt is reported to openpay.request_hooks; the number made is
+kept as ``attempts`` on the objects returned and on errors raised.
+"""
+import random
+import time
+
+from openpay import error
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed attempt is retried and how long to wait.
+
+    An attempt fails when the transport raises APIConnectionError or the
+    API answers with a status in ``retry_on_status``. Delays use full
+    jitter: before attempt n + 1 we sleep a uniform random time in
+    [0, min(backoff_max, backoff_base * 2 ** (n - 1))]. No retry is made
+    that would start after ``total_timeout`` seconds from the first
+    attempt. When the response carried a Retry-After header the delay is
+    at least that long.
+
+    GET, PUT and DELETE are retried freely. POST is only retried when it
+    carries an Idempotency-Key header, since the first attempt may have
+    reached Openpay and a blind retry could move money twice. A 429 is
+    the exception: the request was turned away unprocessed, so any method
+    may be retried.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.5, backoff_max=8.0,
+                 retry_on_status=(429, 500, 502, 503, 504),
+                 total_timeout=None):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_on_status = frozenset(retry_on_status)
+        self.total_timeout = total_timeout
+
+    def is_retryable_request(self, method, headers):
+        if method in ('get', 'put', 'delete'):
+            return True
+        return IDEMPOTENCY_HEADER in (headers or {})
+
+    def backoff(self, attempt):
+        cap = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    def retry_delay(self, method, headers, attempt, started, rcode=None,
+                    exc=None, retry_after=None):
+        """
+        Return the number of seconds to wait before retrying after
+        ``attempt`` (1-based) failed, or None if it shouldn't be retried.
+        """
+        if exc is None and rcode not in self.retry_on_status:
+            return None
+        if isinstance(exc, error.CircuitOpenError):
+            return None
+        if attempt >= self.max_attempts:
+            return None
+        if rcode != 429 and not self.is_retryable_request(method, headers):
+            return None
+
+        delay = self.backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if self.total_timeout is not None and \
+                clock() - started + delay > self.total_timeout:
+            return None
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
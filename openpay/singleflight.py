@@ -0,0 +1,112 @@
+"""
+Coalescing of identical in-flight GETs.
+
+While ``openpay.coalesce_gets`` is on (the default), a GET issued while an
+identical one (same URL, query string and API key) is still in flight
+doesn't go out on its own: it waits for the first one and gets the same
+parsed response, or the same error. Pass ``coalesce=False`` to a
+retrieve/refresh/all call, or to APIClient.request, to always send.
+
+A write (any other method) detaches the in-flight GETs it may have made
+stale when it completes, by the rules of ResponseCache.invalidate, so a
+read issued after a write returns never joins one that started before it.
+"""
+import threading
+
+from openpay import cache, error
+
+
+def stale_after_write(read_url, write_url, object_id=None, subtree=False):
+    """
+    Whether a GET of ``read_url`` may be stale after a write to
+    ``write_url``, by the rule of openpay.cache.is_stale.
+    """
+    path = cache.url_path(read_url)
+    # No response yet: the object read is the one the URL ends with.
+    return cache.is_stale(
+        path, path.rsplit('/', 1)[-1], cache.url_path(write_url),
+        None if object_id is None else str(object_id), subtree)
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc = None
+
+
+class Group(object):
+    """
+    Runs at most one call per key at a time; concurrent callers with the
+    same key share its outcome.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Return ``fn()``, or the result of the ``fn`` already running for
+        ``key``. A follower gives up with DeadlineExceededError after
+        ``timeout`` seconds; the leader's call is not bounded here.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise error.DeadlineExceededError(
+                    'The deadline for this Openpay request expired while '
+                    'waiting for an identical request already in flight.')
+            if call.exc is not None:
+                raise call.exc
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.exc = e
+            raise
+        finally:
+            with self._lock:
+                # forget() may already have detached this call.
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def forget(self, url, object_id=None, subtree=False):
+        """
+        Detach the in-flight calls a write to ``url`` may have made stale
+        (see stale_after_write; keys are ``(url, ...)`` tuples), so later
+        callers start afresh. Callers already waiting still share them.
+        """
+        with self._lock:
+            stale = [key for key in self._calls
+                     if stale_after_write(key[0], url, object_id, subtree)]
+            for key in stale:
+                del self._calls[key]
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
+
+
+default_group = Group()
@@ -0,0 +1,78 @@
+"""
+Incremental parsing of list responses.
+
+Openpay answers list endpoints with a bare JSON array. ``Charge.stream()``
+and ``ListObject.stream()`` read that array off the connection a chunk at
+a time and yield each element as soon as it is complete, so a 10k-item
+page never exists in memory as a whole: at any moment the client holds
+one chunk of bytes plus the item being built. Only transports that can
+stream (RequestsClient) read incrementally; with any other the body
+arrives in one piece and is still parsed item by item.
+"""
+import codecs
+import json
+import re
+
+from openpay import error
+
+# Whitespace and the separators between array elements.
+_SKIP = re.compile(r'[\s,]*')
+
+
+def iter_array(chunks):
+    """
+    Yield the elements of the JSON array whose UTF-8 bytes arrive as the
+    iterable ``chunks``. ``chunks`` is closed when the generator is,
+    which returns a streamed connection to its pool early.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    started = eof = False
+    try:
+        while True:
+            pos = _SKIP.match(buf, pos).end()
+            if pos < len(buf):
+                if not started:
+                    if buf[pos] != '[':
+                        raise _invalid(buf[pos:pos + 80])
+                    started = True
+                    pos += 1
+                    continue
+                if buf[pos] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Most likely the item continues in the next chunk.
+                    item = end = None
+                # A number right at the end of the buffer may be cut short.
+                if end is not None and (end < len(buf) or eof):
+                    pos = end
+                    yield item
+                    continue
+                if eof:
+                    raise _invalid(buf[pos:pos + 80])
+            elif eof:
+                raise _invalid('<truncated>')
+
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                tail = text.decode(b'', True)
+            else:
+                tail = text.decode(chunk)
+            # Drop what has been consumed so the buffer stays one item long.
+            buf = buf[pos:] + tail
+            pos = 0
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _invalid(snippet):
+    return error.APIError(
+        "Invalid list response body from API near: %s" % (snippet,))
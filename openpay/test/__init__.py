@@ -1,9 +1,15 @@
 import pkgutil
+import sys
 import unittest
 
+# Modules that need async/await syntax.
+PY3_ONLY = ('test_aio',)
+
 
 def all_names():
     for _, modname, _ in pkgutil.iter_modules(__path__):
+        if sys.version_info < (3, 5) and modname in PY3_ONLY:
+            continue
         if modname.startswith('test_'):
             yield 'openpay.test.' + modname
 
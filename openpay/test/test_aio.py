@@ -0,0 +1,349 @@
+from __future__ import unicode_literals
+import asyncio
+import json
+
+from future.builtins import super
+
+import openpay
+from openpay import aio
+from openpay.test.helper import OpenpayTestCase
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class FakeAsyncHTTPClient(aio.AsyncHTTPClient):
+    name = 'fake'
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.calls = []
+
+    async def request(self, method, url, headers, post_data=None, user=None):
+        self.calls.append((method, url, post_data, user))
+        await asyncio.sleep(0)
+        return json.dumps(self.responses.pop(0)), 200
+
+
+class AsyncResourceTests(OpenpayTestCase):
+
+    def setUp(self):
+        super(AsyncResourceTests, self).setUp()
+
+        self._original_client = openpay.default_async_http_client
+        self.base = 'https://sandbox-api.openpay.mx/v1/%s' % (
+            openpay.merchant_id,)
+
+    def tearDown(self):
+        super(AsyncResourceTests, self).tearDown()
+
+        openpay.default_async_http_client = self._original_client
+
+    def use_responses(self, *responses):
+        client = FakeAsyncHTTPClient(responses)
+        openpay.default_async_http_client = client
+        return client
+
+    def test_create_async(self):
+        client = self.use_responses({'id': 'ch_1', 'amount': 100})
+
+        charge = run(openpay.Charge.create_async(amount=100, method='card'))
+
+        self.assertTrue(isinstance(charge, openpay.Charge))
+        self.assertEqual('ch_1', charge.id)
+        method, url, post_data, user = client.calls[0]
+        self.assertEqual('post', method)
+        self.assertEqual(self.base + '/charges', url)
+        self.assertEqual({'amount': 100, 'method': 'card'},
+                         json.loads(post_data))
+        self.assertEqual(openpay.api_key, user)
+
+    def test_all_async(self):
+        client = self.use_responses([{'id': 'pl_1'}, {'id': 'pl_2'}])
+
+        plans = run(openpay.Plan.all_async())
+
+        self.assertEqual(2, plans.count)
+        self.assertTrue(isinstance(plans.data[1], openpay.Plan))
+        self.assertEqual(('get', self.base + '/plans', None,
+                          openpay.api_key), client.calls[0])
+
+    def test_refund_and_capture_async(self):
+        client = self.use_responses({'id': 'ch_1', 'status': 'completed'},
+                                    {'id': 'ch_1', 'status': 'refunded'})
+        charge = openpay.Charge.construct_from(
+            {'id': 'ch_1', 'status': 'in_progress'}, 'sk_other')
+
+        run(charge.capture_async(merchant=True))
+        self.assertEqual('completed', charge.status)
+
+        run(charge.refund_async(merchant=True, amount=50))
+        self.assertEqual('refunded', charge.status)
+
+        self.assertEqual(self.base + '/charges/ch_1/capture',
+                         client.calls[0][1])
+        self.assertEqual(self.base + '/charges/ch_1/refund',
+                         client.calls[1][1])
+        self.assertEqual({'amount': 50}, json.loads(client.calls[1][2]))
+        self.assertEqual('sk_other', client.calls[1][3])
+
+    def test_retries_with_policy(self):
+        client = self.use_responses({'id': 'cus_1'})
+        request = client.request
+        failures = [openpay.error.APIConnectionError('reset')]
+
+        async def flaky(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return await request(*args, **kwargs)
+
+        client.request = flaky
+        requestor = aio.AsyncAPIClient(
+            retry_policy=openpay.retry.RetryPolicy(backoff_base=0))
+        events = []
+        original_hooks = openpay.request_hooks
+        openpay.request_hooks = [events.append]
+        try:
+            result = run(requestor.request('get', '/v1/mid/customers/cus_1'))
+        finally:
+            openpay.request_hooks = original_hooks
+
+        self.assertEqual({'id': 'cus_1'}, result[0])
+        self.assertEqual(2, result.attempts)
+        self.assertEqual([1, 2], [e.attempt for e in events])
+
+    def test_many_requests_share_loop(self):
+        count = 50
+        self.use_responses(*[{'id': 'ch_%d' % i} for i in range(count)])
+
+        async def create_all():
+            return await asyncio.gather(*[
+                openpay.Charge.create_async(amount=i) for i in range(count)])
+
+        charges = run(create_all())
+        self.assertEqual(count, len(charges))
+
+    def test_identical_gets_are_coalesced(self):
+        client = self.use_responses({'id': 'cus_1'}, {'id': 'cus_1'})
+
+        async def retrieve_all():
+            return await asyncio.gather(
+                *[openpay.Customer.retrieve_async('cus_1') for _ in range(5)]
+                + [openpay.Customer.retrieve_async('cus_1', coalesce=False)])
+
+        customers = run(retrieve_all())
+
+        self.assertEqual(['cus_1'] * 6, [c.id for c in customers])
+        self.assertEqual(2, len(client.calls))
+        self.assertFalse(customers[0] is customers[1])
+
+    def test_concurrency_limiter_bounds_requests_in_flight(self):
+        client = self.use_responses(*[{'id': 'ch_%d' % i} for i in range(20)])
+        request = client.request
+        in_flight = [0, 0]
+
+        async def tracked(*args, **kwargs):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            try:
+                await asyncio.sleep(0.001)
+                return await request(*args, **kwargs)
+            finally:
+                in_flight[0] -= 1
+
+        client.request = tracked
+        limiter = openpay.concurrency.AdaptiveLimiter(
+            initial_limit=3, max_limit=3)
+        requestor = aio.AsyncAPIClient(concurrency_limiter=limiter)
+
+        async def fetch_all():
+            return await asyncio.gather(*[
+                requestor.request('get', '/v1/mid/charges/ch_%d' % i)
+                for i in range(20)])
+
+        self.assertEqual(20, len(run(fetch_all())))
+        self.assertEqual(3, in_flight[1])
+        self.assertEqual(0, limiter.in_flight)
+
+
+class AsyncioHTTPClientTests(OpenpayTestCase):
+
+    def test_reuses_keep_alive_connection(self):
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line == b'\r\n':
+                        break
+                    if line.lower().startswith(b'content-length'):
+                        length = int(line.split(b':')[1])
+                body = await reader.readexactly(length)
+                payload = json.dumps({
+                    'line': request_line.decode('ascii').strip(),
+                    'body': body.decode('utf-8')}).encode('utf-8')
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n'
+                             % len(payload) + payload)
+                await writer.drain()
+            writer.close()
+
+        async def exercise():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            url = 'http://127.0.0.1:%d/v1/charges' % (port,)
+            client = aio.AsyncioHTTPClient()
+            try:
+                first = await client.request('get', url + '?limit=1', {})
+                second = await client.request(
+                    'post', url, {'content-type': 'application/json'},
+                    '{"amount": 1}', user='sk_key')
+            finally:
+                await client.close()
+                # Let the handler see EOF before the loop goes away.
+                await asyncio.sleep(0.05)
+                server.close()
+                await server.wait_closed()
+            return first, second
+
+        (body1, code1, headers1), (body2, code2, _) = run(exercise())
+
+        self.assertEqual(200, code1)
+        self.assertEqual(str(len(body1)), headers1['content-length'])
+        self.assertEqual('GET /v1/charges?limit=1 HTTP/1.1',
+                         json.loads(body1.decode('utf-8'))['line'])
+        self.assertEqual('{"amount": 1}',
+                         json.loads(body2.decode('utf-8'))['body'])
+        self.assertEqual(1, len(connections))
+
+    def exchange(self, replies, requests):
+        """
+        Send ``requests`` ((method, headers, body) tuples) through one
+        AsyncioHTTPClient to a server answering the n-th request it reads
+        with ``replies[n]``, or dropping the connection when that is None.
+        Returns the results (or raised errors), the request lines the
+        server read and how many connections it accepted.
+        """
+        seen = []
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line == b'\r\n':
+                        break
+                    if line.lower().startswith(b'content-length'):
+                        length = int(line.split(b':')[1])
+                await reader.readexactly(length)
+                seen.append(request_line.decode('ascii').split()[0])
+                reply = replies[len(seen) - 1]
+                if reply is None:
+                    break
+                writer.write(reply)
+                await writer.drain()
+            writer.close()
+
+        async def exercise():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            url = 'http://127.0.0.1:%d/v1/charges' % (port,)
+            client = aio.AsyncioHTTPClient(timeout=2)
+            results = []
+            try:
+                for method, headers, body in requests:
+                    try:
+                        results.append(await client.request(
+                            method, url, headers, body))
+                    except openpay.error.APIConnectionError as e:
+                        results.append(e)
+                    # Let the server act on the connection in between.
+                    await asyncio.sleep(0.01)
+            finally:
+                await client.close()
+                await asyncio.sleep(0.05)
+                server.close()
+                await server.wait_closed()
+            return results
+
+        return run(exercise()), seen, len(connections)
+
+    OK = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}'
+
+    def test_no_content_response_keeps_connection(self):
+        results, seen, connections = self.exchange([
+            b'HTTP/1.1 204 No Content\r\nConnection: keep-alive\r\n\r\n',
+            b'HTTP/1.1 100 Continue\r\n\r\n' + self.OK,
+        ], [('delete', {}, None), ('get', {}, None)])
+
+        self.assertEqual((b'', 204), results[0][:2])
+        self.assertEqual((b'{}', 200), results[1][:2])
+        self.assertEqual(1, connections)
+
+    def test_post_is_not_resent_after_connection_drops(self):
+        results, seen, _ = self.exchange([self.OK, None, self.OK], [
+            ('get', {}, None), ('post', {}, '{}'), ('get', {}, None)])
+
+        self.assertTrue(isinstance(results[1],
+                                   openpay.error.APIConnectionError))
+        self.assertEqual(['GET', 'POST', 'GET'], seen)
+
+    def test_idempotent_requests_are_resent_after_connection_drops(self):
+        results, seen, connections = self.exchange(
+            [self.OK, None, self.OK, None, self.OK], [
+                ('get', {}, None), ('get', {}, None),
+                ('post', {'Idempotency-Key': 'k1'}, '{}')])
+
+        self.assertEqual([200] * 3, [r[1] for r in results])
+        self.assertEqual(['GET', 'GET', 'GET', 'POST', 'POST'], seen)
+        self.assertEqual(3, connections)
+
+    def test_timed_out_connection_is_closed(self):
+        eof = []
+
+        async def handle(reader, writer):
+            await reader.readline()
+            # Never answer; wait for the client to hang up.
+            while await reader.read(1024):
+                pass
+            eof.append(True)
+            writer.close()
+
+        async def exercise():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            client = aio.AsyncioHTTPClient(timeout=0.1)
+            try:
+                with self.assertRaises(openpay.error.APIConnectionError):
+                    await client.request(
+                        'get', 'http://127.0.0.1:%d/' % (port,), {})
+                await asyncio.sleep(0.05)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        run(exercise())
+        self.assertEqual([True], eof)
+
+    def test_connection_error(self):
+        async def exercise():
+            client = aio.AsyncioHTTPClient(timeout=5)
+            await client.request('get', 'http://127.0.0.1:1/', {})
+
+        self.assertRaises(openpay.error.APIConnectionError, run, exercise())
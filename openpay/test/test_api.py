@@ -0,0 +1,1564 @@
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from future.builtins import super
+from mock import patch, Mock
+
+import openpay
+from openpay import (
+    api, breaker, cache, codec, concurrency, hedge, http_client, ratelimit,
+    retry, singleflight, streaming, timeouts)
+from openpay.test.helper import OpenpayTestCase
+
+
+class APIClientTestCase(OpenpayTestCase):
+
+    def setUp(self):
+        super(APIClientTestCase, self).setUp()
+
+        self._original_http_client = openpay.default_http_client
+        openpay.default_http_client = None
+
+        self.http_client = Mock()
+        self.http_client.name = 'mockclient'
+        self.http_client.request.return_value = ('{"id": "ch_1"}', 200)
+
+    def tearDown(self):
+        super(APIClientTestCase, self).tearDown()
+
+        openpay.default_http_client = self._original_http_client
+
+
+class DefaultHTTPClientTests(APIClientTestCase):
+
+    @patch('openpay.http_client.new_default_http_client')
+    def test_clients_share_transport(self, new_client):
+        new_client.return_value._verify_ssl_certs = False
+
+        first = api.APIClient('key1')
+        second = api.APIClient('key2')
+
+        self.assertTrue(first._client is second._client)
+        self.assertTrue(openpay.default_http_client is first._client)
+        new_client.assert_called_once_with(verify_ssl_certs=False)
+
+    @patch('openpay.http_client.new_default_http_client')
+    def test_rebuilds_when_ssl_setting_changes(self, new_client):
+        new_client.side_effect = lambda verify_ssl_certs: Mock(
+            _verify_ssl_certs=verify_ssl_certs)
+
+        first = api.APIClient()._client
+        openpay.verify_ssl_certs = True
+        try:
+            second = api.APIClient()._client
+        finally:
+            openpay.verify_ssl_certs = False
+
+        self.assertFalse(first is second)
+        first.close.assert_called_once_with()
+        self.assertTrue(second._verify_ssl_certs)
+
+    def test_honors_configured_default(self):
+        openpay.default_http_client = self.http_client
+
+        self.assertTrue(api.APIClient()._client is self.http_client)
+
+    def test_explicit_client_wins(self):
+        client = api.APIClient('key', client=self.http_client)
+
+        self.assertTrue(client._client is self.http_client)
+        self.assertTrue(openpay.default_http_client is None)
+
+    def test_close(self):
+        with api.APIClient('key', client=self.http_client):
+            pass
+
+        self.http_client.close.assert_called_once_with()
+
+    def test_close_leaves_shared_transport_open(self):
+        openpay.default_http_client = self.http_client
+
+        with api.APIClient('key'):
+            pass
+
+        self.assertFalse(self.http_client.close.called)
+
+
+class StaticHeadersTests(APIClientTestCase):
+
+    def setUp(self):
+        super(StaticHeadersTests, self).setUp()
+
+        api._static_headers_cache.clear()
+        self.client = api.APIClient('sk_key', client=self.http_client)
+
+    @patch('openpay.api.platform')
+    def test_user_agent_computed_once(self, platform_mock):
+        platform_mock.python_version.return_value = '3.x'
+        platform_mock.platform.return_value = 'Linux'
+        platform_mock.uname.return_value = ('Linux', 'host')
+
+        for _ in range(3):
+            self.client.request('get', '/v1/mid/charges/ch_1')
+
+        self.assertEqual(1, platform_mock.platform.call_count)
+        self.assertEqual(3, self.http_client.request.call_count)
+
+        headers = self.http_client.request.call_args[0][2]
+        self.assertEqual('application/json', headers['content-type'])
+        self.assertTrue('"platform": "Linux"' in
+                        headers['X-Openpay-Client-User-Agent'])
+
+    def test_headers_follow_api_version(self):
+        self.client.request('get', '/v1/mid/charges/ch_1')
+        headers = self.http_client.request.call_args[0][2]
+        self.assertFalse('Openpay-Version' in headers)
+
+        openpay.api_version = '2014-01-01'
+        self.client.request('get', '/v1/mid/charges/ch_1')
+        headers = self.http_client.request.call_args[0][2]
+        self.assertEqual('2014-01-01', headers['Openpay-Version'])
+
+    def test_headers_are_not_shared_between_requests(self):
+        self.client.request('get', '/v1/mid/charges/ch_1')
+        self.http_client.request.call_args[0][2]['X-Extra'] = 'mutated'
+
+        self.client.request('get', '/v1/mid/charges/ch_1')
+        self.assertFalse(
+            'X-Extra' in self.http_client.request.call_args[0][2])
+
+
+class RetryTests(APIClientTestCase):
+
+    def setUp(self):
+        super(RetryTests, self).setUp()
+
+        self._original_hooks = openpay.request_hooks
+        self.events = []
+        openpay.request_hooks = [self.events.append]
+
+        self.sleep_patcher = patch('openpay.api.time.sleep')
+        self.sleep = self.sleep_patcher.start()
+
+        self.policy = retry.RetryPolicy(max_attempts=3, backoff_base=0.1)
+        self.client = api.APIClient('sk_key', client=self.http_client,
+                                    retry_policy=self.policy)
+
+    def tearDown(self):
+        super(RetryTests, self).tearDown()
+
+        self.sleep_patcher.stop()
+        openpay.request_hooks = self._original_hooks
+
+    def connection_error(self):
+        return openpay.error.APIConnectionError('connection reset')
+
+    def test_no_retries_by_default(self):
+        self.http_client.request.side_effect = self.connection_error()
+        client = api.APIClient('sk_key', client=self.http_client)
+
+        self.assertRaises(openpay.error.APIConnectionError,
+                          client.request, 'get', '/v1/mid/charges')
+        self.assertEqual(1, self.http_client.request.call_count)
+
+    def test_retries_get_on_server_error(self):
+        self.http_client.request.side_effect = [
+            ('{"error_code": 1000, "description": "down"}', 503),
+            self.connection_error(),
+            ('{"id": "ch_1"}', 200)]
+
+        resp, _ = self.client.request('get', '/v1/mid/charges/ch_1')
+
+        self.assertEqual({'id': 'ch_1'}, resp)
+        self.assertEqual(2, self.sleep.call_count)
+        for call in self.sleep.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= 0.2)
+
+        self.assertEqual([1, 2, 3], [e.attempt for e in self.events])
+        self.assertEqual([503, None, 200], [e.status for e in self.events])
+        self.assertEqual([True, True, False],
+                         [e.will_retry for e in self.events])
+        self.assertTrue(self.events[1].error is not None)
+
+    def test_gives_up_after_max_attempts(self):
+        self.http_client.request.return_value = (
+            '{"error_code": 1000, "description": "down"}', 502)
+
+        self.assertRaises(openpay.error.APIError,
+                          self.client.request, 'get', '/v1/mid/charges')
+        self.assertEqual(3, self.http_client.request.call_count)
+
+    def test_does_not_retry_client_errors(self):
+        self.http_client.request.return_value = (
+            '{"error_code": 1001, "description": "bad"}', 400)
+
+        self.assertRaises(openpay.error.InvalidRequestError,
+                          self.client.request, 'get', '/v1/mid/charges')
+        self.assertEqual(1, self.http_client.request.call_count)
+
+    def test_post_without_idempotency_key_is_not_retried(self):
+        self.http_client.request.side_effect = self.connection_error()
+
+        try:
+            self.client.request('post', '/v1/mid/charges', {'amount': 1})
+        except openpay.error.APIConnectionError as e:
+            self.assertEqual(1, e.attempts)
+        else:
+            self.fail('APIConnectionError was not raised')
+        self.assertEqual(1, self.http_client.request.call_count)
+
+    def test_idempotent_post_is_retryable(self):
+        self.assertFalse(self.policy.is_retryable_request(
+            'post', {'content-type': 'application/json'}))
+        self.assertTrue(self.policy.is_retryable_request(
+            'post', {retry.IDEMPOTENCY_HEADER: 'key'}))
+
+    def test_respects_total_time_budget(self):
+        self.policy.total_timeout = 0
+        self.http_client.request.side_effect = self.connection_error()
+
+        self.assertRaises(openpay.error.APIConnectionError,
+                          self.client.request, 'get', '/v1/mid/charges')
+        self.assertEqual(1, self.http_client.request.call_count)
+
+    def test_global_policy(self):
+        openpay.retry_policy = self.policy
+        try:
+            self.http_client.request.side_effect = [
+                self.connection_error(), ('{}', 200)]
+            client = api.APIClient('sk_key', client=self.http_client)
+            client.request('delete', '/v1/mid/plans/p1')
+        finally:
+            openpay.retry_policy = None
+
+        self.assertEqual([1, 2], [e.attempt for e in self.events])
+
+
+    def test_results_report_attempts(self):
+        openpay.default_http_client = self.http_client
+        openpay.retry_policy = self.policy
+        try:
+            self.http_client.request.side_effect = [
+                self.connection_error(), ('{"id": "cus_1"}', 200),
+                ('{"id": "cus_2"}', 200),
+                self.connection_error(), ('{"id": "cus_1"}', 200)]
+            customer = openpay.Customer.retrieve('cus_1', api_key='sk_key')
+            created = openpay.Customer.create(api_key='sk_key')
+            customer.refresh()
+        finally:
+            openpay.retry_policy = None
+
+        self.assertEqual(1, created.attempts)
+        self.assertEqual(2, customer.attempts)
+        self.assertEqual('cus_1', customer.id)
+        self.assertFalse('attempts' in customer)
+
+
+class IdempotencyTests(APIClientTestCase):
+
+    def setUp(self):
+        super(IdempotencyTests, self).setUp()
+
+        openpay.default_http_client = self.http_client
+
+    def sent_headers(self):
+        return [call[0][2] for call in self.http_client.request.call_args_list]
+
+    def test_charge_create_retries_with_same_key(self):
+        openpay.retry_policy = retry.RetryPolicy(backoff_base=0)
+        self.http_client.request.side_effect = [
+            openpay.error.APIConnectionError('timed out'),
+            ('{"id": "ch_1"}', 200)]
+        try:
+            charge = openpay.Charge.create(amount=100, method='card')
+        finally:
+            openpay.retry_policy = None
+
+        self.assertEqual('ch_1', charge.id)
+        first, second = self.sent_headers()
+        self.assertTrue(first[retry.IDEMPOTENCY_HEADER])
+        self.assertEqual(first[retry.IDEMPOTENCY_HEADER],
+                         second[retry.IDEMPOTENCY_HEADER])
+
+    def test_each_operation_gets_its_own_key(self):
+        openpay.Payout.create(amount=10)
+        openpay.Payout.create(amount=10)
+
+        first, second = self.sent_headers()
+        self.assertNotEqual(first[retry.IDEMPOTENCY_HEADER],
+                            second[retry.IDEMPOTENCY_HEADER])
+
+    def test_caller_supplied_key(self):
+        openpay.Transfer.create(amount=10, idempotency_key='order-42')
+
+        headers = self.sent_headers()[0]
+        self.assertEqual('order-42', headers[retry.IDEMPOTENCY_HEADER])
+        body = self.http_client.request.call_args[0][3]
+        self.assertFalse('idempotency_key' in body)
+
+    def test_refund_capture_and_fee_refund(self):
+        charge = openpay.Charge.construct_from({'id': 'ch_1'}, 'sk_key')
+        charge.capture(merchant=True)
+        charge.refund(merchant=True, idempotency_key='refund-ch_1')
+        openpay.Fee.refund('fee_1')
+
+        capture, refund, fee_refund = self.sent_headers()
+        self.assertTrue(capture[retry.IDEMPOTENCY_HEADER])
+        self.assertEqual('refund-ch_1', refund[retry.IDEMPOTENCY_HEADER])
+        self.assertTrue(fee_refund[retry.IDEMPOTENCY_HEADER])
+
+    def test_nested_list_create(self):
+        customer = openpay.Customer.construct_from({'id': 'cus_1'}, 'sk_key')
+        customer.charges.create(amount=10)
+        list(customer.payouts.create_many([{'amount': 1}, {'amount': 2}],
+                                          concurrency=1))
+        customer.transfers.create(amount=10, idempotency_key='order-42')
+        customer.cards.create(token_id='tok_1')
+
+        charge, payout_1, payout_2, transfer, card = self.sent_headers()
+        self.assertTrue(charge[retry.IDEMPOTENCY_HEADER])
+        self.assertTrue(payout_1[retry.IDEMPOTENCY_HEADER])
+        self.assertNotEqual(payout_1[retry.IDEMPOTENCY_HEADER],
+                            payout_2[retry.IDEMPOTENCY_HEADER])
+        self.assertEqual('order-42', transfer[retry.IDEMPOTENCY_HEADER])
+        self.assertFalse(retry.IDEMPOTENCY_HEADER in card)
+
+    def test_other_resources_send_no_key(self):
+        openpay.Plan.create(name='gold')
+
+        self.assertFalse(retry.IDEMPOTENCY_HEADER in self.sent_headers()[0])
+
+
+class ClientPassThroughTests(APIClientTestCase):
+
+    def setUp(self):
+        super(ClientPassThroughTests, self).setUp()
+
+        # Calls that ignore ``client`` would go here instead.
+        openpay.default_http_client = Mock()
+        self.client = api.APIClient('sk_other', client=self.http_client,
+                                    merchant_id='m2')
+
+    def sent_urls(self):
+        return [call[0][1] for call in self.http_client.request.call_args_list]
+
+    def test_merchant_url_per_client(self):
+        self.assertEqual(openpay.get_api_base() + '/v1/m2/charges',
+                         self.client.api_url('/v1/%s/charges' %
+                                             openpay.merchant_id))
+        self.assertEqual('m2', self.client.get_merchant_id())
+        self.assertEqual(openpay.merchant_id,
+                         api.APIClient('sk_key').get_merchant_id())
+
+    def test_class_and_instance_calls_use_client(self):
+        self.http_client.request.return_value = (
+            '{"id": "cus_1", "object": "customer", '
+            '"address": {"city": "Mexico"}}', 200)
+        customer = openpay.Customer.create(name='a', client=self.client)
+        customer.refresh()
+        openpay.Customer.retrieve('cus_1', client=self.client)
+        self.http_client.request.return_value = ('{"id": "ch_1"}', 200)
+        customer.charges.create(amount=10)
+        self.http_client.request.return_value = ('[{"id": "ch_1"}]', 200)
+        charges = openpay.Charge.all(client=self.client)
+        openpay.Fee.refund('fee_1', client=self.client)
+
+        self.assertFalse(openpay.default_http_client.request.called)
+        self.assertEqual(6, len(self.sent_urls()))
+        for url in self.sent_urls():
+            self.assertTrue('/v1/m2/' in url, url)
+        self.assertTrue(customer.address._client is self.client)
+        self.assertTrue(charges.data[0]._client is self.client)
+
+
+class CircuitBreakerTests(APIClientTestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTests, self).setUp()
+
+        self.now = [1000.0]
+        self.clock_patcher = patch('openpay.breaker.clock',
+                                   lambda: self.now[0])
+        self.clock_patcher.start()
+
+        openpay.circuit_breakers = breaker.CircuitBreakerRegistry(
+            failure_threshold=2, recovery_timeout=30)
+        self.client = api.APIClient('sk_key', client=self.http_client)
+        self.http_client.request.side_effect = \
+            openpay.error.APIConnectionError('timed out')
+
+    def tearDown(self):
+        super(CircuitBreakerTests, self).tearDown()
+
+        self.clock_patcher.stop()
+        openpay.circuit_breakers = None
+
+    def breaker(self):
+        return openpay.circuit_breakers.get('sandbox-api.openpay.mx')
+
+    def fail_request(self, exception=openpay.error.APIConnectionError):
+        self.assertRaises(exception, self.client.request,
+                          'get', '/v1/mid/charges')
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        self.fail_request()
+        self.assertEqual(breaker.CLOSED, self.breaker().state)
+        self.fail_request()
+        self.assertEqual(breaker.OPEN, self.breaker().state)
+
+        try:
+            self.client.request('get', '/v1/mid/charges')
+        except openpay.error.CircuitOpenError as e:
+            self.assertEqual('sandbox-api.openpay.mx', e.host)
+            self.assertEqual(30, e.retry_after)
+        else:
+            self.fail('CircuitOpenError was not raised')
+        self.assertEqual(2, self.http_client.request.call_count)
+
+        stats = openpay.circuit_breakers.stats()['sandbox-api.openpay.mx']
+        self.assertEqual('open', stats['state'])
+        self.assertEqual(1, stats['total_rejected'])
+        self.assertEqual(1, stats['times_opened'])
+
+    def test_half_open_trial_closes_on_success(self):
+        self.fail_request()
+        self.fail_request()
+
+        self.now[0] += 31
+        self.assertEqual(breaker.HALF_OPEN, self.breaker().state)
+        self.http_client.request.side_effect = None
+        self.http_client.request.return_value = ('{}', 200)
+
+        self.client.request('get', '/v1/mid/charges')
+
+        self.assertEqual(breaker.CLOSED, self.breaker().state)
+
+    def test_half_open_failure_reopens(self):
+        self.fail_request()
+        self.fail_request()
+        self.now[0] += 31
+
+        self.fail_request()
+
+        self.assertEqual(breaker.OPEN, self.breaker().state)
+        self.fail_request(openpay.error.CircuitOpenError)
+
+    def test_late_failures_do_not_extend_open_period(self):
+        guard = breaker.CircuitBreaker('h', failure_threshold=1,
+                                       recovery_timeout=30)
+        guard.before_request()
+        guard.before_request()
+        guard.record(exc=openpay.error.APIConnectionError('reset'))
+
+        self.now[0] += 20
+        guard.record(exc=openpay.error.APIConnectionError('timed out'))
+        self.now[0] += 11
+
+        self.assertEqual(breaker.HALF_OPEN, guard.state)
+        self.assertEqual(1, guard.stats()['times_opened'])
+        self.assertEqual(2, guard.stats()['total_failures'])
+
+    def test_half_open_limits_trial_requests(self):
+        guard = breaker.CircuitBreaker('h', failure_threshold=1,
+                                       recovery_timeout=5)
+        guard.record(exc=Exception())
+        self.now[0] += 5
+
+        guard.before_request()
+        self.assertRaises(openpay.error.CircuitOpenError,
+                          guard.before_request)
+
+    def test_server_errors_and_slow_calls_count(self):
+        guard = breaker.CircuitBreaker('h', failure_threshold=2,
+                                       slow_call_threshold=1.0)
+        guard.record(rcode=503)
+        guard.record(rcode=200, elapsed=2.5)
+        self.assertEqual(breaker.OPEN, guard.state)
+
+        other = breaker.CircuitBreaker('h', failure_threshold=2)
+        other.record(rcode=404)
+        other.record(rcode=402)
+        self.assertEqual(breaker.CLOSED, other.state)
+
+    def test_open_circuit_is_not_retried(self):
+        self.client.retry_policy = retry.RetryPolicy(backoff_base=0)
+        self.fail_request()
+        self.assertEqual(breaker.OPEN, self.breaker().state)
+
+        self.fail_request(openpay.error.CircuitOpenError)
+        self.assertEqual(2, self.http_client.request.call_count)
+
+    def test_breakers_are_per_host(self):
+        self.fail_request()
+        self.fail_request()
+        openpay.country = 'co'
+        try:
+            self.fail_request()
+        finally:
+            openpay.country = 'mx'
+
+        self.assertEqual(breaker.CLOSED, openpay.circuit_breakers.get(
+            'sandbox-api.openpay.co').state)
+
+
+class TimeoutTests(APIClientTestCase):
+
+    def setUp(self):
+        super(TimeoutTests, self).setUp()
+
+        self.now = [500.0]
+        self.clock_patcher = patch('openpay.timeouts.clock',
+                                   lambda: self.now[0])
+        self.clock_patcher.start()
+
+        self.http_client.timeout = (30, 80)
+        openpay.default_http_client = self.http_client
+
+    def tearDown(self):
+        super(TimeoutTests, self).tearDown()
+
+        self.clock_patcher.stop()
+
+    def sent_timeouts(self):
+        return [call[1].get('timeout')
+                for call in self.http_client.request.call_args_list]
+
+    def test_transport_defaults_untouched(self):
+        api.APIClient().request('get', '/v1/mid/charges')
+
+        self.assertEqual([None], self.sent_timeouts())
+
+    def test_client_level_timeout(self):
+        api.APIClient(timeout=(2, 10)).request('get', '/v1/mid/charges')
+        api.APIClient(timeout=5).request('get', '/v1/mid/charges')
+        api.APIClient(timeout=(2, None)).request('get', '/v1/mid/charges')
+
+        self.assertEqual([(2, 10), (5, 5), (2, 80)], self.sent_timeouts())
+
+    def test_per_call_override(self):
+        client = api.APIClient(timeout=(2, 10))
+        with timeouts.timeout(read=60):
+            client.request('get', '/v1/mid/charges')
+            with timeouts.timeout(connect=1):
+                client.request('get', '/v1/mid/charges')
+
+        self.assertEqual([(2, 60), (1, 60)], self.sent_timeouts())
+
+    def test_deadline_caps_attempt_timeouts(self):
+        with timeouts.timeout(connect=2, deadline=5):
+            api.APIClient().request('get', '/v1/mid/charges')
+            self.now[0] += 4
+            api.APIClient().request('get', '/v1/mid/charges')
+
+        self.assertEqual([(2, 5), (1, 1)], self.sent_timeouts())
+
+    def test_nested_block_cannot_extend_deadline(self):
+        with timeouts.timeout(deadline=5):
+            with timeouts.timeout(deadline=60):
+                api.APIClient().request('get', '/v1/mid/charges')
+
+        self.assertEqual([(5, 5)], self.sent_timeouts())
+
+    def test_deadline_spans_retries(self):
+        def slow_failure(*args, **kwargs):
+            self.now[0] += 3
+            raise openpay.error.APIConnectionError('timed out')
+
+        self.http_client.request.side_effect = slow_failure
+        client = api.APIClient(retry_policy=retry.RetryPolicy(
+            max_attempts=10, backoff_base=0.5, backoff_max=0.5))
+
+        with patch('openpay.api.time.sleep'):
+            with timeouts.timeout(deadline=7):
+                self.assertRaises(openpay.error.APIConnectionError,
+                                  client.request, 'get', '/v1/mid/charges')
+
+        self.assertEqual([(7, 7), (4, 4), (1, 1)], self.sent_timeouts())
+
+    def test_expired_deadline_is_not_sent(self):
+        with timeouts.timeout(deadline=1):
+            self.now[0] += 2
+            self.assertRaises(openpay.error.DeadlineExceededError,
+                              api.APIClient().request,
+                              'get', '/v1/mid/charges')
+
+        self.assertEqual(0, self.http_client.request.call_count)
+
+    def test_deadline_propagates_to_prefetch_thread(self):
+        self.http_client.request.return_value = ('[{"id": "ch_1"}]', 200)
+
+        with timeouts.timeout(connect=3, deadline=20):
+            charges = list(openpay.Charge.iter_all(prefetch=1))
+
+        self.assertEqual(1, len(charges))
+        self.assertEqual([(3, 20)], self.sent_timeouts())
+
+
+class HedgeTests(APIClientTestCase):
+
+    def setUp(self):
+        super(HedgeTests, self).setUp()
+
+        self.release = threading.Event()
+        self.calls = []
+        self.lock = threading.Lock()
+        self.http_client.request.side_effect = self.respond
+
+        self.policy = hedge.HedgePolicy(initial_delay=0.01, min_samples=1000)
+        self.client = api.APIClient('sk_key', client=self.http_client,
+                                    hedge_policy=self.policy)
+
+    def tearDown(self):
+        super(HedgeTests, self).tearDown()
+
+        self.release.set()
+        self.policy.close()
+
+    def respond(self, method, url, headers, post_data=None, user=None):
+        with self.lock:
+            self.calls.append(method)
+            number = len(self.calls)
+        if number == 1 and self.slow_first:
+            self.release.wait(5)
+            return '{"id": "slow"}', 200
+        return '{"id": "fast"}', 200
+
+    slow_first = True
+
+    def test_hedge_wins_when_first_is_slow(self):
+        resp, _ = self.client.request('get', '/v1/mid/customers/c1')
+
+        self.assertEqual({'id': 'fast'}, resp)
+        self.assertEqual(['get', 'get'], self.calls)
+        self.assertEqual({'requests': 1, 'hedges_fired': 1, 'hedges_won': 1,
+                          'hedges_skipped': 0}, self.policy.stats())
+
+    def test_no_hedge_when_first_is_fast(self):
+        self.slow_first = False
+
+        resp, _ = self.client.request('get', '/v1/mid/customers/c1')
+
+        self.assertEqual({'id': 'fast'}, resp)
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(0, self.policy.stats()['hedges_fired'])
+
+    def test_only_gets_are_hedged(self):
+        self.slow_first = False
+        self.client.request('post', '/v1/mid/charges', {'amount': 1})
+
+        self.assertEqual(0, self.policy.stats()['requests'])
+
+    def test_falls_back_to_slow_result_if_hedge_fails(self):
+        def respond(method, url, headers, post_data=None, user=None):
+            with self.lock:
+                self.calls.append(method)
+                number = len(self.calls)
+            if number == 1:
+                self.release.wait(0.2)
+                return '{"id": "slow"}', 200
+            raise openpay.error.APIConnectionError('reset')
+
+        self.http_client.request.side_effect = respond
+
+        resp, _ = self.client.request('get', '/v1/mid/customers/c1')
+
+        self.assertEqual({'id': 'slow'}, resp)
+        self.assertEqual(0, self.policy.stats()['hedges_won'])
+
+    def test_saturated_pool_sends_unhedged_from_caller(self):
+        self.policy.max_workers = 1
+        slow = threading.Thread(
+            target=self.client.request, args=('get', '/v1/mid/customers/c1'))
+        slow.start()
+        for _ in range(500):
+            if self.calls:
+                break
+            threading.Event().wait(0.01)
+
+        resp, _ = self.client.request('get', '/v1/mid/customers/c2')
+
+        self.assertEqual({'id': 'fast'}, resp)
+        self.assertEqual(2, len(self.calls))
+        self.release.set()
+        slow.join(5)
+        self.assertEqual(2, len(self.calls))
+        stats = self.policy.stats()
+        self.assertEqual(0, stats['hedges_fired'])
+        self.assertTrue(stats['hedges_skipped'] >= 1)
+
+    def test_delay_counts_from_start_on_a_worker(self):
+        self.slow_first = False
+        self.policy.initial_delay = 0.2
+        started = threading.Event()
+
+        def respond(method, url, headers, post_data=None, user=None):
+            with self.lock:
+                self.calls.append(method)
+            started.set()
+            self.release.wait(0.15)
+            return '{"id": "c1"}', 200
+
+        self.http_client.request.side_effect = respond
+        self.policy.max_workers = 2
+        # Occupy both workers until ``release`` so the next call queues.
+        # (Submitted straight to the pool, bypassing the busy count.)
+        pool = self.policy._get_pool()
+        blockers = [pool.submit(self.release.wait, 0.15) for _ in range(2)]
+
+        resp, _ = self.client.request('get', '/v1/mid/customers/c1')
+
+        self.assertEqual({'id': 'c1'}, resp)
+        self.assertEqual(['get'], self.calls)
+        self.assertEqual(0, self.policy.stats()['hedges_fired'])
+        for blocker in blockers:
+            blocker.result()
+
+    def test_delay_follows_latency_percentile(self):
+        policy = hedge.HedgePolicy(percentile=90, min_samples=10,
+                                   min_delay=0, max_delay=10)
+        for latency in range(1, 101):
+            policy._record_latency(latency / 100.0)
+
+        self.assertEqual(0.91, policy.delay())
+
+
+class RateLimitTests(APIClientTestCase):
+
+    def setUp(self):
+        super(RateLimitTests, self).setUp()
+
+        self.now = 100.0
+        self.clock_patcher = patch('openpay.ratelimit.clock',
+                                   lambda: self.now)
+        self.clock_patcher.start()
+        self.sleep_patcher = patch('openpay.api.time.sleep')
+        self.sleep = self.sleep_patcher.start()
+
+        self._original_merchant_id = openpay.merchant_id
+        openpay.merchant_id = 'm1'
+
+        self.limiter = ratelimit.RateLimiter(rate=2, burst=2)
+        self.client = api.APIClient(
+            'sk_key', client=self.http_client, rate_limiter=self.limiter,
+            retry_policy=retry.RetryPolicy(backoff_base=0.01))
+
+    def tearDown(self):
+        super(RateLimitTests, self).tearDown()
+
+        self.clock_patcher.stop()
+        self.sleep_patcher.stop()
+        openpay.merchant_id = self._original_merchant_id
+
+    def test_bucket_allows_burst_then_spaces_requests(self):
+        bucket = ratelimit.TokenBucket(rate=2, burst=2)
+
+        self.assertEqual([0.0, 0.0, 0.5, 1.0],
+                         [bucket.reserve() for _ in range(4)])
+
+        self.now += 1.5
+        self.assertEqual(0.0, bucket.reserve())
+
+    def test_pause_holds_tokens_then_resumes_at_rate(self):
+        bucket = ratelimit.TokenBucket(rate=2, burst=2)
+        bucket.pause(3)
+
+        self.assertEqual([3.0, 3.5], [bucket.reserve() for _ in range(2)])
+
+    def test_buckets_are_per_merchant(self):
+        for _ in range(2):
+            self.limiter.reserve('m1')
+
+        self.assertEqual(0.5, self.limiter.reserve('m1'))
+        self.assertEqual(0.0, self.limiter.reserve('m2'))
+
+    def test_client_waits_for_token(self):
+        for _ in range(3):
+            self.client.request('get', '/v1/mid/customers/c1')
+
+        self.sleep.assert_called_with(0.5)
+        self.assertEqual(0.5, self.limiter.stats()['total_waited'])
+
+    def test_429_pauses_bucket_and_retries_post(self):
+        self.http_client.request.side_effect = [
+            ('{"description": "slow down", "error_code": 3000}', 429,
+             {'Retry-After': '4'}),
+            ('{"id": "ch_1"}', 200, {}),
+        ]
+
+        resp, _ = self.client.request('post', '/v1/mid/charges',
+                                      {'amount': 1})
+
+        self.assertEqual({'id': 'ch_1'}, resp)
+        self.assertEqual(2, self.http_client.request.call_count)
+        self.assertEqual(1, self.limiter.stats()['times_paused'])
+        # The retry took the token freed when the pause ends; other
+        # threads queue behind it at the bucket's rate.
+        self.assertEqual(4.5, self.limiter.reserve('m1'))
+
+    def test_429_raises_rate_limit_error_when_out_of_attempts(self):
+        self.client.retry_policy = retry.NO_RETRY
+        self.http_client.request.return_value = (
+            '{"description": "slow down", "error_code": 3000}', 429, {})
+
+        self.assertRaises(openpay.error.RateLimitError, self.client.request,
+                          'get', '/v1/mid/customers/c1')
+
+    def test_wait_beyond_deadline_raises(self):
+        self.limiter.pause('m1', 30)
+
+        with timeouts.timeout(deadline=5):
+            self.assertRaises(openpay.error.DeadlineExceededError,
+                              self.client.request,
+                              'get', '/v1/mid/customers/c1')
+        self.assertFalse(self.http_client.request.called)
+
+    def test_missed_deadline_leaves_token(self):
+        for _ in range(2):
+            self.limiter.reserve('m1')
+
+        with timeouts.timeout(deadline=0.1):
+            self.assertRaises(openpay.error.DeadlineExceededError,
+                              self.client.request,
+                              'get', '/v1/mid/customers/c1')
+        self.assertEqual(0.5, self.limiter.reserve('m1'))
+
+    def test_hedges_take_a_token_or_are_skipped(self):
+        send = Mock()
+        self.client.concurrency_limiter = concurrency.AdaptiveLimiter(
+            initial_limit=1)
+
+        self.assertTrue(self.client.admit_hedge(send) is not None)
+        self.assertEqual(1, self.client.concurrency_limiter.in_flight)
+        self.assertEqual(None, self.client.admit_hedge(send))
+
+        self.client.concurrency_limiter = None
+        self.limiter.reserve('m1')
+        self.assertEqual(None, self.client.admit_hedge(send))
+        self.now += 0.5
+        self.assertTrue(self.client.admit_hedge(send) is send)
+        self.assertEqual(0.5, self.limiter.reserve('m1'))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(2.5, ratelimit.parse_retry_after(' 2.5 '))
+        self.assertEqual(0.0, ratelimit.parse_retry_after(
+            'Wed, 21 Oct 2015 07:28:00 GMT'))
+        self.assertEqual(None, ratelimit.parse_retry_after('soon'))
+        self.assertEqual(7.0, ratelimit.retry_after({'retry-after': '7'}))
+
+
+class ConcurrencyLimitTests(APIClientTestCase):
+
+    def setUp(self):
+        super(ConcurrencyLimitTests, self).setUp()
+
+        self.limiter = concurrency.AdaptiveLimiter(
+            initial_limit=4, max_limit=6, backoff_ratio=0.5)
+        self.client = api.APIClient('sk_key', client=self.http_client,
+                                    concurrency_limiter=self.limiter)
+
+    def fill(self):
+        return [self.limiter.acquire() for _ in range(self.limiter.limit)]
+
+    def test_limit_grows_while_fully_used(self):
+        for _ in range(8):
+            for slot in self.fill():
+                self.limiter.release(slot, 0.1)
+
+        self.assertEqual(6, self.limiter.limit)
+        self.assertEqual(0, self.limiter.in_flight)
+
+    def test_limit_does_not_grow_when_underused(self):
+        for _ in range(20):
+            self.limiter.release(self.limiter.acquire(), 0.1)
+
+        self.assertEqual(4, self.limiter.limit)
+
+    def test_overload_cuts_limit_once_per_generation(self):
+        slots = self.fill()
+        for slot in slots:
+            self.limiter.release(slot, 0.1, failed=True)
+
+        self.assertEqual(2, self.limiter.limit)
+        self.assertEqual(1, self.limiter.stats()['decreases'])
+
+        self.limiter.release(self.limiter.acquire(), 0.1, failed=True)
+        self.assertEqual(1, self.limiter.limit)
+
+    def test_latency_spike_counts_as_overload(self):
+        self.limiter.release(self.limiter.acquire(), 0.1)
+        self.limiter.release(self.limiter.acquire(), 0.5)
+
+        self.assertEqual(2, self.limiter.limit)
+
+    def test_latency_is_judged_per_endpoint(self):
+        page = concurrency.endpoint(
+            'get', 'https://api/v1/m1/customers/cus_1/charges?limit=100')
+        one = concurrency.endpoint(
+            'get', 'https://api/v1/m1/customers/cus_2/charges/ch_1')
+        self.assertEqual('get /v1/*/customers/*/charges', page)
+        self.assertEqual('get /v1/*/customers/*/charges/*', one)
+
+        for _ in range(20):
+            for slot, (elapsed, endpoint) in zip(
+                    self.fill(), [(0.05, one), (1.0, page)] * 3):
+                self.limiter.release(slot, elapsed, endpoint=endpoint)
+
+        self.assertEqual(0, self.limiter.stats()['failures'])
+        self.assertEqual(6, self.limiter.limit)
+
+        self.limiter.release(self.limiter.acquire(), 2.5, endpoint=page)
+        self.assertEqual(1, self.limiter.stats()['failures'])
+
+    def test_acquire_times_out_when_full(self):
+        self.fill()
+
+        self.assertEqual(None, self.limiter.acquire(timeout=0.01))
+        self.assertEqual(None, self.limiter.try_acquire())
+
+    def test_release_wakes_waiting_thread(self):
+        slots = self.fill()
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(self.limiter.acquire(timeout=5)))
+        waiter.start()
+
+        self.limiter.release(slots[0])
+        waiter.join(5)
+
+        self.assertTrue(acquired[0] is not None)
+        self.assertEqual(4, self.limiter.in_flight)
+
+    def test_client_reports_server_errors(self):
+        self.http_client.request.return_value = (
+            '{"description": "down", "error_code": 1000}', 503)
+
+        self.assertRaises(openpay.error.APIError, self.client.request,
+                          'get', '/v1/mid/customers/c1')
+
+        self.assertEqual({'limit': 2, 'in_flight': 0, 'successes': 0,
+                          'failures': 1, 'decreases': 1},
+                         self.limiter.stats())
+
+    def test_client_releases_slot_on_circuit_open(self):
+        original = openpay.circuit_breakers
+        openpay.circuit_breakers = breaker.CircuitBreakerRegistry(
+            failure_threshold=1)
+        try:
+            openpay.circuit_breakers.get('sandbox-api.openpay.mx').record(
+                exc=Exception())
+            self.assertRaises(openpay.error.CircuitOpenError,
+                              self.client.request,
+                              'get', '/v1/mid/customers/c1')
+        finally:
+            openpay.circuit_breakers = original
+
+        self.assertEqual(0, self.limiter.in_flight)
+        self.assertEqual(0, self.limiter.stats()['failures'])
+
+    def test_client_deadline_while_waiting_for_slot(self):
+        self.fill()
+
+        with timeouts.timeout(deadline=0.01):
+            self.assertRaises(openpay.error.DeadlineExceededError,
+                              self.client.request,
+                              'get', '/v1/mid/customers/c1')
+        self.assertFalse(self.http_client.request.called)
+
+    def test_is_overload(self):
+        self.assertTrue(concurrency.is_overload(429))
+        self.assertTrue(concurrency.is_overload(502))
+        self.assertTrue(concurrency.is_overload(
+            exc=openpay.error.APIConnectionError('reset')))
+        self.assertFalse(concurrency.is_overload(404))
+
+
+class SingleflightTests(APIClientTestCase):
+
+    def setUp(self):
+        super(SingleflightTests, self).setUp()
+
+        self.group = singleflight.Group()
+        self.group_patcher = patch('openpay.singleflight.default_group',
+                                   self.group)
+        self.group_patcher.start()
+
+        self.release = threading.Event()
+        self.http_client.request.side_effect = self.respond
+        self.client = api.APIClient('sk_key', client=self.http_client)
+
+    def tearDown(self):
+        super(SingleflightTests, self).tearDown()
+
+        self.release.set()
+        self.group_patcher.stop()
+
+    def respond(self, method, url, headers, post_data=None, user=None):
+        self.release.wait(5)
+        return '{"id": "cus_1"}', 200
+
+    def request_in_threads(self, count, **kwargs):
+        results = []
+
+        def run():
+            results.append(self.client.request(
+                'get', '/v1/mid/customers/cus_1', **kwargs))
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def wait_for_coalesced(self, count):
+        for _ in range(500):
+            if self.group.stats()['coalesced'] >= count:
+                return
+            threading.Event().wait(0.01)
+        self.fail('requests were not coalesced')
+
+    def test_identical_gets_share_one_request(self):
+        threads, results = self.request_in_threads(5)
+        self.wait_for_coalesced(4)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(1, self.http_client.request.call_count)
+        self.assertEqual([({'id': 'cus_1'}, 'sk_key')] * 5, results)
+        self.assertEqual({'calls': 1, 'coalesced': 4, 'in_flight': 0},
+                         self.group.stats())
+
+    def test_opt_out_sends_every_request(self):
+        self.release.set()
+        threads, results = self.request_in_threads(3, coalesce=False)
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(3, self.http_client.request.call_count)
+        self.assertEqual(0, self.group.stats()['calls'])
+
+    def test_key_includes_query_and_api_key(self):
+        other = api.APIClient('sk_other', client=self.http_client)
+
+        self.assertNotEqual(
+            self.client.read_key('/v1/mid/charges', {'limit': 1}),
+            self.client.read_key('/v1/mid/charges', {'limit': 2}))
+        self.assertNotEqual(
+            self.client.read_key('/v1/mid/charges', None),
+            other.read_key('/v1/mid/charges', None))
+
+    def test_only_gets_are_coalesced(self):
+        self.release.set()
+        self.client.request('post', '/v1/mid/charges', {'amount': 1})
+
+        self.assertEqual(0, self.group.stats()['calls'])
+
+    def test_errors_are_shared(self):
+        def respond(method, url, headers, post_data=None, user=None):
+            self.release.wait(5)
+            raise openpay.error.APIConnectionError('reset')
+
+        self.http_client.request.side_effect = respond
+        errors = []
+
+        def run():
+            try:
+                self.client.request('get', '/v1/mid/customers/cus_1')
+            except openpay.error.APIConnectionError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        self.wait_for_coalesced(2)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(3, len(errors))
+        self.assertEqual(1, self.http_client.request.call_count)
+
+    def test_follower_gives_up_at_its_deadline(self):
+        threads, _ = self.request_in_threads(1)
+        for _ in range(500):
+            if self.group.stats()['in_flight']:
+                break
+            threading.Event().wait(0.01)
+
+        with timeouts.timeout(deadline=0.05):
+            self.assertRaises(openpay.error.DeadlineExceededError,
+                              self.client.request,
+                              'get', '/v1/mid/customers/cus_1')
+
+        self.release.set()
+        threads[0].join(5)
+
+    def test_reads_after_a_write_dont_join_earlier_reads(self):
+        gets = []
+
+        def respond(method, url, headers, post_data=None, user=None):
+            if method != 'get':
+                return '{"id": "ch_1", "status": "completed"}', 200
+            gets.append(url)
+            if len(gets) == 1:
+                self.release.wait(5)
+                return '{"id": "ch_1", "status": "in_progress"}', 200
+            return '{"id": "ch_1", "status": "completed"}', 200
+
+        self.http_client.request.side_effect = respond
+        early = []
+        thread = threading.Thread(target=lambda: early.append(
+            self.client.request('get', '/v1/mid/charges/ch_1')))
+        thread.start()
+        for _ in range(500):
+            if gets:
+                break
+            threading.Event().wait(0.01)
+
+        self.client.request('post', '/v1/mid/charges/ch_1/capture')
+        resp, _ = self.client.request('get', '/v1/mid/charges/ch_1')
+
+        self.assertEqual('completed', resp['status'])
+        self.assertEqual(2, len(gets))
+        self.release.set()
+        thread.join(5)
+        self.assertEqual('in_progress', early[0][0]['status'])
+        self.assertEqual(0, self.group.stats()['in_flight'])
+
+    def test_stale_after_write(self):
+        stale = singleflight.stale_after_write
+        base = 'https://api/v1/mid/customers/cus_1'
+
+        self.assertTrue(stale(base, base + '/cards'))
+        self.assertTrue(stale(base + '?limit=5', base))
+        self.assertFalse(stale(base + '/cards', base))
+        self.assertTrue(stale(base + '/cards', base, subtree=True))
+        self.assertFalse(stale(base + '_2', base + '_2x'))
+        self.assertTrue(stale('https://api/v1/mid/charges/ch_1',
+                              base + '/charges', object_id='ch_1'))
+
+
+class ResponseCacheTests(APIClientTestCase):
+
+    def setUp(self):
+        super(ResponseCacheTests, self).setUp()
+
+        self.now = 100.0
+        self.clock_patcher = patch('openpay.cache.clock', lambda: self.now)
+        self.clock_patcher.start()
+
+        self._original_cache = openpay.response_cache
+        self._original_merchant_id = openpay.merchant_id
+        self.response_cache = cache.ResponseCache(
+            ttl=10, backend=self.make_backend())
+        openpay.response_cache = self.response_cache
+        openpay.merchant_id = 'mid'
+        openpay.default_http_client = self.http_client
+        self.base = openpay.get_api_base()
+
+    def tearDown(self):
+        super(ResponseCacheTests, self).tearDown()
+
+        self.clock_patcher.stop()
+        openpay.response_cache = self._original_cache
+        openpay.merchant_id = self._original_merchant_id
+
+    def make_backend(self):
+        return cache.MemoryBackend(max_entries=3)
+
+    def key(self, path):
+        return self.base + path, 'sk_key'
+
+    def put(self, path, value):
+        self.response_cache.store(self.key(path), value,
+                                  self.response_cache.generation)
+
+    def cached(self, path):
+        return self.response_cache.lookup(self.key(path))
+
+    def test_entries_expire(self):
+        self.put('/v1/mid/plans/p1', {'id': 'p1'})
+        self.assertEqual({'id': 'p1'}, self.cached('/v1/mid/plans/p1'))
+
+        self.now += 10
+        self.assertEqual(None, self.cached('/v1/mid/plans/p1'))
+        self.assertEqual(0, self.response_cache.stats()['entries'])
+
+    def test_least_recently_used_is_evicted(self):
+        for name in ('p1', 'p2', 'p3'):
+            self.put('/v1/mid/plans/' + name, {'id': name})
+        self.cached('/v1/mid/plans/p1')
+        self.put('/v1/mid/plans/p4', {'id': 'p4'})
+
+        self.assertEqual(None, self.cached('/v1/mid/plans/p2'))
+        self.assertEqual({'id': 'p1'}, self.cached('/v1/mid/plans/p1'))
+        self.assertEqual(1, self.response_cache.stats()['evictions'])
+
+    def test_max_bytes(self):
+        self.response_cache.backend.max_bytes = 40
+        self.put('/v1/mid/plans/p1', {'id': 'p1', 'name': 'gold'})
+        self.put('/v1/mid/plans/p2', {'id': 'p2', 'name': 'silver'})
+
+        self.assertEqual(None, self.cached('/v1/mid/plans/p1'))
+        self.assertTrue(self.response_cache.stats()['bytes'] <= 40)
+
+    def test_invalidation_scope(self):
+        self.put('/v1/mid/customers/c1', {'id': 'c1'})
+        self.put('/v1/mid/customers/c1/cards/k1', {'id': 'k1'})
+        self.put('/v1/mid/charges/ch1', {'id': 'ch1'})
+
+        self.response_cache.invalidate(
+            self.base + '/v1/mid/customers/c1/charges/ch1/refund', 'ch1')
+
+        self.assertEqual(None, self.cached('/v1/mid/customers/c1'))
+        self.assertEqual(None, self.cached('/v1/mid/charges/ch1'))
+        self.assertEqual({'id': 'k1'},
+                         self.cached('/v1/mid/customers/c1/cards/k1'))
+
+        self.response_cache.invalidate(self.base + '/v1/mid/customers/c1',
+                                       subtree=True)
+        self.assertEqual(None, self.cached('/v1/mid/customers/c1/cards/k1'))
+
+    def test_store_skipped_after_concurrent_write(self):
+        generation = self.response_cache.generation
+        self.response_cache.invalidate(self.base + '/v1/mid/plans/p1')
+        self.response_cache.store(self.key('/v1/mid/plans/p1'), {'id': 'p1'},
+                                  generation)
+
+        self.assertEqual(None, self.cached('/v1/mid/plans/p1'))
+
+    def test_retrieve_reads_through_cache(self):
+        self.http_client.request.return_value = ('{"id": "cus_1"}', 200)
+
+        first = openpay.Customer.retrieve('cus_1', api_key='sk_key')
+        second = openpay.Customer.retrieve('cus_1', api_key='sk_key')
+        openpay.Customer.retrieve('cus_1', api_key='sk_key', cache=False)
+
+        self.assertEqual('cus_1', second.id)
+        self.assertFalse(first is second)
+        self.assertEqual(2, self.http_client.request.call_count)
+        stats = self.response_cache.stats()
+        self.assertEqual((1, 1), (stats['hits'], stats['misses']))
+
+    def test_retrieves_can_bypass_cache(self):
+        self.http_client.request.return_value = ('{"id": "p1"}', 200)
+
+        openpay.Plan.retrieve('p1')
+        openpay.Plan.retrieve('p1', cache=False)
+        openpay.Plan.retrieve_many(['p1'], cache=False)
+
+        self.assertEqual(3, self.http_client.request.call_count)
+        stats = self.response_cache.stats()
+        self.assertEqual((0, 1), (stats['hits'], stats['misses']))
+
+    def test_only_opted_in_classes_are_cached(self):
+        self.http_client.request.return_value = ('{"id": "ch_1"}', 200)
+
+        openpay.Charge.retrieve_as_merchant('ch_1')
+        openpay.Charge.retrieve_as_merchant('ch_1')
+        openpay.Charge.retrieve_many(['ch_1'])
+        openpay.Payout.retrieve_as_merchant('tr_1')
+        openpay.Transfer.retrieve('tr_1')
+        charge = openpay.Charge.construct_from(
+            {'id': 'ch_1', 'customer_id': 'c1'}, 'sk_key')
+        charge.refresh()
+        charges = openpay.resource.ListObject.construct_from(
+            {'url': '/v1/mid/customers/c1/charges', 'item_type': 'charge'},
+            'sk_key')
+        charges.retrieve('ch_1')
+
+        self.assertEqual(7, self.http_client.request.call_count)
+        self.assertEqual(self.base + '/v1/mid/customers/c1/charges/ch_1',
+                         self.http_client.request.call_args[0][1])
+        stats = self.response_cache.stats()
+        self.assertEqual((0, 0, 0),
+                         (stats['hits'], stats['misses'], stats['entries']))
+
+    def test_writes_invalidate(self):
+        self.http_client.request.return_value = (
+            '{"id": "ba_1", "customer_id": "c1", "alias": "old"}', 200)
+        openpay.Customer.retrieve('c1')
+        bank_accounts = openpay.resource.ListObject.construct_from(
+            {'url': '/v1/mid/customers/c1/bankaccounts',
+             'item_type': 'bank_account'}, 'sk_key')
+        account = bank_accounts.retrieve('ba_1')
+        self.assertEqual(2, self.response_cache.stats()['entries'])
+
+        bank_accounts.retrieve('ba_1').delete()
+
+        # Both the bank account and the customer above it are gone.
+        self.assertEqual(0, self.response_cache.stats()['entries'])
+        self.assertEqual(3, self.http_client.request.call_count)
+        self.assertEqual('old', account.alias)
+        self.assertEqual(
+            self.base + '/v1/mid/customers/c1/bankaccounts/ba_1',
+            self.http_client.request.call_args[0][1])
+
+    def test_failed_write_still_invalidates(self):
+        self.put('/v1/mid/customers/c1', {'id': 'c1'})
+        self.http_client.request.side_effect = \
+            openpay.error.APIConnectionError('reset')
+        client = api.APIClient('sk_key', client=self.http_client)
+
+        self.assertRaises(openpay.error.APIConnectionError, client.request,
+                          'put', '/v1/mid/customers/c1', {'name': 'x'})
+        self.assertEqual(None, self.cached('/v1/mid/customers/c1'))
+
+
+class SQLiteResponseCacheTests(ResponseCacheTests):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+        super(SQLiteResponseCacheTests, self).setUp()
+
+        self.time_patcher = patch('openpay.cache.time',
+                                  Mock(time=lambda: self.now))
+        self.time_patcher.start()
+
+    def tearDown(self):
+        super(SQLiteResponseCacheTests, self).tearDown()
+
+        self.time_patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def make_backend(self):
+        return cache.SQLiteBackend(self.path, max_entries=3)
+
+    def test_least_recently_used_is_evicted(self):
+        # SQLite evicts the entries closest to expiry instead.
+        for name in ('p1', 'p2', 'p3'):
+            self.put('/v1/mid/plans/' + name, {'id': name})
+            self.now += 1
+        self.cached('/v1/mid/plans/p1')
+        self.put('/v1/mid/plans/p4', {'id': 'p4'})
+
+        self.assertEqual(None, self.cached('/v1/mid/plans/p1'))
+        self.assertEqual({'id': 'p2'}, self.cached('/v1/mid/plans/p2'))
+        self.assertEqual(1, self.response_cache.stats()['evictions'])
+
+    def test_file_is_private_and_keys_hashed(self):
+        self.put('/v1/mid/plans/p1', {'id': 'p1'})
+
+        self.assertEqual(0o600, os.stat(self.path).st_mode & 0o777)
+        with open(self.path, 'rb') as f:
+            self.assertFalse(b'sk_key' in f.read())
+
+    def test_shared_between_processes(self):
+        # Entries are written with the real clock here.
+        self.time_patcher.stop()
+        try:
+            self.check_shared_between_processes()
+        finally:
+            self.time_patcher.start()
+
+    def check_shared_between_processes(self):
+        script = (
+            'import sys\n'
+            'from openpay import cache\n'
+            'backend = cache.SQLiteBackend(sys.argv[1])\n'
+            'backend.set(("https://x/v1/mid/customers/c1", "sk_key"),\n'
+            '            {"id": "c1"}, 60, backend.generation())\n')
+        subprocess.check_call(
+            [sys.executable, '-c', script, self.path],
+            cwd=os.path.dirname(os.path.dirname(openpay.__file__)))
+
+        other = cache.SQLiteBackend(self.path)
+        self.assertEqual({'id': 'c1'}, other.get(
+            ('https://x/v1/mid/customers/c1', 'sk_key')))
+        self.assertEqual(None, other.get(
+            ('https://x/v1/mid/customers/c1', 'sk_other')))
+
+        self.response_cache.invalidate('https://x/v1/mid/customers/c1')
+        self.assertEqual(None, other.get(
+            ('https://x/v1/mid/customers/c1', 'sk_key')))
+
+
+class CodecTests(APIClientTestCase):
+
+    body = '{"id": "ch_1", "description": "Pago caf\u00e9 \u2713"}'
+
+    def setUp(self):
+        super(CodecTests, self).setUp()
+
+        self._original_codec = openpay.json_codec
+
+    def tearDown(self):
+        super(CodecTests, self).tearDown()
+
+        openpay.json_codec = self._original_codec
+
+    def test_every_available_codec_round_trips_bytes(self):
+        names = [c.name for c in codec.available()]
+        self.assertEqual('stdlib', names[-1])
+
+        for json_codec in codec.available():
+            parsed = json_codec.loads(self.body.encode('utf-8'))
+            self.assertEqual('Pago caf\u00e9 \u2713', parsed['description'])
+            self.assertEqual(parsed, json_codec.loads(
+                json_codec.dumps(parsed)))
+
+    def test_get_by_name(self):
+        self.assertEqual('stdlib', codec.get('stdlib').name)
+        self.assertRaises(ValueError, codec.get, 'yaml')
+
+    def test_orjson_falls_back_for_unsupported_values(self):
+        try:
+            orjson_codec = codec.get('orjson')
+        except ImportError:
+            self.skipTest('orjson is not installed')
+
+        self.assertEqual({'1': 2**70}, codec.get('stdlib').loads(
+            orjson_codec.dumps({1: 2**70})))
+
+    def test_client_uses_configured_codec(self):
+        recorder = Mock(wraps=codec.get('stdlib'))
+        openpay.json_codec = recorder
+        self.http_client.request.return_value = (
+            self.body.encode('utf-8'), 200)
+        client = api.APIClient('sk_key', client=self.http_client)
+
+        resp, _ = client.request('post', '/v1/mid/charges', {'amount': 1})
+
+        self.assertEqual('ch_1', resp['id'])
+        recorder.dumps.assert_called_with({'amount': 1})
+        recorder.loads.assert_called_with(self.body.encode('utf-8'))
+
+    def test_invalid_body_reported_decoded(self):
+        client = api.APIClient('sk_key', client=self.http_client)
+
+        try:
+            client.interpret_response(b'<html>caf\xc3\xa9</html>', 502)
+        except openpay.error.APIError as e:
+            self.assertTrue('<html>caf\u00e9</html>' in str(e))
+        else:
+            self.fail('APIError not raised')
+
+    def test_no_content(self):
+        client = api.APIClient('sk_key', client=self.http_client)
+
+        self.assertEqual({}, client.interpret_response(b'', 204))
+
+
+class _ChunkedClient(http_client.HTTPClient):
+    name = 'chunkedclient'
+
+    def __init__(self, body, status=200, chunk_size=7):
+        super(_ChunkedClient, self).__init__()
+        self.body = body
+        self.status = status
+        self.chunk_size = chunk_size
+        self.chunks_read = 0
+        self.closed = False
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       user=None, timeout=None):
+        return self._chunks(), self.status, {}
+
+    def _chunks(self):
+        try:
+            for i in range(0, len(self.body), self.chunk_size):
+                self.chunks_read += 1
+                yield self.body[i:i + self.chunk_size]
+        finally:
+            self.closed = True
+
+
+class StreamingTests(APIClientTestCase):
+
+    items = [
+        {'id': 'ch_1', 'description': 'café [1] {"x"}', 'amount': 10},
+        {'id': 'ch_2', 'description': 'back\\slash \\"', 'amount': 2.5,
+         'card': {'brand': 'visa', 'tags': [1, [2, 3]]}},
+        {'id': 'ch_3', 'amount': 100, 'metadata': None},
+    ]
+
+    def setUp(self):
+        super(StreamingTests, self).setUp()
+
+        self.body = json.dumps(self.items, indent=1).encode('utf-8')
+
+    def test_every_chunk_boundary(self):
+        for size in range(1, len(self.body) + 1):
+            self.assertEqual(self.items, list(streaming.iter_array(
+                self.body[i:i + size]
+                for i in range(0, len(self.body), size))))
+
+    def test_scalars_and_empty_arrays(self):
+        for body in (b'[]', b' [ ] ', b'[12, 345,6]', b'["a", true, null]'):
+            for size in (1, 2, len(body)):
+                chunks = [body[i:i + size]
+                          for i in range(0, len(body), size)]
+                self.assertEqual(json.loads(body.decode('utf-8')),
+                                 list(streaming.iter_array(chunks)))
+
+    def test_invalid_bodies(self):
+        for body in (b'{"id": "ch_1"}', b'[{"id": 1}', b'[{"id": 1},',
+                     b'[{"id": }]', b''):
+            self.assertRaises(openpay.error.APIError, list,
+                              streaming.iter_array([body]))
+
+    def test_yields_before_reading_everything(self):
+        transport = _ChunkedClient(self.body)
+        client = api.APIClient('sk_key', client=transport)
+
+        items, api_key = client.request_stream('get', '/v1/mid/charges',
+                                               {'limit': 3})
+
+        self.assertEqual('sk_key', api_key)
+        self.assertEqual(self.items[0], next(items))
+        self.assertTrue(transport.chunks_read < len(self.body) // 7)
+        items.close()
+        self.assertTrue(transport.closed)
+
+    def test_error_status_raises(self):
+        transport = _ChunkedClient(
+            b'{"description": "nope", "error_code": 1001}', status=400)
+        client = api.APIClient('sk_key', client=transport)
+
+        self.assertRaises(openpay.error.InvalidRequestError,
+                          client.request_stream, 'get', '/v1/mid/charges')
+
+    def test_retried_response_is_closed(self):
+        error_body = _ChunkedClient(
+            b'{"description": "down", "error_code": 1000}')._chunks()
+        transport = _ChunkedClient(self.body)
+        transport.request_stream = Mock(side_effect=[
+            (error_body, 503, {}), (transport._chunks(), 200, {})])
+        client = api.APIClient(
+            'sk_key', client=transport,
+            retry_policy=retry.RetryPolicy(backoff_base=0))
+
+        items, _ = client.request_stream('get', '/v1/mid/charges')
+
+        self.assertEqual(self.items, list(items))
+        self.assertEqual(2, transport.request_stream.call_count)
+        self.assertRaises(StopIteration, next, error_body)
+
+    def test_transport_without_streaming(self):
+        self.http_client.request.return_value = (self.body, 200, {})
+        client = api.APIClient('sk_key', client=self.http_client)
+
+        items, _ = client.request_stream('get', '/v1/mid/charges')
+
+        self.assertEqual(self.items, list(items))
+
+    def test_resource_stream(self):
+        openpay.default_http_client = _ChunkedClient(self.body)
+
+        charges = list(openpay.Charge.stream(limit=3))
+
+        self.assertEqual(['ch_1', 'ch_2', 'ch_3'], [c.id for c in charges])
+        self.assertTrue(all(isinstance(c, openpay.Charge) for c in charges))
+        self.assertEqual('visa', charges[1].card.brand)
+        self.assertTrue(openpay.default_http_client.closed)
+
+        customer = openpay.Customer.construct_from(
+            {'id': 'cus_1'}, 'sk_key')
+        cards = list(customer.cards.stream())
+        self.assertTrue(all(isinstance(c, openpay.Card) for c in cards))
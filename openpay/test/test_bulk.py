@@ -0,0 +1,326 @@
+from __future__ import unicode_literals
+import threading
+
+from future.builtins import super
+from mock import Mock
+
+import openpay
+from openpay.test.helper import OpenpayApiTestCase
+
+
+class BulkTestCase(OpenpayApiTestCase):
+
+    def setUp(self):
+        super(BulkTestCase, self).setUp()
+
+        self.lock = threading.Lock()
+        self.urls = []
+        self.requestor_mock.request = Mock(side_effect=self.respond)
+
+    def respond(self, method, url, params, **kwargs):
+        with self.lock:
+            self.urls.append(url)
+        id = url.rsplit('/', 1)[1]
+        if id.startswith('missing'):
+            raise openpay.error.InvalidRequestError(
+                'The requested resource doesn\'t exist', None,
+                http_status=404)
+        if id.startswith('broken'):
+            raise ValueError('unexpected response')
+        return {'id': id, 'method': method}, 'reskey'
+
+
+class RetrieveManyTests(BulkTestCase):
+
+    def test_preserves_order_and_deduplicates(self):
+        ids = ['ch_%d' % i for i in range(20)] + ['ch_3', 'ch_0']
+
+        charges = openpay.Charge.retrieve_many(ids, concurrency=4)
+
+        self.assertEqual(ids, [charge.id for charge in charges])
+        self.assertTrue(all(isinstance(charge, openpay.Charge)
+                            for charge in charges))
+        self.assertTrue(charges[3] is charges[20])
+        self.assertEqual(20, len(self.urls))
+
+    def test_errors_are_returned_per_id(self):
+        customers = openpay.Customer.retrieve_many(
+            ['cus_1', 'missing_1', 'cus_2'])
+
+        self.assertEqual('cus_1', customers[0].id)
+        self.assertTrue(isinstance(customers[1],
+                                   openpay.error.InvalidRequestError))
+        self.assertEqual(404, customers[1].http_status)
+        self.assertEqual('cus_2', customers[2].id)
+
+    def test_unexpected_errors_are_returned_per_id(self):
+        customers = openpay.Customer.retrieve_many(['cus_1', 'broken_1'])
+
+        self.assertEqual('cus_1', customers[0].id)
+        self.assertTrue(isinstance(customers[1], ValueError))
+
+    def test_customer_scoped_list(self):
+        customer = openpay.Customer.construct_from({'id': 'cus_1'}, 'mykey')
+
+        charges = customer.charges.retrieve_many(['ch_1', 'ch_2'])
+
+        self.assertEqual(['ch_1', 'ch_2'], [c.id for c in charges])
+        self.assertTrue(isinstance(charges[0], openpay.Charge))
+        self.assertEqual(
+            set(['/v1/{0}/customers/cus_1/charges/ch_1'.format(
+                openpay.merchant_id),
+                '/v1/{0}/customers/cus_1/charges/ch_2'.format(
+                    openpay.merchant_id)]),
+            set(self.urls))
+
+    def test_empty(self):
+        self.assertEqual([], openpay.Plan.retrieve_many([]))
+
+
+class CreateManyTests(BulkTestCase):
+
+    def respond(self, method, url, params, **kwargs):
+        with self.lock:
+            self.urls.append(url)
+            self.keys[params['n']] = kwargs.get('idempotency_key')
+        if params.get('email') == 'bad':
+            raise openpay.error.InvalidRequestError(
+                'email is invalid', None, http_status=400)
+        if params.get('email') == 'broken':
+            raise ValueError('unexpected response')
+        return dict(params, id='obj_%s' % params['n']), 'reskey'
+
+    def setUp(self):
+        super(CreateManyTests, self).setUp()
+
+        self.keys = {}
+
+    def test_reports_results_and_failures_by_index(self):
+        rows = [{'n': i, 'email': 'bad' if i == 3 else 'ok'}
+                for i in range(10)]
+
+        outcomes = list(openpay.Customer.create_many(rows, concurrency=3))
+
+        self.assertEqual(list(range(10)),
+                         sorted(outcome.index for outcome in outcomes))
+        failed = [outcome for outcome in outcomes if outcome.error]
+        self.assertEqual(1, len(failed))
+        self.assertEqual(3, failed[0].index)
+        self.assertEqual(rows[3], failed[0].params)
+        self.assertEqual(400, failed[0].error.http_status)
+
+        created = [o for o in outcomes if o.result is not None]
+        self.assertTrue(all(isinstance(o.result, openpay.Customer)
+                            for o in created))
+        self.assertTrue(all(o.result.id == 'obj_%d' % o.index
+                            for o in created))
+
+    def test_unexpected_errors_are_reported(self):
+        rows = [{'n': 0}, {'n': 1, 'email': 'broken'}]
+
+        outcomes = sorted(openpay.Customer.create_many(rows))
+
+        self.assertEqual('obj_0', outcomes[0].result.id)
+        self.assertTrue(isinstance(outcomes[1].error, ValueError))
+
+    def test_reports_idempotency_keys(self):
+        rows = [{'n': 0, 'amount': 1},
+                {'n': 1, 'amount': 1, 'email': 'broken'},
+                {'n': 2, 'amount': 1, 'idempotency_key': 'payout-2'}]
+
+        outcomes = sorted(openpay.Payout.create_many(rows))
+
+        self.assertEqual([self.keys[n] for n in range(3)],
+                         [o.idempotency_key for o in outcomes])
+        self.assertEqual('payout-2', outcomes[2].idempotency_key)
+        self.assertTrue(outcomes[0].idempotency_key)
+        self.assertNotEqual(outcomes[0].idempotency_key,
+                            outcomes[1].idempotency_key)
+        self.assertEqual(rows[1], outcomes[1].params)
+
+        outcome, = openpay.Customer.create_many(
+            [{'n': 3, 'idempotency_key': 'cus-3'}])
+        self.assertEqual('cus-3', outcome.idempotency_key)
+        self.assertEqual('cus-3', self.keys[3])
+        outcome, = openpay.Customer.create_many([{'n': 4}])
+        self.assertEqual(None, outcome.idempotency_key)
+
+    def test_consumes_input_lazily(self):
+        pulled = []
+
+        def rows():
+            for i in range(100):
+                pulled.append(i)
+                yield {'n': i, 'amount': 10}
+
+        outcomes = openpay.Payout.create_many(rows(), concurrency=4)
+        next(outcomes)
+        self.assertTrue(len(pulled) <= 5)
+        outcomes.close()
+
+        self.assertTrue(len(pulled) < 100)
+
+    def test_follows_adaptive_limit(self):
+        original = openpay.concurrency_limiter
+        openpay.concurrency_limiter = openpay.concurrency.AdaptiveLimiter(
+            initial_limit=2, max_limit=6)
+        pulled = []
+
+        def rows():
+            for i in range(100):
+                pulled.append(i)
+                yield {'n': i}
+
+        try:
+            outcomes = openpay.Customer.create_many(rows())
+            next(outcomes)
+            self.assertTrue(len(pulled) <= 3)
+            outcomes.close()
+        finally:
+            openpay.concurrency_limiter = original
+
+    def test_does_not_mutate_input(self):
+        row = {'n': 1, 'customer': 'cus_1', 'amount': 10}
+
+        outcome, = openpay.Charge.create_many([row])
+
+        self.assertEqual('cus_1', row['customer'])
+        self.assertEqual(
+            '/v1/{0}/customers/cus_1/charges'.format(openpay.merchant_id),
+            self.urls[0])
+        self.assertTrue(isinstance(outcome.result, openpay.Charge))
+
+    def test_customer_scoped_list(self):
+        customer = openpay.Customer.construct_from({'id': 'cus_1'}, 'mykey')
+
+        outcomes = list(customer.cards.create_many([{'n': 1}, {'n': 2}]))
+
+        self.assertEqual(2, len(outcomes))
+        self.assertEqual(
+            ['/v1/{0}/customers/cus_1/cards'.format(openpay.merchant_id)] * 2,
+            self.urls)
+
+
+class AutoPagingTests(BulkTestCase):
+
+    TOTAL = 23
+
+    def respond(self, method, url, params, **kwargs):
+        with self.lock:
+            self.urls.append((url, dict(params)))
+        if params.get('fail_at') == params['offset']:
+            raise openpay.error.APIConnectionError('connection reset')
+        offset = params['offset']
+        limit = min(params['limit'], openpay.bulk.DEFAULT_PAGE_SIZE)
+        items = [{'id': 'ch_%d' % i}
+                 for i in range(offset, min(offset + limit, self.TOTAL))]
+        return items, 'reskey'
+
+    def test_iter_all_walks_every_page(self):
+        charges = list(openpay.Charge.iter_all(
+            page_size=10, status='completed'))
+
+        self.assertEqual(['ch_%d' % i for i in range(self.TOTAL)],
+                         [charge.id for charge in charges])
+        self.assertTrue(isinstance(charges[0], openpay.Charge))
+        self.assertEqual([0, 10, 20],
+                         [params['offset'] for _, params in self.urls])
+        self.assertTrue(all(params['status'] == 'completed' and
+                            params['limit'] == 10
+                            for _, params in self.urls))
+
+    def test_stops_after_full_last_page(self):
+        self.TOTAL = 20
+
+        ids = [c.id for c in openpay.Charge.iter_all(page_size=10,
+                                                     prefetch=0)]
+
+        self.assertEqual(20, len(ids))
+        self.assertEqual(3, len(self.urls))
+
+    def test_limit_is_capped_at_page_size_the_api_serves(self):
+        self.TOTAL = 350
+
+        ids = [c.id for c in openpay.Charge.iter_all(limit=1000)]
+
+        self.assertEqual(350, len(ids))
+        self.assertEqual([100] * 4, [p['limit'] for _, p in self.urls])
+
+    def test_prefetch_is_bounded(self):
+        self.TOTAL = 1000
+        charges = openpay.Charge.iter_all(page_size=10, prefetch=2)
+
+        next(charges)
+        for _ in range(50):
+            with self.lock:
+                if len(self.urls) >= 4:
+                    break
+            threading.Event().wait(0.01)
+
+        # Page being consumed + two buffered + one blocked in put().
+        self.assertTrue(len(self.urls) <= 4)
+        charges.close()
+
+    def test_errors_surface_to_caller(self):
+        charges = openpay.Charge.iter_all(page_size=10, fail_at=10)
+
+        self.assertEqual(10, len([next(charges) for _ in range(10)]))
+        self.assertRaises(openpay.error.APIConnectionError, next, charges)
+
+    def test_list_object_reuses_filters(self):
+        first_page = openpay.Charge.all(limit=5, offset=15)
+        self.assertEqual(5, len(first_page.data))
+
+        ids = [c.id for c in first_page.auto_paging_iter()]
+
+        self.assertEqual(['ch_%d' % i for i in range(15, self.TOTAL)], ids)
+
+    def test_customer_list(self):
+        customer = openpay.Customer.construct_from({'id': 'cus_1'}, 'mykey')
+
+        charges = list(customer.charges.auto_paging_iter(page_size=20))
+
+        self.assertEqual(self.TOTAL, len(charges))
+        self.assertTrue(isinstance(charges[0], openpay.Charge))
+        self.assertEqual(
+            '/v1/{0}/customers/cus_1/charges'.format(openpay.merchant_id),
+            self.urls[-1][0])
+
+
+class PartitionedListTests(BulkTestCase):
+
+    def respond(self, method, url, params, **kwargs):
+        with self.lock:
+            self.urls.append((url, dict(params)))
+        day = params['creation']['gte']
+        self.assertEqual(day, params['creation']['lte'])
+        if params['offset'] > 0:
+            return [], 'reskey'
+        # Newest first, as the API returns them.
+        return [{'id': '%s-%d' % (day, hour),
+                 'creation_date': '%sT%02d:00:00-06:00' % (day, hour)}
+                for hour in (20, 9, 1)], 'reskey'
+
+    def test_date_slices(self):
+        self.assertEqual(
+            [('2024-01-30', '2024-02-05'), ('2024-02-06', '2024-02-12'),
+             ('2024-02-13', '2024-02-14')],
+            openpay.bulk.date_slices('2024-01-30', '2024-02-14', 7))
+        self.assertEqual([], openpay.bulk.date_slices(
+            '2024-02-14', '2024-02-13'))
+
+    def test_merges_slices_in_creation_order(self):
+        charges = list(openpay.Charge.iter_partitioned(
+            '2024-02-27', '2024-03-02', concurrency=3, status='completed'))
+
+        self.assertEqual(15, len(charges))
+        dates = [charge.creation_date for charge in charges]
+        self.assertEqual(sorted(dates), dates)
+        self.assertEqual('2024-02-27-1', charges[0].id)
+        self.assertEqual('2024-03-02-20', charges[-1].id)
+        self.assertTrue(all(params['status'] == 'completed'
+                            for _, params in self.urls))
+        self.assertEqual(
+            set(['2024-02-27', '2024-02-28', '2024-02-29', '2024-03-01',
+                 '2024-03-02']),
+            set(params['creation']['gte'] for _, params in self.urls))
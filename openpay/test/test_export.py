@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import csv
+import io
+import os
+import shutil
+import tempfile
+
+from future.builtins import super
+
+import openpay
+from openpay import export
+from openpay.test.helper import OpenpayApiTestCase, OpenpayUnitTestCase
+
+CHARGES = [
+    {'id': 'ch_1', 'amount': 100, 'status': 'completed',
+     'creation_date': '2024-03-01T11:00:00-06:00', 'conciliated': True,
+     'description': 'Café, "1"', 'card': {'brand': 'visa'},
+     'fee': {'amount': 2.9, 'tax': 0.46, 'currency': 'MXN'}},
+    {'id': 'ch_2', 'amount': 2.5, 'status': 'failed',
+     'creation_date': None, 'card': None},
+]
+
+
+class CSVExportTests(OpenpayUnitTestCase):
+
+    def test_write_csv(self):
+        out = io.StringIO()
+        columns = (export.column('id'), export.column('card.brand'),
+                   export.column('fee.amount', export.FLOAT),
+                   export.column('amount', export.INT),
+                   export.column('creation_date', export.TIMESTAMP),
+                   export.column('description', name='concept'))
+
+        count = export.write_csv(iter(CHARGES), out, columns)
+
+        self.assertEqual(2, count)
+        self.assertEqual([
+            ['id', 'card_brand', 'fee_amount', 'amount', 'creation_date',
+             'concept'],
+            ['ch_1', 'visa', '2.9', '100', '2024-03-01T17:00:00Z',
+             'Café, "1"'],
+            ['ch_2', '', '', '2', '', ''],
+        ], list(csv.reader(io.StringIO(out.getvalue()))))
+
+    def test_csv_unknown_type(self):
+        self.assertRaises(ValueError, export.write_csv, [], io.StringIO(),
+                          [export.column('amount', 'decimal')])
+
+    def test_declared_columns_flatten_resources(self):
+        charges = openpay.resource.convert_to_openpay_object(
+            [dict(c, object='charge') for c in CHARGES], 'sk_key')
+
+        rows = list(export.rows(charges, export.CHARGE_COLUMNS))
+
+        names = [c.name for c in export.CHARGE_COLUMNS]
+        first = dict(zip(names, rows[0]))
+        self.assertEqual('visa', first['card_brand'])
+        self.assertEqual(0.46, first['fee_tax'])
+        self.assertEqual(None, first['card_holder_name'])
+        self.assertEqual(len(set(names)), len(names))
+        for spec in (export.PAYOUT_COLUMNS, export.TRANSFER_COLUMNS):
+            names = [c.name for c in spec]
+            self.assertEqual(len(set(names)), len(names))
+
+
+class ArrowExportTests(OpenpayUnitTestCase):
+
+    def setUp(self):
+        # Skip before the base class patches the HTTP libraries: tearDown
+        # doesn't run for a test skipped in setUp.
+        if export.pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+
+        super(ArrowExportTests, self).setUp()
+
+        self.pyarrow = export.pyarrow
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def charges(self, count):
+        for n in range(count):
+            yield dict(CHARGES[n % 2], id='ch_%d' % n)
+
+    def test_parquet_row_groups(self):
+        path = os.path.join(self.dir, 'charges.parquet')
+
+        count = export.write_parquet(self.charges(5), path,
+                                     export.CHARGE_COLUMNS, batch_size=2)
+
+        self.assertEqual(5, count)
+        parquet = self.pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(3, parquet.num_row_groups)
+        table = parquet.read()
+        self.assertEqual([c.name for c in export.CHARGE_COLUMNS],
+                         table.schema.names)
+        self.assertEqual(['ch_%d' % n for n in range(5)],
+                         table.column('id').to_pylist())
+        self.assertEqual([2.9, None], table.column('fee_amount')
+                         .to_pylist()[:2])
+        created = table.column('creation_date').to_pylist()
+        self.assertEqual('2024-03-01 17:00:00+00:00', str(created[0]))
+        self.assertEqual(None, created[1])
+
+    def test_arrow_file(self):
+        path = os.path.join(self.dir, 'charges.arrow')
+
+        count = export.write_arrow(self.charges(3), path,
+                                   export.CHARGE_COLUMNS, batch_size=2)
+
+        self.assertEqual(3, count)
+        reader = self.pyarrow.ipc.open_file(path)
+        self.assertEqual(2, reader.num_record_batches)
+        self.assertEqual([True, None, True],
+                         reader.read_all().column('conciliated').to_pylist())
+
+    def test_empty_export_still_has_schema(self):
+        path = os.path.join(self.dir, 'empty.parquet')
+
+        self.assertEqual(0, export.write_parquet(
+            [], path, export.TRANSFER_COLUMNS))
+        table = self.pyarrow.parquet.read_table(path)
+        self.assertEqual(0, table.num_rows)
+        self.assertEqual('fee_currency', table.schema.names[-1])
+
+    def test_unknown_type(self):
+        self.assertRaises(ValueError, export.schema,
+                          [export.column('amount', 'decimal')])
+
+
+class PagedExportTests(OpenpayApiTestCase):
+
+    def test_exports_every_page(self):
+        pages = [[dict(CHARGES[0], id='ch_%d' % n) for n in range(2)],
+                 [dict(CHARGES[1], id='ch_2')]]
+        self.requestor_mock.request.side_effect = (
+            lambda method, url, params, **kwargs: (
+                pages[params['offset'] // 2], 'reskey'))
+        out = io.StringIO()
+
+        count = export.write_csv(
+            openpay.Charge.iter_all(compact=True, page_size=2, prefetch=0),
+            out, (export.column('id'),), header=False)
+
+        self.assertEqual(3, count)
+        self.assertEqual('ch_0\r\nch_1\r\nch_2\r\n', out.getvalue())
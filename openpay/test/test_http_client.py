@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import socket
+import threading
+
+from future.builtins import super
+
+import openpay
+from openpay import http_client
+from openpay.test.helper import OpenpayTestCase, OpenpayUnitTestCase
+
+
+class RequestsClientTests(OpenpayUnitTestCase):
+
+    def setUp(self):
+        super(RequestsClientTests, self).setUp()
+
+        self.requests_mock = self.request_mocks['requests']
+        self.requests_mock.Session.side_effect = lambda: self._new_session()
+        self.sessions = []
+
+        self.client = http_client.RequestsClient(
+            verify_ssl_certs=False, pool_maxsize=25)
+
+    def _new_session(self):
+        session = self.requests_mock.MockSession()
+        session.request.return_value.content = b'{}'
+        session.request.return_value.status_code = 200
+        self.sessions.append(session)
+        return session
+
+    def test_reuses_session_across_requests(self):
+        self.client.request('get', 'https://example.com/a', {})
+        self.client.request('post', 'https://example.com/b', {}, '{}')
+
+        self.assertEqual(1, self.requests_mock.Session.call_count)
+        self.assertEqual(2, self.sessions[0].request.call_count)
+        self.requests_mock.adapters.HTTPAdapter.assert_called_once_with(
+            pool_connections=10, pool_maxsize=25, pool_block=False)
+
+    def test_threads_share_connection_pool(self):
+        self.client.request('get', 'https://example.com/a', {})
+
+        thread = threading.Thread(
+            target=self.client.request,
+            args=('get', 'https://example.com/a', {}))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(2, len(self.sessions))
+        self.assertEqual(
+            1, self.requests_mock.adapters.HTTPAdapter.call_count)
+        adapter = self.requests_mock.adapters.HTTPAdapter.return_value
+        for session in self.sessions:
+            session.mount.assert_any_call('https://', adapter)
+
+    def test_close_releases_pool(self):
+        with self.client as client:
+            client.request('get', 'https://example.com/a', {})
+
+        adapter = self.requests_mock.adapters.HTTPAdapter.return_value
+        adapter.close.assert_called_once_with()
+
+        self.client.request('get', 'https://example.com/a', {})
+        self.assertEqual(2, self.requests_mock.Session.call_count)
+        self.assertEqual(
+            2, self.requests_mock.adapters.HTTPAdapter.call_count)
+
+    def test_sends_utf8_body(self):
+        self.client.request('post', 'https://example.com/b', {},
+                            '{"description": "José, 5 €"}')
+
+        body = self.sessions[0].request.call_args[1]['data']
+        self.assertEqual('{"description": "José, 5 €"}'.encode('utf-8'),
+                         body)
+
+    def test_sends_precomputed_basic_auth(self):
+        self.client.request('get', 'https://example.com/a', {'k': 'v'},
+                            user='sk_key')
+
+        headers = self.sessions[0].request.call_args[1]['headers']
+        self.assertEqual('Basic c2tfa2V5Og==', headers['Authorization'])
+        self.assertEqual('v', headers['k'])
+        self.assertTrue(
+            http_client.basic_auth_header('sk_key') is
+            http_client.basic_auth_header('sk_key'))
+
+    def test_timeouts(self):
+        self.client.request('get', 'https://example.com/a', {})
+        self.client.request('get', 'https://example.com/a', {},
+                            timeout=(2, 15))
+
+        calls = self.sessions[0].request.call_args_list
+        self.assertEqual((30, 80), calls[0][1]['timeout'])
+        self.assertEqual((2, 15), calls[1][1]['timeout'])
+        self.assertEqual(
+            (5, 5), http_client.RequestsClient(timeout=5).timeout)
+
+    def test_request_stream(self):
+        self.client.request('get', 'https://example.com/a', {})
+        response = self.sessions[0].request.return_value
+        response.iter_content.return_value = iter([b'[1,', b'2]'])
+
+        chunks, status, _ = self.client.request_stream(
+            'get', 'https://example.com/a', {})
+
+        self.assertTrue(self.sessions[0].request.call_args[1]['stream'])
+        self.assertEqual(200, status)
+        self.assertFalse(response.close.called)
+        self.assertEqual([b'[1,', b'2]'], list(chunks))
+        response.iter_content.assert_called_once_with(
+            http_client.CHUNK_SIZE)
+        response.close.assert_called_once_with()
+
+    def test_unread_stream_can_be_closed(self):
+        self.client.request('get', 'https://example.com/a', {})
+        response = self.sessions[0].request.return_value
+
+        chunks, _, _ = self.client.request_stream(
+            'get', 'https://example.com/a', {})
+        chunks.close()
+
+        response.close.assert_called_once_with()
+
+
+class Urllib2ClientTests(OpenpayTestCase):
+
+    def setUp(self):
+        super(Urllib2ClientTests, self).setUp()
+
+        self.release = threading.Event()
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.addCleanup(self.server.close)
+        self.url = 'http://127.0.0.1:%d/v1/charges' % (
+            self.server.getsockname()[1],)
+        self.client = http_client.Urllib2Client(timeout=0.2)
+
+    def stall_after(self, reply):
+        # Accept the connection, send ``reply`` and then go quiet.
+        def serve():
+            conn, _ = self.server.accept()
+            conn.recv(65536)
+            conn.sendall(reply)
+            self.release.wait(5)
+            conn.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(self.release.set)
+
+    def test_stalled_response_is_a_connection_error(self):
+        self.stall_after(b'')
+
+        self.assertRaises(openpay.error.APIConnectionError,
+                          self.client.request, 'get', self.url, {})
+
+    def test_stalled_body_is_a_connection_error(self):
+        self.stall_after(b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n'
+                         b'\r\n{"id": ')
+
+        self.assertRaises(openpay.error.APIConnectionError,
+                          self.client.request, 'get', self.url, {})
@@ -28,6 +28,10 @@ class FunctionalTests(OpenpayTestCase):
     def setUp(self):
         super(FunctionalTests, self).setUp()
 
+        # Build the transport under test rather than reuse a cached one.
+        self._original_http_client = openpay.default_http_client
+        openpay.default_http_client = None
+
         def get_http_client(*args, **kwargs):
             return self.request_client(*args, **kwargs)
 
@@ -41,6 +45,7 @@ class FunctionalTests(OpenpayTestCase):
         super(FunctionalTests, self).tearDown()
 
         self.client_patcher.stop()
+        openpay.default_http_client = self._original_http_client
 
     def test_dns_failure(self):
         self.patched_api_base = patch(
@@ -1,8 +1,14 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 from future.builtins import super
-#import json
+import json
+import pickle
+
+from mock import patch
+
 import openpay
+import openpay.columns
+import openpay.compact
 #from openpay import util
 
 from openpay.test.helper import (
@@ -78,6 +84,52 @@ class BaseObjectTests(OpenpayUnitTestCase):
         self.assertEqual(4, obj.trans)
         self.assertEqual({'amount': 42}, obj._previous_metadata)
 
+    def test_lazy_conversion(self):
+        openpay.lazy_objects = True
+        self.addCleanup(setattr, openpay, 'lazy_objects', False)
+        card = {'brand': 'visa', 'address': {'city': 'Queretaro'}}
+        values = {'id': 'ch_1', 'card': card, 'fees': [{'amount': 1}]}
+
+        obj = openpay.Charge.construct_from(values, 'mykey')
+
+        self.assertTrue(dict.__getitem__(obj, 'card') is card)
+        self.assertTrue(isinstance(obj.card, openpay.resource.BaseObject))
+        self.assertTrue(obj.card is obj['card'])
+        self.assertEqual('mykey', obj.card.api_key)
+        self.assertEqual('Queretaro', obj.card.address.city)
+        self.assertTrue(isinstance(obj.get('fees')[0],
+                                   openpay.resource.BaseObject))
+        # The parsed response is left as it was.
+        self.assertEqual({'city': 'Queretaro'}, card['address'])
+        self.assertFalse(isinstance(card['address'],
+                                    openpay.resource.BaseObject))
+
+        obj = openpay.Charge.construct_from(values, 'mykey')
+        items = dict(obj.items())
+        self.assertTrue(isinstance(items['card'], openpay.resource.BaseObject))
+        self.assertTrue(isinstance(items['fees'][0],
+                                   openpay.resource.BaseObject))
+
+        obj = openpay.Charge.construct_from(values, 'mykey')
+        obj.card = {'brand': 'mastercard'}
+        self.assertEqual({'brand': 'mastercard'}, obj.card)
+        obj.refresh_from({'fees': []}, 'mykey', partial=True)
+        self.assertEqual([], obj.fees)
+        self.assertEqual([], dict.__getitem__(obj, 'fees'))
+
+    def test_refresh_from_converted_object_stays_lazy(self):
+        openpay.lazy_objects = True
+        self.addCleanup(setattr, openpay, 'lazy_objects', False)
+        source = openpay.Charge.construct_from(
+            {'id': 'ch_1', 'card': {'brand': 'visa'}}, 'mykey')
+
+        obj = openpay.Charge('ch_1', 'mykey')
+        obj.refresh_from(source)
+
+        self.assertFalse(isinstance(dict.__getitem__(source, 'card'),
+                                    openpay.resource.BaseObject))
+        self.assertEqual('visa', obj.card.brand)
+
 #    def test_refresh_from_nested_object(self):
 #        obj = openpay.resource.BaseObject.construct_from(
 #            SAMPLE_INVOICE, 'key')
@@ -109,6 +161,141 @@ class BaseObjectTests(OpenpayUnitTestCase):
                          data['lines']['subscriptions'][0]['plan']['interval'])
 
 
+class CompactObjectTests(OpenpayUnitTestCase):
+
+    values = {
+        'id': 'ch_1',
+        'amount': 10.5,
+        'card': {'brand': 'visa', 'address': None},
+        'fees': [{'amount': 1}],
+    }
+
+    def test_access(self):
+        obj = openpay.compact.convert(self.values)
+
+        self.assertEqual('ch_1', obj.id)
+        self.assertEqual('ch_1', obj['id'])
+        self.assertEqual('visa', obj.card.brand)
+        self.assertEqual(1, obj.fees[0].amount)
+        self.assertEqual(None, obj.get('missing'))
+        self.assertEqual('d', obj.get('missing', 'd'))
+        self.assertTrue('amount' in obj)
+        self.assertEqual(4, len(obj))
+        self.assertEqual(sorted(self.values), sorted(obj))
+        self.assertRaises(AttributeError, getattr, obj, 'missing')
+        self.assertRaises(KeyError, obj.__getitem__, 'missing')
+
+    def test_read_only(self):
+        obj = openpay.compact.convert(self.values)
+
+        self.assertRaises(TypeError, setattr, obj, 'amount', 1)
+        self.assertRaises(TypeError, obj.__setitem__, 'amount', 1)
+        self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_equality_and_serialization(self):
+        obj = openpay.compact.convert(self.values)
+
+        self.assertEqual(self.values, obj)
+        self.assertEqual(obj, self.values)
+        self.assertEqual(self.values, obj.to_dict())
+        self.assertEqual(self.values, json.loads(str(obj)))
+        self.assertEqual(obj, pickle.loads(pickle.dumps(obj)))
+        self.assertNotEqual(openpay.compact.convert({'id': 'ch_2'}), obj)
+
+    def test_objects_of_one_shape_share_keys(self):
+        first = openpay.compact.convert(dict(self.values, id='ch_1'))
+        second = openpay.compact.convert(dict(self.values, id='ch_2'))
+
+        self.assertTrue(first._shape is second._shape)
+        self.assertEqual('ch_2', second.id)
+
+
+class ColumnsTests(OpenpayUnitTestCase):
+
+    charges = [
+        {'id': 'ch_1', 'amount': 100, 'status': 'completed',
+         'creation_date': '2024-03-01T11:00:00-06:00',
+         'conciliated': True, 'card': {'brand': 'visa'}},
+        {'id': 'ch_2', 'amount': 2.5, 'status': 'failed',
+         'creation_date': '2024-03-01T17:30:00Z',
+         'conciliated': False, 'card': None},
+        {'id': 'ch_3', 'amount': None, 'status': 'completed',
+         'creation_date': None, 'card': {'brand': 'mastercard'}},
+    ]
+
+    def setUp(self):
+        # Skip before the base class patches the HTTP libraries: tearDown
+        # doesn't run for a test skipped in setUp.
+        if openpay.columns.numpy is None:
+            self.skipTest('NumPy is not installed')
+
+        super(ColumnsTests, self).setUp()
+
+        self.numpy = openpay.columns.numpy
+
+    def page(self):
+        return openpay.resource.convert_to_openpay_object({
+            'object': 'list', 'item_type': 'charge', 'url': '/charges',
+            'data': [dict(c, object='charge') for c in self.charges]},
+            'mykey')
+
+    def test_to_columns(self):
+        cols = self.page().to_columns(
+            ['amount', 'creation_date', 'status', 'conciliated',
+             'card.brand', ('id', 'object')])
+
+        self.assertEqual(['amount', 'creation_date', 'status',
+                          'conciliated', 'card.brand', 'id'], list(cols))
+        self.assertEqual(102.5, self.numpy.nansum(cols['amount']))
+        self.assertTrue(self.numpy.isnan(cols['amount'][2]))
+        self.assertEqual(
+            [self.numpy.datetime64('2024-03-01T17:00:00'),
+             self.numpy.datetime64('2024-03-01T17:30:00')],
+            list(cols['creation_date'][:2]))
+        self.assertTrue(self.numpy.isnat(cols['creation_date'][2]))
+        self.assertEqual(['completed', 'failed'], cols['status'].categories)
+        self.assertEqual([0, 1, 0], list(cols['status'].codes))
+        self.assertEqual([True, False, False], list(cols['conciliated']))
+        self.assertEqual([0, -1, 1], list(cols['card.brand'].codes))
+        self.assertEqual(['ch_1', 'ch_2', 'ch_3'], list(cols['id']))
+
+    def test_lazy_page_items_stay_unconverted(self):
+        openpay.lazy_objects = True
+        self.addCleanup(setattr, openpay, 'lazy_objects', False)
+        page = self.page()
+
+        cols = page.to_columns(['amount', 'card.brand'])
+
+        self.assertEqual(3, len(cols['amount']))
+        self.assertFalse(isinstance(dict.__getitem__(page, 'data')[0],
+                                    openpay.resource.BaseObject))
+
+    @patch('openpay.api.APIClient')
+    def test_class_method_builds_no_objects(self, client_class):
+        client_class.return_value.request.return_value = (
+            [dict(c) for c in self.charges], 'mykey')
+
+        with patch.object(openpay.resource.BaseObject, '__init__',
+                          side_effect=AssertionError('object built')):
+            cols = openpay.Charge.to_columns(['amount', 'card.brand'],
+                                             limit=3)
+
+        self.assertEqual(3, len(cols['amount']))
+        self.assertEqual(['visa', 'mastercard'],
+                         cols['card.brand'].categories)
+        client_class.return_value.request.assert_called_with(
+            'get', openpay.Charge.class_url(), {'limit': 3})
+
+    def test_compact_items_and_unknown_kind(self):
+        items = openpay.compact.convert(self.charges)
+
+        cols = openpay.columns.to_columns(items, ['card.brand'])
+        self.assertEqual(['visa', 'mastercard'],
+                         cols['card.brand'].categories)
+        self.assertRaises(ValueError, openpay.columns.to_columns,
+                          items, [('amount', 'decimal')])
+
+
 class ListObjectTests(OpenpayApiTestCase):
 
     def setUp(self):
@@ -136,11 +323,21 @@ class ListObjectTests(OpenpayApiTestCase):
 
         self.assertResponse(res)
 
+    def test_all_compact(self):
+        res = self.lo.all(compact=True, myparam='you')
+
+        self.requestor_mock.request.assert_called_with(
+            'get', '/my/path', {'myparam': 'you'})
+        self.assertTrue(isinstance(res.data[0],
+                                   openpay.compact.CompactObject))
+        self.assertEqual('charge', res.data[0].object)
+        self.assertEqual('bar', res.data[0].foo)
+
     def test_create(self):
-        res = self.lo.create(myparam='eter')
+        res = self.lo.create(myparam='eter', idempotency_key='k1')
 
         self.requestor_mock.request.assert_called_with(
-            'post', '/my/path', {'myparam': 'eter'})
+            'post', '/my/path', {'myparam': 'eter'}, idempotency_key='k1')
 
         self.assertResponse(res)
 
@@ -186,6 +383,16 @@ class APIResourceTests(OpenpayApiTestCase):
         self.assertEqual(5, res.frobble)
         self.assertRaises(KeyError, res.__getitem__, 'bobble')
 
+    def test_retrieve_can_opt_out_of_coalescing(self):
+        self.mock_response({'id': 'foo2'})
+
+        res = MyResource.retrieve('foo2', coalesce=False)
+
+        url = '/v1/{0}/myresources/foo2'.format(openpay.merchant_id)
+        self.requestor_mock.request.assert_called_with(
+            'get', url, {}, coalesce=False)
+        self.assertEqual({}, res._retrieve_params)
+
     def test_convert_to_openpay_object(self):
         sample = {
             'foo': 'bar',
@@ -219,6 +426,27 @@ class APIResourceTests(OpenpayApiTestCase):
         # TODO: We should probably be stripping out this property
         # self.assertRaises(AttributeError, getattr, converted.adict, 'object')
 
+        # The parsed response is used as is, not modified.
+        self.assertEqual(7, sample['adict']['amount'])
+        self.assertFalse(isinstance(sample['adict'],
+                                    openpay.resource.BaseObject))
+        self.assertEqual(set(), converted._unsaved_values)
+        self.assertEqual(set(), converted.adict._unsaved_values)
+
+    def test_register_type(self):
+        self.addCleanup(openpay.resource.OBJECT_TYPES.pop, 'myresource')
+        openpay.resource.register_type('myresource')(MyResource)
+
+        converted = openpay.resource.convert_to_openpay_object(
+            [{'id': 'r1', 'object': 'myresource'}, {'id': 'r2'}],
+            'akey', 'myresource')
+
+        self.assertTrue(all(isinstance(obj, MyResource)
+                            for obj in converted))
+        self.assertEqual('r2', converted[1].id)
+        self.assertTrue(openpay.resource.OBJECT_TYPES['bank_account'] is
+                        openpay.BankAccount)
+
 
 class SingletonAPIResourceTests(OpenpayApiTestCase):
 
@@ -259,6 +487,30 @@ class ListableAPIResourceTests(OpenpayApiTestCase):
         self.assertEqual('jose', res.data[0].name)
         self.assertEqual('curly', res.data[1].name)
 
+    def test_all_leaves_shared_response_untouched(self):
+        response = [{'name': 'jose'}]
+        self.mock_response(response)
+
+        res = MyListable.all(coalesce=False)
+
+        self.assertEqual('mylistable', res.data[0].object)
+        self.assertEqual([{'name': 'jose'}], response)
+        self.assertEqual({'coalesce': False},
+                         self.requestor_mock.request.call_args[1])
+
+    def test_all_compact(self):
+        self.mock_response([{'name': 'jose', 'card': {'brand': 'visa'}}])
+
+        res = MyListable.all(compact=True, limit=1)
+
+        self.requestor_mock.request.assert_called_with(
+            'get', '/v1/{0}/mylistables'.format(openpay.merchant_id),
+            {'limit': 1})
+        item = res.data[0]
+        self.assertTrue(isinstance(item, openpay.compact.CompactObject))
+        self.assertEqual('mylistable', item.object)
+        self.assertEqual('visa', item.card.brand)
+
 
 class CreateableAPIResourceTests(OpenpayApiTestCase):
 
@@ -362,6 +614,15 @@ class UpdateableAPIResourceTests(OpenpayApiTestCase):
         )
 
 
+class LazyUpdateableAPIResourceTests(UpdateableAPIResourceTests):
+
+    def setUp(self):
+        openpay.lazy_objects = True
+        self.addCleanup(setattr, openpay, 'lazy_objects', False)
+
+        super(LazyUpdateableAPIResourceTests, self).setUp()
+
+
 class DeletableAPIResourceTests(OpenpayApiTestCase):
 
     def test_delete(self):
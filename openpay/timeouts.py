@@ -0,0 +1,155 @@
+"""
+Per-call timeouts and deadlines.
+
+Transports take a default ``timeout=(connect, read)`` and APIClient can
+override it per client. To bound a single operation instead, wrap it::
+
+    with openpay.timeouts.timeout(connect=2, deadline=5):
+        openpay.Charge.create(...)
+
+``connect`` and ``read`` apply to every HTTP attempt. ``deadline`` is an
+overall budget in seconds shared by all attempts: retries stop and each
+attempt's read timeout shrinks as it runs out. Worker threads started by
+the bulk helpers and the list prefetcher inherit the caller's settings,
+so a deadline also covers a whole paginated walk.
+"""
+import threading
+
+from openpay.retry import clock
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+if contextvars is not None:
+    _current = contextvars.ContextVar('openpay_timeouts', default=None)
+
+    def _get():
+        return _current.get()
+
+    def _set(value):
+        return _current.set(value)
+
+    def _reset(token, previous):
+        _current.reset(token)
+
+else:
+    _local = threading.local()
+
+    def _get():
+        return getattr(_local, 'settings', None)
+
+    def _set(value):
+        _local.settings = value
+
+    def _reset(token, previous):
+        _local.settings = previous
+
+
+class _Settings(object):
+
+    def __init__(self, connect, read, deadline_at):
+        self.connect = connect
+        self.read = read
+        self.deadline_at = deadline_at
+
+
+class timeout(object):
+    """
+    Context manager applying connect/read timeouts (seconds) and an
+    overall ``deadline`` (seconds from now) to the API calls made inside
+    it. Nested blocks can only tighten an enclosing deadline.
+    """
+
+    def __init__(self, connect=None, read=None, deadline=None):
+        self.connect = connect
+        self.read = read
+        self.deadline = deadline
+
+    def __enter__(self):
+        outer = _get()
+        connect, read, deadline_at = self.connect, self.read, None
+        if self.deadline is not None:
+            deadline_at = clock() + self.deadline
+        if outer is not None:
+            connect = outer.connect if connect is None else connect
+            read = outer.read if read is None else read
+            if outer.deadline_at is not None and (
+                    deadline_at is None or outer.deadline_at < deadline_at):
+                deadline_at = outer.deadline_at
+
+        self._previous = outer
+        self._token = _set(_Settings(connect, read, deadline_at))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _reset(self._token, self._previous)
+
+
+def resolve(client_timeout=None):
+    """
+    Return ``((connect, read), deadline_at)`` for a call made now.
+    Settings from an active ``timeout`` block win over ``client_timeout``;
+    parts left as None fall back to the transport's defaults.
+    """
+    connect, read = _split(client_timeout)
+    settings = _get()
+    deadline_at = None
+    if settings is not None:
+        if settings.connect is not None:
+            connect = settings.connect
+        if settings.read is not None:
+            read = settings.read
+        deadline_at = settings.deadline_at
+    return (connect, read), deadline_at
+
+
+def remaining(deadline_at):
+    if deadline_at is None:
+        return None
+    return deadline_at - clock()
+
+
+def for_attempt(timeout_pair, deadline_at, defaults):
+    """
+    The (connect, read) timeout for one attempt: ``timeout_pair`` with
+    None parts taken from ``defaults``, both capped by the time left
+    before ``deadline_at``.
+    """
+    connect, read = timeout_pair
+    default_connect, default_read = defaults
+    connect = default_connect if connect is None else connect
+    read = default_read if read is None else read
+
+    left = remaining(deadline_at)
+    if left is not None:
+        left = max(left, 0.001)
+        connect = left if connect is None else min(connect, left)
+        read = left if read is None else min(read, left)
+    return connect, read
+
+
+def _split(value):
+    if value is None:
+        return None, None
+    if isinstance(value, (tuple, list)):
+        return value[0], value[1]
+    return value, value
+
+
+def propagate(func):
+    """
+    Wrap ``func`` so it runs with the caller's timeout settings, for
+    handing work to another thread.
+    """
+    settings = _get()
+
+    def wrapper(*args, **kwargs):
+        token = _set(settings)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _reset(token, None)
+
+    return wrapper
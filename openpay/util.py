@@ -8,7 +8,7 @@ __all__ = ['utf8']
 
 
 def utf8(value):
-    if isinstance(value, unicode) and sys.version_info < (3, 0):
+    if sys.version_info < (3, 0) and isinstance(value, unicode):
         return value.encode('utf-8')
     else:
         return value
@@ -18,6 +18,8 @@ requests = 'requests >= 2.1.0'
 if sys.version_info < (2, 6):
     requests += ', < 2.1.0'
 install_requires = [requests, "future==0.15.2"]
+if sys.version_info < (3, 0):
+    install_requires.append('futures')
 
 
 # Don't import openpay module here, since deps may not be installed
@@ -42,6 +44,8 @@ setup(name='openpay',
       packages=['openpay', 'openpay.test'],
       package_data={'openpay': ['data/ca-certificates.crt', '../VERSION']},
       install_requires=install_requires,
+      extras_require={'fast-json': ['orjson'], 'columns': ['numpy'],
+                      'export': ['pyarrow']},
       test_suite='openpay.test.all',
       use_2to3=True,
       )